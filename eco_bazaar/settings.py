@@ -46,6 +46,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     'rest_framework.authtoken',
     "django_filters",
@@ -58,13 +59,94 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'profile.authentication.SignedTokenAuthentication',
+        'profile.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
 }
 
+# Product search engine: "shop.search.database.DatabaseSearchBackend"
+# (PostgreSQL full-text and trigram search) or
+# "shop.search.memory.InvertedIndexBackend" (in-process inverted index)
+SHOP_SEARCH_BACKEND = os.getenv(
+    'SHOP_SEARCH_BACKEND', 'shop.search.database.DatabaseSearchBackend'
+)
+# Seconds after which the in-process index is rebuilt from the database
+SHOP_SEARCH_INDEX_MAX_AGE = int(os.getenv('SHOP_SEARCH_INDEX_MAX_AGE', 300))
+# Best matches of the in-process index handed on to the database query
+SHOP_SEARCH_MAX_CANDIDATES = int(
+    os.getenv('SHOP_SEARCH_MAX_CANDIDATES', 1000)
+)
+# Seconds the facet counts of a filtered product list are cached for
+SHOP_FACET_CACHE_TIMEOUT = int(os.getenv('SHOP_FACET_CACHE_TIMEOUT', 60))
+
+# Local memory by default. Point these at a shared backend (e.g.
+# django.core.cache.backends.redis.RedisCache and redis://host:6379/1)
+# so that all workers see the same cache version counters
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+# Upper bound on how long a cached catalog response is served; writes
+# expire them earlier through version counters
+SHOP_RESPONSE_CACHE_TIMEOUT = int(
+    os.getenv('SHOP_RESPONSE_CACHE_TIMEOUT', 300)
+)
+
+# Product images are staged in SHOP_UPLOAD_STAGING_DIR by the upload API
+# and pushed to SHOP_IMAGE_STORAGE by the process_image_uploads command:
+# "shop.storage.remote.CloudinaryImageStorage" or
+# "shop.storage.local.LocalImageStorage" (files and their thumbnails
+# under SHOP_LOCAL_IMAGE_ROOT, served from SHOP_LOCAL_IMAGE_URL in DEBUG)
+SHOP_IMAGE_STORAGE = os.getenv(
+    'SHOP_IMAGE_STORAGE', 'shop.storage.remote.CloudinaryImageStorage'
+)
+SHOP_UPLOAD_STAGING_DIR = os.getenv(
+    'SHOP_UPLOAD_STAGING_DIR', os.path.join(BASE_DIR, 'upload_staging')
+)
+SHOP_LOCAL_IMAGE_ROOT = os.getenv(
+    'SHOP_LOCAL_IMAGE_ROOT', os.path.join(BASE_DIR, 'media')
+)
+SHOP_LOCAL_IMAGE_URL = os.getenv('SHOP_LOCAL_IMAGE_URL', '/media/')
+# Failed uploads are retried after 30s, 60s, 120s... up to this many
+# attempts in all
+SHOP_IMAGE_UPLOAD_MAX_ATTEMPTS = int(
+    os.getenv('SHOP_IMAGE_UPLOAD_MAX_ATTEMPTS', 5)
+)
+SHOP_IMAGE_UPLOAD_RETRY_DELAY = int(
+    os.getenv('SHOP_IMAGE_UPLOAD_RETRY_DELAY', 30)
+)
+# Uploads the worker runs at the same time
+SHOP_IMAGE_UPLOAD_THREADS = int(os.getenv('SHOP_IMAGE_UPLOAD_THREADS', 4))
+
+# Seconds a cart item holds its stock after it was last changed; run the
+# release_expired_carts command periodically (e.g. from cron) to free
+# the stock of abandoned carts
+SHOP_CART_RESERVATION_TIMEOUT = int(
+    os.getenv('SHOP_CART_RESERVATION_TIMEOUT', 1800)
+)
+
+# Seconds a token's user and roles are cached for, saving the lookup on
+# every API request
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 300))
+# Seconds a token stays valid after login; unset or 0 for ever. Run the
+# delete_expired_tokens command periodically to remove the expired ones
+AUTH_TOKEN_TTL = int(os.getenv('AUTH_TOKEN_TTL', 0)) or None
+# Log in with short-lived signed tokens instead of database tokens; they
+# are valid for AUTH_ACCESS_TOKEN_TTL seconds, and a logout reaches the
+# other workers within AUTH_REVOCATION_SYNC_INTERVAL seconds
+AUTH_SIGNED_TOKENS = os.getenv('AUTH_SIGNED_TOKENS', '') in ('1', 'true')
+AUTH_ACCESS_TOKEN_TTL = int(os.getenv('AUTH_ACCESS_TOKEN_TTL', 900))
+AUTH_REVOCATION_SYNC_INTERVAL = int(
+    os.getenv('AUTH_REVOCATION_SYNC_INTERVAL', 30)
+)
+
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
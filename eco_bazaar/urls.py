@@ -1,5 +1,7 @@
 
 
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 from profile.views import (
@@ -26,3 +28,8 @@ urlpatterns = [
     path('login/', LoginDemoView.as_view(), name='login-demo'),
     path('logout/', LogoutDemoView.as_view(), name='logout-demo'),
 ]
+
+# images of shop.storage.local.LocalImageStorage, served in DEBUG only
+urlpatterns += static(
+    settings.SHOP_LOCAL_IMAGE_URL, document_root=settings.SHOP_LOCAL_IMAGE_ROOT
+)
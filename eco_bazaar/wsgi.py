@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "eco_bazaar.settings")
 
 application = get_wsgi_application()
+
+# Build in-process search indexes before the worker takes traffic
+from shop.search import get_search_backend  # noqa: E402
+
+get_search_backend().warm()
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Address, Customer, Seller, Order, OrderItem, Cart, CartItem
+from .models import (
+    City, Address, Customer, Seller, Order, OrderItem, Cart, CartItem
+)
 
 
 class SellerAdmin(admin.ModelAdmin):
@@ -15,6 +17,12 @@ class AddressAdmin(admin.ModelAdmin):
     search_fields = ('street', 'city', 'postal_code')
 
 
+class CityAdmin(admin.ModelAdmin):
+    list_display = ('name', 'key')
+    search_fields = ('key',)
+
+
+admin.site.register(City, CityAdmin)
 admin.site.register(Address, AddressAdmin)
 admin.site.register(Customer, CustomerAdmin)
 admin.site.register(Seller, SellerAdmin)
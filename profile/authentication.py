@@ -0,0 +1,389 @@
+import hashlib
+import secrets
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import (
+    BaseAuthentication,
+    TokenAuthentication,
+    get_authorization_header,
+)
+from rest_framework.authtoken.models import Token
+
+from profile.bloom import BloomFilter
+from profile.models import Customer, RevokedToken, Seller
+from shop.cache import get_cache
+
+
+def token_ttl():
+    """Seconds a token stays valid after login, or None for ever."""
+    return getattr(settings, "AUTH_TOKEN_TTL", None) or None
+
+
+def token_expiry(token):
+    ttl = token_ttl()
+    if ttl is None:
+        return None
+    return token.created + timedelta(seconds=ttl)
+
+
+def token_expired(token, now=None):
+    expiry = token_expiry(token)
+    return expiry is not None and expiry <= (now or timezone.now())
+
+
+def token_cache_key(key):
+    # the cache never sees the token itself
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    return f"profile:token:{digest}"
+
+
+def evict_tokens(keys, using=None):
+    """
+    Drop the cached lookups of these token keys, now and again when the
+    transaction commits: a request racing the commit may have cached the
+    old rows in between.
+    """
+    cache_keys = [token_cache_key(key) for key in keys]
+    if not cache_keys:
+        return
+
+    def evict():
+        get_cache().delete_many(cache_keys)
+
+    evict()
+    transaction.on_commit(evict, using=using)
+
+
+def evict_user_tokens(user_id, using=None):
+    evict_tokens(
+        Token.objects.using(using).filter(user_id=user_id)
+        .values_list("key", flat=True),
+        using=using,
+    )
+
+
+# The user fields a cached token lookup keeps: those authenticating and
+# the permissions read. The cache may be shared, so never the password
+# hash or the profiles' data.
+CACHED_USER_FIELDS = ["id", "is_active", "is_staff", "is_superuser"]
+
+
+def token_entry(token):
+    """What the cache keeps of a token loaded with its user's profiles."""
+    user = token.user
+    return {
+        "created": token.created,
+        "user": {field: getattr(user, field) for field in CACHED_USER_FIELDS},
+        "customer": getattr(getattr(user, "customer", None), "pk", None),
+        "seller": getattr(getattr(user, "seller", None), "pk", None),
+    }
+
+
+def partial_instance(model, values):
+    """An instance of `model` with `values` loaded, and the rest deferred."""
+    names = [
+        field.attname for field in model._meta.concrete_fields
+        if field.attname in values
+    ]
+    return model.from_db(
+        DEFAULT_DB_ALIAS, names, [values[name] for name in names]
+    )
+
+
+def cached_token(key, entry):
+    """
+    The token of a cache entry, with a user that has only the cached
+    fields loaded, like the ids of their profiles: the other fields are
+    loaded on first use, and a missing profile is known to be missing.
+    """
+    user = partial_instance(User, entry["user"])
+    for name, model in (("customer", Customer), ("seller", Seller)):
+        profile = None
+        if entry[name] is not None:
+            profile = partial_instance(
+                model, {"id": entry[name], "user_id": user.pk}
+            )
+            model._meta.get_field("user").set_cached_value(profile, user)
+        User._meta.get_field(name).set_cached_value(user, profile)
+    token = partial_instance(Token, {
+        "key": key, "user_id": user.pk, "created": entry["created"],
+    })
+    Token._meta.get_field("user").set_cached_value(token, user)
+    return token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that keeps the token's user id, flags and
+    customer and seller profile ids in the cache for
+    AUTH_TOKEN_CACHE_TIMEOUT seconds, so requests with a known token run
+    no query to authenticate, nor to check `request.user.customer` or
+    `request.user.seller` in the permissions (see cached_token()).
+
+    Logging out, and saving or deleting the user or their profiles, evict
+    the entry (see profile.signals). With AUTH_TOKEN_TTL set, tokens
+    expire that many seconds after they were issued.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = get_cache()
+        cache_key = token_cache_key(key)
+        entry = cache.get(cache_key)
+        if entry is not None:
+            token = cached_token(key, entry)
+        else:
+            model = self.get_model()
+            try:
+                token = model.objects.select_related(
+                    "user__customer", "user__seller"
+                ).get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_("Invalid token."))
+            timeout = getattr(settings, "AUTH_TOKEN_CACHE_TIMEOUT", 300)
+            expiry = token_expiry(token)
+            if expiry is not None:
+                remaining = (expiry - timezone.now()).total_seconds()
+                timeout = min(timeout, max(int(remaining), 0))
+            if timeout:
+                cache.set(cache_key, token_entry(token), timeout)
+
+        if token_expired(token):
+            raise exceptions.AuthenticationFailed(_("Token has expired."))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _("User inactive or deleted.")
+            )
+
+        return (token.user, token)
+
+
+# Signed access tokens: "<payload>:<HMAC>", made with django.core.signing
+# and SECRET_KEY. The payload carries the user id, their role bits, when
+# the token was issued (in milliseconds) and a random id to revoke it by.
+
+ACCESS_TOKEN_SALT = "profile.access-token"
+CUSTOMER = 1
+SELLER = 2
+STAFF = 4
+SUPERUSER = 8
+
+
+def access_token_ttl():
+    return getattr(settings, "AUTH_ACCESS_TOKEN_TTL", 900)
+
+
+@dataclass(frozen=True)
+class AccessToken:
+    key: str
+    id: str
+    user_id: int
+    roles: int
+    issued_at: int
+
+    @property
+    def issued(self):
+        return datetime.fromtimestamp(self.issued_at / 1000, dt_timezone.utc)
+
+    @property
+    def expires_at(self):
+        return self.issued + timedelta(seconds=access_token_ttl())
+
+
+def user_roles(user):
+    return (
+        (CUSTOMER if Customer.objects.filter(user=user).exists() else 0)
+        | (SELLER if Seller.objects.filter(user=user).exists() else 0)
+        | (STAFF if user.is_staff else 0)
+        | (SUPERUSER if user.is_superuser else 0)
+    )
+
+
+def issue_access_token(user):
+    return signing.Signer(salt=ACCESS_TOKEN_SALT).sign_object({
+        "u": user.pk,
+        "r": user_roles(user),
+        "i": time.time_ns() // 1_000_000,
+        "j": secrets.token_urlsafe(12),
+    })
+
+
+def read_access_token(key):
+    try:
+        payload = signing.Signer(salt=ACCESS_TOKEN_SALT).unsign_object(key)
+        token = AccessToken(
+            key=key,
+            id=payload["j"],
+            user_id=int(payload["u"]),
+            roles=int(payload["r"]),
+            issued_at=int(payload["i"]),
+        )
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise exceptions.AuthenticationFailed(_("Invalid token."))
+    if time.time() * 1000 >= token.issued_at + access_token_ttl() * 1000:
+        raise exceptions.AuthenticationFailed(_("Token has expired."))
+    return token
+
+
+def user_revocation_key(user_id):
+    return f"user:{user_id}"
+
+
+class RevocationList:
+    """
+    This process's copy of the RevokedToken keys, in a Bloom filter that
+    is rebuilt from the table every AUTH_REVOCATION_SYNC_INTERVAL seconds.
+
+    Tokens the filter has never heard of, nearly all of them, are
+    accepted without a query; a hit, revoked or a false positive, is
+    checked against the table. A token revoked by another process is only
+    refused here after the next sync.
+    """
+
+    error_rate = 0.01
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.filter = None
+        self.synced_at = None
+
+    def sync(self):
+        keys = list(
+            RevokedToken.objects.filter(expires_at__gt=timezone.now())
+            .values_list("key", flat=True).distinct()
+        )
+        revoked = BloomFilter(
+            # room to spare for the keys revoked until the next sync
+            max(2 * len(keys), 1024), self.error_rate
+        )
+        for key in keys:
+            revoked.add(key)
+        # readers keep using the old filter until this swap
+        self.filter = revoked
+        self.synced_at = time.monotonic()
+
+    def sync_if_stale(self):
+        interval = getattr(settings, "AUTH_REVOCATION_SYNC_INTERVAL", 30)
+        if (
+            self.synced_at is not None
+            and time.monotonic() - self.synced_at < interval
+        ):
+            return
+        with self.lock:
+            if (
+                self.synced_at is None
+                or time.monotonic() - self.synced_at >= interval
+            ):
+                self.sync()
+
+    def add(self, key):
+        with self.lock:
+            if self.filter is not None:
+                self.filter.add(key)
+
+    def might_contain(self, key):
+        self.sync_if_stale()
+        return key in self.filter
+
+    def is_revoked(self, token):
+        keys = [token.id, user_revocation_key(token.user_id)]
+        if not any(self.might_contain(key) for key in keys):
+            return False
+        return RevokedToken.objects.filter(
+            key__in=keys,
+            revoked_at__gte=token.issued,
+        ).exists()
+
+
+revocation_list = RevocationList()
+
+
+@receiver(setting_changed)
+def reset_revocation_list(*, setting, **kwargs):
+    if setting == "AUTH_REVOCATION_SYNC_INTERVAL":
+        revocation_list.synced_at = None
+
+
+def revoke(key, expires_at):
+    RevokedToken.objects.create(key=key, expires_at=expires_at)
+    transaction.on_commit(lambda: revocation_list.add(key))
+
+
+def revoke_access_token(token):
+    revoke(token.id, token.expires_at)
+
+
+def revoke_user_access_tokens(user_id):
+    """Revoke every access token issued to the user so far."""
+    revoke(
+        user_revocation_key(user_id),
+        timezone.now() + timedelta(seconds=access_token_ttl()),
+    )
+
+
+def token_user(token):
+    """
+    The user of an access token, built from the token alone. A profile
+    the role bits say the user has not is known to be missing, so
+    checking for it runs no query either; one the user has is loaded on
+    first use.
+    """
+    user = User(
+        id=token.user_id,
+        is_active=True,
+        is_staff=bool(token.roles & STAFF),
+        is_superuser=bool(token.roles & SUPERUSER),
+    )
+    user._state.adding = False
+    user._state.db = DEFAULT_DB_ALIAS
+    for role, name in ((CUSTOMER, "customer"), (SELLER, "seller")):
+        if not token.roles & role:
+            User._meta.get_field(name).set_cached_value(user, None)
+    return user
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Authenticates the signed access tokens LoginView issues when
+    AUTH_SIGNED_TOKENS is on, sent as "Authorization: Token <token>".
+    Leaves the other tokens to the next authentication class.
+
+    A token is valid for AUTH_ACCESS_TOKEN_TTL seconds from its issue,
+    unless LogoutView revoked it or the user was deactivated since.
+    Verifying it takes neither a query nor a cache lookup, see
+    RevocationList; neither does `request.user`, see token_user().
+    """
+
+    keyword = "Token"
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if (
+            len(auth) != 2
+            or auth[0].lower() != self.keyword.lower().encode()
+            or b":" not in auth[1]
+        ):
+            return None
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+
+        token = read_access_token(key)
+        if revocation_list.is_revoked(token):
+            raise exceptions.AuthenticationFailed(_("Token was revoked."))
+        return (token_user(token), token)
+
+    def authenticate_header(self, request):
+        return self.keyword
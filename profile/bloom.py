@@ -0,0 +1,39 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    A set of strings in a bit array: `key in filter` is never false for a
+    key that was added, and true for one that was not with probability
+    `error_rate` once `capacity` keys are in.
+
+    Each key sets `hashes` bits, derived from one BLAKE2b digest by double
+    hashing. Not thread safe for adds; readers of a filter that is no
+    longer written to need no lock.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1)
+        self.size = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self.positions(key)
+        )
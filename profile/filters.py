@@ -1,13 +1,27 @@
 import django_filters as filters
-from profile.models import Seller
+from django_filters.constants import EMPTY_VALUES
+from profile.models import Seller, city_key
 from django_filters.rest_framework import FilterSet
 
 
+class CityKeyFilter(filters.CharFilter):
+    """
+    Matches the case-folded City.key, so "berlin" finds "Berlin" with an
+    index lookup instead of an icontains scan.
+    """
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        return super().filter(qs, city_key(value))
+
+
 class SellerFilter(FilterSet):
-    city = filters.CharFilter(
-        field_name="address__city",
-        lookup_expr="icontains")
+    city = CityKeyFilter(field_name="address__normalized_city__key")
+    city_prefix = CityKeyFilter(
+        field_name="address__normalized_city__key",
+        lookup_expr="startswith")
 
     class Meta:
         model = Seller
-        fields = ["city"]
+        fields = ["city", "city_prefix"]
@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from profile.authentication import token_ttl
+from profile.models import RevokedToken
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the API tokens older than AUTH_TOKEN_TTL seconds, and the "
+        "revocations of signed tokens that have expired anyway."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Tokens deleted per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        revocations = self.delete_in_batches(
+            RevokedToken.objects.filter(expires_at__lte=now),
+            options["batch_size"],
+        )
+        self.stdout.write(f"Deleted {revocations} expired revocations.")
+
+        ttl = token_ttl()
+        if ttl is None:
+            self.stdout.write("Tokens do not expire (AUTH_TOKEN_TTL).")
+            return
+        deleted = self.delete_in_batches(
+            Token.objects.filter(created__lte=now - timedelta(seconds=ttl)),
+            options["batch_size"],
+        )
+        self.stdout.write(f"Deleted {deleted} expired tokens.")
+
+    def delete_in_batches(self, queryset, batch_size):
+        deleted = 0
+        while True:
+            with transaction.atomic():
+                keys = list(queryset.values_list("pk", flat=True)[:batch_size])
+                queryset.model.objects.filter(pk__in=keys).delete()
+            deleted += len(keys)
+            if len(keys) < batch_size:
+                return deleted
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.stock import release_expired_items
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove the cart items whose reservation expired and give their "
+        "stock back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Cart items released per transaction.",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0,
+            help="Seconds to wait between batches, to spread the load.",
+        )
+
+    def handle(self, *args, **options):
+        released = 0
+        while True:
+            count = release_expired_items(options["batch_size"])
+            released += count
+            if count < options["batch_size"]:
+                break
+            time.sleep(options["pause"])
+        self.stdout.write(f"Released {released} cart items.")
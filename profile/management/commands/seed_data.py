@@ -13,7 +13,7 @@ class Command(BaseCommand):
             street="123 Elm Street",
             postal_code="12345",
             phone_number="+4934567890",
-            city="Beerlin"
+            city="Berlin"
         )
         address2 = Address.objects.create(
             street="456 Oak Avenue",
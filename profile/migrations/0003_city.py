@@ -0,0 +1,81 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:10
+
+import django.db.models.deletion
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def city_key(name):
+    return " ".join(name.split()).casefold()
+
+
+def backfill_cities(apps, schema_editor):
+    Address = apps.get_model("profile", "Address")
+    City = apps.get_model("profile", "City")
+    spellings = Counter(
+        " ".join(city.split())
+        for city in Address.objects.exclude(city="").values_list(
+            "city", flat=True
+        )
+    )
+    cities = {}
+    # The most common spelling of each key becomes the display name
+    for name, _ in spellings.most_common():
+        key = city_key(name)
+        if key and key not in cities:
+            cities[key] = City.objects.create(name=name, key=key)
+    # One UPDATE per distinct stored value
+    for name in Address.objects.exclude(city="").values_list(
+        "city", flat=True
+    ).distinct():
+        key = city_key(name)
+        if key:
+            Address.objects.filter(city=name).update(
+                normalized_city=cities[key]
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("profile", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="City",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                (
+                    "key",
+                    models.CharField(editable=False, max_length=100, unique=True),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "cities",
+            },
+        ),
+        migrations.AddField(
+            model_name="address",
+            name="normalized_city",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="addresses",
+                to="profile.city",
+            ),
+        ),
+        migrations.RunPython(backfill_cities, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:30
+
+import profile.models
+from django.db import migrations, models
+
+import shop.operations
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("profile", "0003_city"),
+        ("shop", "0010_stock_non_negative"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cartitem",
+            name="expires_at",
+            field=models.DateTimeField(default=profile.models.reservation_expiry),
+        ),
+        shop.operations.AddIndexConcurrently(
+            model_name="cartitem",
+            index=models.Index(
+                fields=["expires_at", "id"], name="cartitem_expires_at_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.15 on 2026-10-18 14:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def snapshot_products(apps, schema_editor):
+    """
+    Order items whose cart item is still around get its product's current
+    name and price; the others lost their product for good.
+    """
+    OrderItem = apps.get_model("profile", "OrderItem")
+    CartItem = apps.get_model("profile", "CartItem")
+    products = CartItem.objects.filter(pk=models.OuterRef("cart_item"))
+    OrderItem.objects.filter(cart_item__isnull=False).update(
+        product=models.Subquery(products.values("product")[:1]),
+        product_name=models.Subquery(products.values("product__name")[:1]),
+        unit_price=models.Subquery(products.values("product__price")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("profile", "0004_cart_item_expiry"),
+        ("shop", "0010_stock_non_negative"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderitem",
+            name="product",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="order_items",
+                to="shop.product",
+            ),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="product_name",
+            field=models.CharField(default="", max_length=100),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="unit_price",
+            field=models.DecimalField(
+                decimal_places=2, default=0, max_digits=10
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(snapshot_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.15 on 2026-10-18 14:40
+
+from django.db import migrations, models
+
+import shop.operations
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("profile", "0005_order_item_snapshot"),
+    ]
+
+    operations = [
+        shop.operations.AddIndexConcurrently(
+            model_name="order",
+            index=models.Index(
+                fields=["customer", "created_at", "id"],
+                name="order_customer_created_idx",
+            ),
+        ),
+    ]
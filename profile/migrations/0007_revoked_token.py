@@ -0,0 +1,39 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("profile", "0006_order_history_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RevokedToken",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=64)),
+                ("revoked_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("expires_at", models.DateTimeField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["key"], name="revokedtoken_key_idx"),
+                    models.Index(
+                        fields=["expires_at"], name="revokedtoken_expires_at_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
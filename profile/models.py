@@ -1,6 +1,54 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator
+from django.utils import timezone
+
+
+def reservation_expiry():
+    """
+    When a cart item added or changed now stops holding its stock, see
+    shop.stock.release_expired_items.
+    """
+    return timezone.now() + timedelta(
+        seconds=getattr(settings, "SHOP_CART_RESERVATION_TIMEOUT", 1800)
+    )
+
+
+def city_key(name):
+    """
+    Lookup key of a city name: case folded with the whitespace collapsed,
+    so "Berlin", "berlin" and " BERLIN " are the same city.
+    """
+    return " ".join(name.split()).casefold()
+
+
+class City(models.Model):
+    name = models.CharField(max_length=100)
+    # unique, so indexed; PostgreSQL also adds a varchar_pattern_ops
+    # index that serves the prefix (LIKE 'ber%') lookups
+    key = models.CharField(max_length=100, unique=True, editable=False)
+
+    class Meta:
+        verbose_name_plural = "cities"
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        self.key = city_key(self.name)
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def for_name(cls, name):
+        city, _ = cls.objects.get_or_create(
+            key=city_key(name), defaults={"name": " ".join(name.split())}
+        )
+        return city
 
 
 class Address(models.Model):
@@ -29,10 +77,33 @@ class Address(models.Model):
         ],
     )
     city = models.CharField(max_length=100)
+    # Set from `city` on save; filters and facets go through this
+    normalized_city = models.ForeignKey(
+        City,
+        on_delete=models.PROTECT,
+        related_name="addresses",
+        null=True,
+        blank=True,
+        editable=False,
+    )
 
     def __str__(self):
         return f"{self.city}: {self.phone_number}"
 
+    def save(self, *args, **kwargs):
+        if self.city.strip():
+            if (
+                self.normalized_city is None
+                or self.normalized_city.key != city_key(self.city)
+            ):
+                self.normalized_city = City.for_name(self.city)
+        else:
+            self.normalized_city = None
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "city" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "normalized_city"}
+        super().save(*args, **kwargs)
+
 
 class Customer(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -66,6 +137,51 @@ class Seller(models.Model):
         return self.user.username
 
 
+class OrderQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Annotate each order with its `total` price and `item_count`, summed
+        by the database over the price snapshots of its items.
+
+        The sums are correlated subqueries rather than a join with GROUP
+        BY, so a page of orders only sums the items of the orders on it.
+        """
+        items = OrderItem.objects.filter(
+            order=models.OuterRef("pk")
+        ).order_by().values("order")
+        return self.annotate(
+            total=Coalesce(
+                models.Subquery(items.annotate(
+                    total=models.Sum(
+                        models.F("quantity") * models.F("unit_price")
+                    )
+                ).values("total")),
+                models.Value(Decimal("0.00")),
+                output_field=models.DecimalField(
+                    max_digits=12, decimal_places=2
+                ),
+            ),
+            item_count=Coalesce(
+                models.Subquery(items.annotate(
+                    count=models.Sum("quantity")
+                ).values("count")),
+                models.Value(0),
+            ),
+        )
+
+    def with_items(self):
+        """
+        Prefetch the items with their line `total`: serializing a page of
+        orders with with_totals() costs two queries.
+        """
+        return self.prefetch_related(
+            models.Prefetch(
+                "order_items",
+                queryset=OrderItem.objects.with_totals().order_by("id"),
+            )
+        )
+
+
 class Order(models.Model):
     customer = models.ForeignKey(
         Customer, on_delete=models.CASCADE, related_name="customer"
@@ -83,6 +199,17 @@ class Order(models.Model):
         related_name="shipping_address",
     )
 
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # keyset pagination of a customer's order history
+            models.Index(
+                fields=["customer", "created_at", "id"],
+                name="order_customer_created_idx",
+            ),
+        ]
+
     def __str__(self):
         if self.customer.user.first_name and self.customer.user.last_name:
             return f"Order {self.id} by {self.customer.user.first_name} \
@@ -91,10 +218,33 @@ class Order(models.Model):
         return f"Order {self.id} by {self.customer.user.username}"
 
 
+class OrderItemQuerySet(models.QuerySet):
+    def with_totals(self):
+        return self.annotate(
+            total=models.ExpressionWrapper(
+                models.F("quantity") * models.F("unit_price"),
+                output_field=models.DecimalField(
+                    max_digits=12, decimal_places=2
+                ),
+            )
+        )
+
+
 class OrderItem(models.Model):
     order = models.ForeignKey(
         Order, on_delete=models.CASCADE, related_name="order_items"
     )
+    # Snapshot of the product at checkout: the cart item is deleted then,
+    # and the product may later change its name and price or be deleted
+    product = models.ForeignKey(
+        "shop.Product",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="order_items",
+    )
+    product_name = models.CharField(max_length=100)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
     cart_item = models.OneToOneField(
         "CartItem",
         on_delete=models.SET_NULL,
@@ -105,8 +255,10 @@ class OrderItem(models.Model):
     quantity = models.IntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = OrderItemQuerySet.as_manager()
+
     def __str__(self):
-        return f"{self.quantity} of {self.product.name}"
+        return f"{self.quantity} of {self.product_name}"
 
 
 class Cart(models.Model):
@@ -129,6 +281,39 @@ class CartItem(models.Model):
     )
     quantity = models.PositiveIntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # The quantity is taken off the product's stock until then
+    expires_at = models.DateTimeField(default=reservation_expiry)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["expires_at", "id"], name="cartitem_expires_at_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.quantity} of {self.product.name} in cart"
+
+
+class RevokedToken(models.Model):
+    """
+    A signed access token revoked before it expired (`key` is its id), or
+    every token of a user issued before `revoked_at` (`key` is
+    "user:<id>"). See profile.authentication.
+    """
+
+    key = models.CharField(max_length=64)
+    revoked_at = models.DateTimeField(default=timezone.now)
+    # when the tokens it revokes have expired anyway, and the row can go
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["key"], name="revokedtoken_key_idx"),
+            models.Index(
+                fields=["expires_at"], name="revokedtoken_expires_at_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return self.key
@@ -1,5 +1,8 @@
 from rest_framework import permissions
 
+from profile.models import Cart, CartItem, Customer, Order, OrderItem, Seller
+from profile.roles import get_roles
+
 
 class IsOwnerOrAdmin(permissions.BasePermission):
     """
@@ -8,17 +11,17 @@ class IsOwnerOrAdmin(permissions.BasePermission):
     """
 
     def has_object_permission(self, request, view, obj):
-        if hasattr(request.user, 'is_staff') and request.user.is_staff:
+        if request.user.is_staff:
             return True
 
         # Check if the user is the owner of the profile
         # (either customer or seller)
-        is_customer = hasattr(
-            request.user, 'customer') and request.user.customer == obj
-        is_seller = hasattr(
-            request.user, 'seller') and request.user.seller == obj
-
-        return is_customer or is_seller
+        roles = get_roles(request)
+        if isinstance(obj, Customer):
+            return obj.pk == roles.customer_id
+        if isinstance(obj, Seller):
+            return obj.pk == roles.seller_id
+        return False
 
 
 class IsOwner(permissions.BasePermission):
@@ -39,6 +42,9 @@ class IsCustomerOrAdminForRelatedObjects(permissions.BasePermission):
     """
     Custom permission to allow only the customer (owner) or
       admin to access Cart, CartItems, Orders, and OrderItems.
+
+    Compares ids, so the views should load the cart of a cart item and
+    the order of an order item along with it.
     """
 
     def has_object_permission(self, request, view, obj):
@@ -47,16 +53,18 @@ class IsCustomerOrAdminForRelatedObjects(permissions.BasePermission):
             return True
 
         # If the user is associated with a Customer
-        if hasattr(request.user, 'customer'):
-            # Check if the object is associated with the Customer
-            if hasattr(obj, 'customer'):  # For Cart and Order
-                return obj.customer == request.user.customer
-            elif hasattr(obj, 'cart') and hasattr(obj.cart, 'customer'):
-                return obj.cart.customer == request.user.customer
-            elif hasattr(obj, 'order') and hasattr(obj.order, 'customer'):
-                return obj.order.customer == request.user.customer
-
+        customer_id = get_roles(request).customer_id
+        if customer_id is None:
+            return False
+        # Check if the object is associated with the Customer
+        if isinstance(obj, (Cart, Order)):
+            return obj.customer_id == customer_id
+        if isinstance(obj, CartItem):
+            return obj.cart.customer_id == customer_id
+        if isinstance(obj, OrderItem):
+            return obj.order.customer_id == customer_id
         # If not an admin or owner, deny access
+        return False
 
 
 class IsSellerOrAdmin(permissions.BasePermission):
@@ -71,4 +79,6 @@ class IsSellerOrAdmin(permissions.BasePermission):
             return True
 
         # Allow access to the seller who owns the profile
-        return hasattr(request.user, 'seller') and request.user.seller == obj
+        return isinstance(obj, Seller) and (
+            obj.pk == get_roles(request).seller_id
+        )
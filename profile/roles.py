@@ -0,0 +1,43 @@
+from dataclasses import dataclass
+
+from django.contrib.auth.models import User
+
+ROLE_FIELDS = ("customer", "seller")
+
+
+@dataclass(frozen=True)
+class Roles:
+    """Ids of the customer and seller profiles of a user, or None."""
+
+    customer_id: int = None
+    seller_id: int = None
+
+
+def resolve_roles(user):
+    """
+    Roles of `user`: taken from the profiles already loaded with it (see
+    profile.authentication), or else from a single query.
+    """
+    if not user.is_authenticated:
+        return Roles()
+    fields = [User._meta.get_field(name) for name in ROLE_FIELDS]
+    if all(field.is_cached(user) for field in fields):
+        ids = [
+            getattr(field.get_cached_value(user), "pk", None)
+            for field in fields
+        ]
+    else:
+        ids = User.objects.filter(pk=user.pk).values_list(
+            *(f"{name}__id" for name in ROLE_FIELDS)
+        ).first() or ()
+    return Roles(*ids)
+
+
+def get_roles(request):
+    """Roles of the user of `request`, resolved once per request."""
+    roles = getattr(request, "_profile_roles", None)
+    if roles is None or roles[0] is not request.user:
+        roles = request._profile_roles = (
+            request.user, resolve_roles(request.user)
+        )
+    return roles[1]
@@ -1,9 +1,13 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
 
 from shop.models import Product
 from shop.serializers import ProductSerializer
+from shop.stock import reserve_stock, reserve_stock_many
 from .models import Address, Customer, Seller, Order, OrderItem, Cart, CartItem
+from .models import reservation_expiry
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -85,20 +89,29 @@ class SellerSerializer(serializers.ModelSerializer):
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
+    # annotated by OrderItem.objects.with_totals()
+    total = serializers.DecimalField(
+        max_digits=12, decimal_places=2, read_only=True
+    )
 
     class Meta:
         model = OrderItem
-        fields = "__all__"
+        fields = ["id", "product", "product_name", "unit_price",
+                  "quantity", "total", "created_at"]
 
 
 class OrderSerializer(serializers.ModelSerializer):
     order_items = OrderItemSerializer(many=True, read_only=True)
+    # annotated by Order.objects.with_totals()
+    total = serializers.DecimalField(
+        max_digits=12, decimal_places=2, read_only=True
+    )
+    item_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Order
-        fields = ["order_items", "customer", "cart",
-                  "created_at", "shipping_address"]
+        fields = ["id", "order_items", "total", "item_count", "customer",
+                  "cart", "created_at", "shipping_address"]
         read_only_fields = ["id", "customer", "order_items"]
 
     def create(self, validated_data):
@@ -106,6 +119,18 @@ class OrderSerializer(serializers.ModelSerializer):
         return Order.objects.create(**validated_data)
 
 
+class OrderSummarySerializer(serializers.ModelSerializer):
+    # annotated by Order.objects.with_totals()
+    total = serializers.DecimalField(
+        max_digits=12, decimal_places=2, read_only=True
+    )
+    item_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ["id", "created_at", "total", "item_count"]
+
+
 class CartItemSerializer(serializers.ModelSerializer):
     product = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all()
@@ -114,36 +139,43 @@ class CartItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = CartItem
         fields = "__all__"
+        read_only_fields = ["expires_at"]
 
     def create(self, validated_data):
         product = validated_data.get('product')
         quantity = validated_data.get('quantity')
         cart = validated_data.get('cart')
 
-        # Ensure the product stock is sufficient
-        if product.stock < quantity:
-            raise serializers.ValidationError(
-                {"message": "Product out of stock."}
+        with transaction.atomic():
+            # Create or update the CartItem, which also renews the hold
+            # on the quantity already in the cart
+            cart_item, created = CartItem.objects.get_or_create(
+                cart=cart,
+                product=product,
+                defaults={'quantity': quantity}
             )
-
-        # Create or update the CartItem
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            defaults={'quantity': quantity}
-        )
-
-        if not created:
-            cart_item.quantity += quantity
-            if cart_item.quantity > product.stock:
+            if not created:
+                updated = CartItem.objects.filter(pk=cart_item.pk).update(
+                    quantity=F("quantity") + quantity,
+                    expires_at=reservation_expiry(),
+                )
+                if updated:
+                    cart_item.refresh_from_db(
+                        fields=["quantity", "expires_at"]
+                    )
+                else:
+                    # released by the sweeper in the meantime
+                    cart_item = CartItem.objects.create(
+                        cart=cart, product=product, quantity=quantity
+                    )
+
+            # The cart item is locked by now: take the product's row lock
+            # last, in the same order as CartItemDetail and the sweeper.
+            # Without enough stock the item change is rolled back.
+            if not reserve_stock(product.pk, quantity):
                 raise serializers.ValidationError(
                     {"message": "Product out of stock."}
                 )
-            cart_item.save()
-
-        # Update the product stock
-        product.stock -= quantity
-        product.save()
 
         return cart_item
 
@@ -156,6 +188,165 @@ class CartSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class CartOperationSerializer(serializers.Serializer):
+    ADD = "add"
+    SET = "set"
+    REMOVE = "remove"
+
+    op = serializers.ChoiceField(choices=[ADD, SET, REMOVE])
+    # checked in bulk by CartBatchSerializer
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0, required=False)
+
+    def validate(self, data):
+        if data["op"] == self.ADD and not data.get("quantity"):
+            raise serializers.ValidationError(
+                {"quantity": "Adding takes a quantity greater than 0."}
+            )
+        if data["op"] == self.SET and "quantity" not in data:
+            raise serializers.ValidationError(
+                {"quantity": "This field is required."}
+            )
+        return data
+
+
+class CartBatchSerializer(serializers.Serializer):
+    """
+    Applies a list of add / set / remove operations to a cart, in order,
+    all or nothing. Save with the cart; returns the cart.
+    """
+
+    operations = CartOperationSerializer(
+        many=True, allow_empty=False, max_length=100
+    )
+
+    def validate_operations(self, operations):
+        products = {operation["product"] for operation in operations}
+        missing = products - set(
+            Product.objects.filter(pk__in=products)
+            .values_list("pk", flat=True)
+        )
+        if missing:
+            raise serializers.ValidationError(
+                f"Unknown products: {sorted(missing)}."
+            )
+        return operations
+
+    def create(self, validated_data):
+        operations = validated_data["operations"]
+        cart = validated_data["cart"]
+        products = {operation["product"] for operation in operations}
+
+        with transaction.atomic():
+            # Locks in the order of every other cart path: the cart (which
+            # keeps two batches from creating the same item twice), its
+            # items, then the products in primary key order
+            Cart.objects.select_for_update().filter(pk=cart.pk).get()
+            items = {}
+            duplicates = []
+            for item in CartItem.objects.select_for_update().filter(
+                cart=cart, product__in=products
+            ).order_by("id"):
+                if item.product_id in items:
+                    duplicates.append(item)
+                    items[item.product_id].quantity += item.quantity
+                else:
+                    items[item.product_id] = item
+
+            reserved = {
+                product: item.quantity for product, item in items.items()
+            }
+            quantities = dict(reserved)
+            for operation in operations:
+                product = operation["product"]
+                if operation["op"] == CartOperationSerializer.ADD:
+                    quantities[product] = (
+                        quantities.get(product, 0) + operation["quantity"]
+                    )
+                elif operation["op"] == CartOperationSerializer.SET:
+                    quantities[product] = operation["quantity"]
+                else:
+                    quantities[product] = 0
+
+            short = reserve_stock_many({
+                product: quantity - reserved.get(product, 0)
+                for product, quantity in quantities.items()
+            })
+            if short:
+                raise serializers.ValidationError(
+                    {"message": "Product out of stock.", "products": short}
+                )
+
+            expires_at = reservation_expiry()
+            removed = [item.pk for item in duplicates]
+            changed = []
+            created = []
+            for product, quantity in quantities.items():
+                item = items.get(product)
+                if not quantity:
+                    if item is not None:
+                        removed.append(item.pk)
+                elif item is None:
+                    created.append(CartItem(
+                        cart=cart,
+                        product_id=product,
+                        quantity=quantity,
+                        expires_at=expires_at,
+                    ))
+                else:
+                    item.quantity = quantity
+                    item.expires_at = expires_at
+                    changed.append(item)
+            if removed:
+                CartItem.objects.filter(pk__in=removed).delete()
+            CartItem.objects.bulk_update(
+                changed, ["quantity", "expires_at"]
+            )
+            CartItem.objects.bulk_create(created)
+        return cart
+
+
+class ProfileSerializer(serializers.ModelSerializer):
+    """
+    The user with the ids of their customer and seller profiles and the
+    address of either; expects the user loaded with
+    select_related("customer__address", "seller__address").
+    """
+
+    user = serializers.IntegerField(source="pk", read_only=True)
+    customer = serializers.SerializerMethodField()
+    seller = serializers.SerializerMethodField()
+    address_details = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ["user", "username", "email", "first_name", "last_name",
+                  "customer", "seller", "address_details"]
+
+    def get_customer(self, user):
+        customer = getattr(user, "customer", None)
+        return customer and customer.pk
+
+    def get_seller(self, user):
+        seller = getattr(user, "seller", None)
+        return seller and seller.pk
+
+    def get_address_details(self, user):
+        for role in ("customer", "seller"):
+            profile = getattr(user, role, None)
+            if profile is not None and profile.address is not None:
+                return AddressSerializer(profile.address).data
+        return None
+
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        if instance.first_name and instance.last_name:
+            representation["full_name"] = (
+                f"{instance.first_name} {instance.last_name}"
+            )
+        return representation
+
+
 class SellerProductSerializer(serializers.ModelSerializer):
     products = ProductSerializer(
         many=True, read_only=True, source="user.product_set"
@@ -174,3 +365,23 @@ class SellerProductSerializer(serializers.ModelSerializer):
             representation["full_name"] = f"{user.first_name} {user.last_name}"
         representation["username"] = user.username
         return representation
+
+
+class ProductSalesSerializer(serializers.ModelSerializer):
+    units_sold = serializers.IntegerField(source="sales.units_sold")
+    revenue = serializers.DecimalField(
+        max_digits=14, decimal_places=2, source="sales.revenue"
+    )
+
+    class Meta:
+        model = Product
+        fields = ["id", "name", "price", "stock", "units_sold", "revenue"]
+
+
+class SellerDashboardSerializer(serializers.Serializer):
+    seller = serializers.IntegerField()
+    product_count = serializers.IntegerField()
+    units_sold = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    stock = serializers.IntegerField()
+    top_products = ProductSalesSerializer(many=True)
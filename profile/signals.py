@@ -0,0 +1,102 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models.signals import (
+    post_delete,
+    post_init,
+    post_save,
+    pre_save,
+)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from profile.authentication import (
+    evict_tokens,
+    evict_user_tokens,
+    revoke_user_access_tokens,
+)
+from profile.models import Customer, Seller
+
+
+# The cached token lookups (see profile.authentication) carry the user and
+# their customer and seller profiles: deactivating a user, or upgrading
+# them to a seller, must take effect at once
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, using, **kwargs):
+    evict_tokens([instance.key], using=using)
+
+
+# Fields of a user whose changes some receivers act on: those the
+# authentication checks here, and those the storefronts show (see
+# shop.signals)
+AUTH_USER_FIELDS = ("is_active", "is_staff", "is_superuser")
+TRACKED_USER_FIELDS = AUTH_USER_FIELDS + (
+    "username", "first_name", "last_name",
+)
+
+
+def loaded_fields(user, fields):
+    # deferred fields are left out rather than loaded
+    return {
+        field: user.__dict__[field]
+        for field in fields
+        if field in user.__dict__
+    }
+
+
+@receiver(post_init, sender=User)
+def remember_user_fields(sender, instance, **kwargs):
+    instance._loaded_fields = loaded_fields(instance, TRACKED_USER_FIELDS)
+
+
+@receiver(pre_save, sender=User)
+def find_changed_user_fields(sender, instance, update_fields, **kwargs):
+    loaded = getattr(instance, "_loaded_fields", {})
+    saved = loaded_fields(instance, TRACKED_USER_FIELDS)
+    if update_fields is not None:
+        saved = {
+            field: value for field, value in saved.items()
+            if field in update_fields
+        }
+    instance._changed_fields = {
+        field for field, value in saved.items()
+        if field not in loaded or loaded[field] != value
+    }
+    instance._loaded_fields = {**loaded, **saved}
+
+
+def changed_user_fields(user, fields):
+    """
+    Which of `fields`, all in TRACKED_USER_FIELDS, the save of the user
+    being handled wrote with a new value.
+    """
+    return user._changed_fields.intersection(fields)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, using, created, **kwargs):
+    # logins and profile edits keep the cached tokens
+    if created or not changed_user_fields(instance, AUTH_USER_FIELDS):
+        return
+    evict_user_tokens(instance.pk, using=using)
+    # signed access tokens carry the staff and superuser flags of when
+    # they were issued, so they go when those change or the user does
+    if getattr(settings, "AUTH_SIGNED_TOKENS", False) and (
+        not instance.is_active
+        or changed_user_fields(instance, ("is_staff", "is_superuser"))
+    ):
+        revoke_user_access_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, using, **kwargs):
+    if getattr(settings, "AUTH_SIGNED_TOKENS", False):
+        revoke_user_access_tokens(instance.pk)
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+@receiver(post_save, sender=Seller)
+@receiver(post_delete, sender=Seller)
+def profile_changed(sender, instance, using, **kwargs):
+    evict_user_tokens(instance.user_id, using=using)
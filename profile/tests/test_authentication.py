@@ -0,0 +1,296 @@
+from datetime import timedelta
+from io import StringIO
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory, APITestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from profile.authentication import (
+    CachedTokenAuthentication,
+    SignedTokenAuthentication,
+    read_access_token,
+    revocation_list,
+    token_cache_key,
+)
+from profile.bloom import BloomFilter
+from profile.models import Customer, RevokedToken, Seller
+from shop.cache import get_cache
+
+
+class CachedTokenAuthenticationTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="customer", password="testpassword"
+        )
+        self.customer = Customer.objects.create(user=self.user)
+        self.token = Token.objects.create(user=self.user)
+
+    def authenticate(self, key=None):
+        request = APIRequestFactory().get(
+            "/", HTTP_AUTHORIZATION=f"Token {key or self.token.key}"
+        )
+        return CachedTokenAuthentication().authenticate(request)
+
+    def test_known_tokens_need_no_query(self):
+        user, token = self.authenticate()
+        self.assertEqual(user, self.user)
+
+        with self.assertNumQueries(0):
+            user, token = self.authenticate()
+            self.assertEqual(token.key, self.token.key)
+            # the roles the permissions check come along
+            self.assertEqual(user.customer, self.customer)
+            self.assertFalse(hasattr(user, "seller"))
+
+    def test_the_cache_keeps_no_user_data(self):
+        self.authenticate()
+        entry = get_cache().get(token_cache_key(self.token.key))
+        self.assertNotIn(self.user.password, str(entry))
+
+        user, token = self.authenticate()
+        self.assertEqual(token.user, user)
+        # the other fields are loaded on first use
+        with self.assertNumQueries(1):
+            self.assertEqual(user.username, "customer")
+        with self.assertNumQueries(1):
+            self.assertIsNone(user.customer.address)
+
+    def test_unknown_token(self):
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate("0" * 40)
+
+    def test_logout_evicts_the_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        response = self.client.post(reverse("logout"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse("logout"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivation_evicts_the_user(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaisesMessage(
+            AuthenticationFailed, "User inactive or deleted."
+        ):
+            self.authenticate()
+
+        self.user.is_active = True
+        self.user.save()
+        self.assertEqual(self.authenticate()[0], self.user)
+
+    def test_logins_and_profile_edits_keep_the_cache(self):
+        self.authenticate()
+        response = self.client.post(
+            reverse("login"),
+            {"username": "customer", "password": "testpassword"},
+            format="json",
+        )
+        self.assertEqual(response.data["token"], self.token.key)
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = "Ada"
+        with CaptureQueriesContext(connection) as queries:
+            user.save()
+        # no token lookup to evict them
+        self.assertFalse(
+            any("authtoken_token" in query["sql"] for query in queries)
+        )
+        with self.assertNumQueries(0):
+            self.authenticate()
+
+    def test_losing_staff_evicts_the_user(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.assertTrue(self.authenticate()[0].is_staff)
+        user = User.objects.get(pk=self.user.pk)
+        user.is_staff = False
+        user.save(update_fields=["is_staff"])
+        self.assertFalse(self.authenticate()[0].is_staff)
+
+    def test_new_roles_apply_at_once(self):
+        self.authenticate()
+        seller = Seller.objects.create(user=self.user)
+        user, _ = self.authenticate()
+        self.assertEqual(user.seller, seller)
+
+    @override_settings(AUTH_TOKEN_TTL=60)
+    def test_tokens_expire(self):
+        self.authenticate()
+        Token.objects.filter(pk=self.token.pk).update(
+            created=timezone.now() - timedelta(seconds=61)
+        )
+        cache.clear()
+        with self.assertRaisesMessage(
+            AuthenticationFailed, "Token has expired."
+        ):
+            self.authenticate()
+
+        # logging in again issues a new one
+        response = self.client.post(
+            reverse("login"),
+            {"username": "customer", "password": "testpassword"},
+            format="json",
+        )
+        self.assertNotEqual(response.data["token"], self.token.key)
+        user, _ = self.authenticate(response.data["token"])
+        self.assertEqual(user, self.user)
+
+    @override_settings(AUTH_TOKEN_TTL=60)
+    def test_delete_expired_tokens(self):
+        old = timezone.now() - timedelta(seconds=61)
+        for i in range(5):
+            token = Token.objects.create(
+                user=User.objects.create_user(username=f"user-{i}")
+            )
+            Token.objects.filter(pk=token.pk).update(created=old)
+
+        out = StringIO()
+        call_command("delete_expired_tokens", batch_size=2, stdout=out)
+        self.assertEqual(
+            out.getvalue(),
+            "Deleted 0 expired revocations.\nDeleted 5 expired tokens.\n",
+        )
+        self.assertEqual(list(Token.objects.all()), [self.token])
+
+
+@override_settings(AUTH_SIGNED_TOKENS=True, AUTH_REVOCATION_SYNC_INTERVAL=30)
+class SignedTokenAuthenticationTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="customer", password="testpassword"
+        )
+        self.customer = Customer.objects.create(user=self.user)
+        self.token = self.login()
+        # forget the revocations of the previous tests
+        revocation_list.sync()
+
+    def login(self):
+        response = self.client.post(
+            reverse("login"),
+            {"username": "customer", "password": "testpassword"},
+            format="json",
+        )
+        self.assertEqual(response.data["expires_in"], 900)
+        return response.data["token"]
+
+    def authenticate(self, key=None):
+        request = APIRequestFactory().get(
+            "/", HTTP_AUTHORIZATION=f"Token {key or self.token}"
+        )
+        return SignedTokenAuthentication().authenticate(request)
+
+    def test_login_issues_no_database_token(self):
+        self.assertFalse(Token.objects.exists())
+
+    def test_verification_needs_no_query(self):
+        with self.assertNumQueries(0):
+            user, token = self.authenticate()
+            self.assertEqual(user.pk, self.user.pk)
+            self.assertTrue(user.is_authenticated)
+            self.assertFalse(user.is_staff)
+            self.assertFalse(hasattr(user, "seller"))
+        self.assertEqual(user.customer, self.customer)
+
+    def test_database_tokens_are_left_to_the_next_class(self):
+        key = Token.objects.create(user=self.user).key
+        self.assertIsNone(self.authenticate(key))
+
+    def test_tampered_tokens(self):
+        payload, signature = self.token.rsplit(":", 1)
+        for key in (payload + ":" + "A" * len(signature), "x:y"):
+            with self.assertRaisesMessage(
+                AuthenticationFailed, "Invalid token."
+            ):
+                self.authenticate(key)
+
+    def test_tokens_expire(self):
+        with override_settings(AUTH_ACCESS_TOKEN_TTL=0):
+            with self.assertRaisesMessage(
+                AuthenticationFailed, "Token has expired."
+            ):
+                self.authenticate()
+
+    def test_logout_revokes_the_token(self):
+        other = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token}")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("logout"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post(reverse("logout"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        # the other session goes on
+        self.assertEqual(self.authenticate(other)[0].pk, self.user.pk)
+
+    def test_revocations_reach_other_processes_on_sync(self):
+        token = read_access_token(self.token)
+        RevokedToken.objects.create(key=token.id, expires_at=token.expires_at)
+        # not synced yet
+        self.authenticate()
+        revocation_list.sync()
+        with self.assertRaisesMessage(
+            AuthenticationFailed, "Token was revoked."
+        ):
+            self.authenticate()
+
+    def test_deactivation_revokes_the_user(self):
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        with self.assertRaisesMessage(
+            AuthenticationFailed, "Token was revoked."
+        ):
+            self.authenticate()
+
+        self.user.is_active = True
+        self.user.save()
+        self.assertEqual(self.authenticate(self.login())[0].pk, self.user.pk)
+
+    def test_losing_staff_revokes_the_user(self):
+        self.user.is_staff = True
+        self.user.save()
+        token = self.login()
+        self.assertTrue(self.authenticate(token)[0].is_staff)
+
+        self.user.is_staff = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(update_fields=["is_staff"])
+        with self.assertRaisesMessage(
+            AuthenticationFailed, "Token was revoked."
+        ):
+            self.authenticate(token)
+        self.assertFalse(self.authenticate(self.login())[0].is_staff)
+
+    def test_deletion_revokes_the_user(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        with self.assertRaisesMessage(
+            AuthenticationFailed, "Token was revoked."
+        ):
+            self.authenticate()
+
+
+class BloomFilterTest(SimpleTestCase):
+
+    def test_members_are_always_found(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        keys = [f"key-{i}" for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+
+        false_positives = sum(
+            f"other-{i}" in bloom for i in range(10000)
+        )
+        self.assertLess(false_positives, 300)
@@ -0,0 +1,118 @@
+from decimal import Decimal
+from io import StringIO
+
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.core.management import call_command
+from django.urls import reverse
+from django.contrib.auth.models import User
+from profile.models import Customer, Seller, Cart, CartItem
+from shop.models import Product, Category, ProductSales
+
+
+class SellerDashboardTests(APITestCase):
+    def setUp(self):
+        self.seller_user = User.objects.create_user(username="seller")
+        self.seller = Seller.objects.create(user=self.seller_user)
+        self.category = Category.objects.create(name="Electronics")
+        self.radio, self.lamp, self.clock = (
+            Product.objects.create(
+                name=name,
+                price=price,
+                stock=10,
+                seller=self.seller,
+                category=self.category,
+            )
+            for name, price in (("Radio", 20), ("Lamp", 5), ("Clock", 8))
+        )
+        self.customer_user = User.objects.create_user(username="customer")
+        self.customer = Customer.objects.create(user=self.customer_user)
+        self.cart = Cart.objects.create(customer=self.customer)
+        self.url = reverse("seller-dashboard", args=[self.seller.pk])
+
+    def checkout(self, *lines):
+        for product, quantity in lines:
+            CartItem.objects.create(
+                cart=self.cart, product=product, quantity=quantity
+            )
+        self.client.force_authenticate(user=self.customer_user)
+        response = self.client.post(
+            reverse("order", args=[self.customer.pk, self.cart.pk]),
+            {},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data["id"]
+
+    def dashboard(self, params=None):
+        self.client.force_authenticate(user=self.seller_user)
+        # the seller, their roles, the totals and the top products
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_checkout_adds_to_the_sales(self):
+        self.checkout((self.radio, 1), (self.lamp, 3))
+        self.checkout((self.lamp, 2))
+        data = self.dashboard()
+        self.assertEqual(data["seller"], self.seller.pk)
+        self.assertEqual(data["product_count"], 3)
+        self.assertEqual(data["units_sold"], 6)
+        self.assertEqual(Decimal(data["revenue"]), 45)
+        # the stock was reserved when the items were added to the cart
+        self.assertEqual(data["stock"], 30)
+        self.assertEqual(
+            [
+                (product["name"], product["units_sold"], product["revenue"])
+                for product in data["top_products"]
+            ],
+            [("Lamp", 5, "25.00"), ("Radio", 1, "20.00")],
+        )
+        top = self.dashboard({"top": 1})["top_products"]
+        self.assertEqual([product["name"] for product in top], ["Lamp"])
+
+    def test_sales_keep_the_price_paid(self):
+        self.checkout((self.radio, 1))
+        self.radio.price = 30
+        self.radio.save()
+        self.checkout((self.radio, 1))
+        self.assertEqual(Decimal(self.dashboard()["revenue"]), 50)
+
+    def test_deleting_an_order_takes_it_off_the_sales(self):
+        order = self.checkout((self.radio, 1), (self.lamp, 3))
+        self.checkout((self.lamp, 2))
+        response = self.client.delete(reverse(
+            "order-detail", args=[self.customer.pk, self.cart.pk, order]
+        ))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        data = self.dashboard()
+        self.assertEqual(data["units_sold"], 2)
+        self.assertEqual(Decimal(data["revenue"]), 10)
+        self.assertEqual(
+            [product["name"] for product in data["top_products"]], ["Lamp"]
+        )
+
+    def test_a_seller_without_sales(self):
+        data = self.dashboard()
+        self.assertEqual(data["units_sold"], 0)
+        self.assertEqual(Decimal(data["revenue"]), 0)
+        self.assertEqual(data["stock"], 30)
+        self.assertEqual(data["top_products"], [])
+
+    def test_only_the_seller_sees_it(self):
+        self.client.force_authenticate(user=self.customer_user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_rebuild_sales(self):
+        self.checkout((self.radio, 1), (self.lamp, 3))
+        self.checkout((self.radio, 2))
+        expected = self.dashboard()
+        ProductSales.objects.all().delete()
+        ProductSales.objects.create(product=self.clock, units_sold=7)
+
+        out = StringIO()
+        call_command("rebuild_sales", batch_size=1, stdout=out)
+        self.assertEqual(out.getvalue(), "Rebuilt the sales of 2 products.\n")
+        self.assertEqual(self.dashboard(), expected)
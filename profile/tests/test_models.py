@@ -1,8 +1,12 @@
+from decimal import Decimal
+
 from rest_framework.test import APITestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from profile.models import (
-    Customer, Seller, Address, Cart, Order, OrderItem, CartItem)
+    Customer, Seller, Address, Cart, Order, OrderItem, CartItem, City)
 from shop.models import Product, Category
 from django.contrib.auth.models import User
 
@@ -146,6 +150,34 @@ class SellerTests(APITestCase):
         )
         self.assertEqual(response.data["address_details"]["city"], "Bremen")
 
+    def test_addresses_share_a_normalized_city(self):
+        address = Address.objects.create(
+            street="Other Street",
+            postal_code="12345",
+            phone_number="+1684564674",
+            city="  BERLIN ",
+        )
+        self.assertEqual(address.normalized_city, self.address.normalized_city)
+        self.assertEqual(address.normalized_city.name, "Berlin")
+        self.assertEqual(City.objects.count(), 1)
+
+        address.city = "Bremen"
+        address.save(update_fields=["city"])
+        address.refresh_from_db()
+        self.assertEqual(address.normalized_city.key, "bremen")
+
+    def test_filter_sellers_by_city(self):
+        self.client.force_authenticate(user=self.user_super_user)
+        for params, count in (
+            ({"city": "berlin"}, 1),
+            ({"city": "Berl"}, 0),
+            ({"city_prefix": "BER"}, 1),
+            ({"city_prefix": "ham"}, 0),
+        ):
+            response = self.client.get(self.seller_url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data), count, params)
+
     def test_delete_seller(self):
         self.client.force_authenticate(user=self.user_seller.user)
         response = self.client.delete(self.seller_get_id_url)
@@ -269,6 +301,40 @@ class CartItemTests(APITestCase):
         self.assertEqual(CartItem.objects.count(), 1)
         self.assertEqual(CartItem.objects.get().product, self.product)
 
+    def test_cart_changes_move_the_stock(self):
+        self.client.force_authenticate(user=self.user)
+
+        def stock():
+            self.product.refresh_from_db()
+            return self.product.stock
+
+        data = {"cart": self.cart.pk, "product": self.product.pk}
+        response = self.client.post(
+            self.cart_item_url, {**data, "quantity": 3}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["quantity"], 5)
+        self.assertEqual(stock(), 7)
+        response = self.client.post(
+            self.cart_item_url, {**data, "quantity": 8}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(stock(), 7)
+
+        response = self.client.put(
+            self.cart_item_detail_url, {**data, "quantity": 9}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(stock(), 3)
+        response = self.client.put(
+            self.cart_item_detail_url, {**data, "quantity": 6}, format="json"
+        )
+        self.assertEqual(stock(), 6)
+
+        response = self.client.delete(self.cart_item_detail_url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(stock(), 12)
+
     def test_retrieve_cart_item(self):
         self.client.force_authenticate(user=self.user)
         response = self.client.get(self.cart_item_detail_url)
@@ -387,11 +453,25 @@ class OrderTests(APITestCase):
 
     def test_get_order_list(self):
         self.client.force_authenticate(user=self.user_customer)
+        # the orders are listed by the paginated order history
         response = self.client.get(self.order_url)
+        self.assertEqual(
+            response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED
+        )
+        response = self.client.get(
+            reverse("order-history", args=[self.customer.pk])
+        )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data[0]["customer"], self.customer.pk)
+        self.assertEqual(
+            response.data["results"][0]["customer"], self.customer.pk
+        )
         self.assertEqual(Order.objects.count(), 1)
 
+    def test_create_order_requires_authentication(self):
+        response = self.client.post(self.order_url, {}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(CartItem.objects.filter(cart=self.cart).count(), 1)
+
     def test_create_order(self):
         Order.objects.filter(customer=self.customer).delete()
         self.client.force_authenticate(user=self.user_customer)
@@ -413,6 +493,66 @@ class OrderTests(APITestCase):
         order_item = OrderItem.objects.first()
         self.assertEqual(order_item.order, order)
         self.assertEqual(order_item.quantity, 2)
+        self.assertEqual(order_item.product, self.product)
+        self.assertEqual(order_item.product_name, "Test Product")
+        self.assertEqual(order_item.unit_price, Decimal("10.00"))
+        self.assertEqual(respones.data["total"], "20.00")
+        self.assertEqual(respones.data["item_count"], 2)
+        self.assertEqual(respones.data["order_items"][0]["total"], "20.00")
+
+    def test_order_keeps_the_price_it_was_placed_at(self):
+        Order.objects.filter(customer=self.customer).delete()
+        self.client.force_authenticate(user=self.user_customer)
+        self.client.post(self.order_url, {}, format="json")
+        Product.objects.filter(pk=self.product.pk).update(
+            name="Renamed", price=99
+        )
+        self.product.delete()
+
+        response = self.client.get(
+            reverse("order-history", args=[self.customer.pk])
+        )
+        order = response.data["results"][0]
+        item = order["order_items"][0]
+        self.assertIsNone(item["product"])
+        self.assertEqual(item["product_name"], "Test Product")
+        self.assertEqual(item["unit_price"], "10.00")
+        self.assertEqual(order["total"], "20.00")
+
+    def test_checkout_queries_do_not_grow_with_the_cart(self):
+        def checkout(lines):
+            Order.objects.all().delete()
+            for i in range(lines):
+                CartItem.objects.create(
+                    cart=self.cart,
+                    product=Product.objects.create(
+                        name=f"Product {i}",
+                        price=i + 1,
+                        seller=self.product.seller,
+                        category=self.product.category,
+                    ),
+                    quantity=1,
+                )
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    self.order_url, {}, format="json"
+                )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(
+                len(response.data["order_items"]), lines + 1
+            )
+            self.assertEqual(
+                Decimal(response.data["total"]),
+                20 + lines * (lines + 1) // 2,
+            )
+            self.assertFalse(CartItem.objects.exists())
+            CartItem.objects.create(
+                cart=self.cart, product=self.product, quantity=2
+            )
+            return len(queries)
+
+        self.client.force_authenticate(user=self.user_customer)
+        self.assertEqual(checkout(1), checkout(50))
 
     def test_retrieve_order_by_id(self):
         self.client.force_authenticate(user=self.user_customer)
@@ -440,3 +580,273 @@ class OrderTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["shipping_address"], self.address.pk)
         self.assertEqual(response.data["customer"], self.customer.pk)
+
+
+class OrderHistoryTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="customer")
+        self.customer = Customer.objects.create(user=self.user)
+        self.product = Product.objects.create(
+            name="Radio",
+            price=20,
+            seller=Seller.objects.create(
+                user=User.objects.create_user(username="seller")
+            ),
+            category=Category.objects.create(name="Electronics"),
+        )
+        self.url = reverse("order-history", args=[self.customer.pk])
+        self.client.force_authenticate(user=self.user)
+
+    def place_orders(self, count, lines=2):
+        orders = []
+        for _ in range(count):
+            order = Order.objects.create(customer=self.customer)
+            OrderItem.objects.bulk_create(
+                OrderItem(
+                    order=order,
+                    product=self.product,
+                    product_name="Radio",
+                    unit_price=20,
+                    quantity=i + 1,
+                )
+                for i in range(lines)
+            )
+            orders.append(order)
+        return orders
+
+    def test_pages_newest_first(self):
+        orders = self.place_orders(5)
+        seen = []
+        url = self.url + "?page_size=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen += [order["id"] for order in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(seen, [order.pk for order in reversed(orders)])
+
+    def test_summary(self):
+        order, = self.place_orders(1, lines=3)
+        response = self.client.get(self.url, {"summary": "1"})
+        self.assertEqual(response.data["results"], [{
+            "id": order.pk,
+            "created_at": response.data["results"][0]["created_at"],
+            "total": "120.00",
+            "item_count": 6,
+        }])
+
+    def test_full_orders_have_their_items(self):
+        self.place_orders(1, lines=3)
+        order = self.client.get(self.url).data["results"][0]
+        self.assertEqual(order["total"], "120.00")
+        self.assertEqual(
+            [item["total"] for item in order["order_items"]],
+            ["20.00", "40.00", "60.00"],
+        )
+
+    def test_queries_do_not_grow_with_the_history(self):
+        def queries(summary):
+            with CaptureQueriesContext(connection) as context:
+                self.client.get(self.url, {"summary": summary})
+            return len(context)
+
+        self.place_orders(1, lines=1)
+        few = queries("0"), queries("1")
+        self.place_orders(30, lines=10)
+        self.assertEqual((queries("0"), queries("1")), few)
+
+    def test_only_the_customer_sees_the_history(self):
+        self.place_orders(2)
+        other = User.objects.create_user(username="other")
+        Customer.objects.create(user=other)
+        self.client.force_authenticate(user=other)
+        response = self.client.get(self.url)
+        self.assertEqual(response.data["results"], [])
+
+        self.client.force_authenticate(
+            user=User.objects.create_user(username="admin", is_staff=True)
+        )
+        self.assertEqual(len(self.client.get(self.url).data["results"]), 2)
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class CartBatchTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="customer")
+        self.customer = Customer.objects.create(user=self.user)
+        self.cart = Cart.objects.create(customer=self.customer)
+        seller = Seller.objects.create(
+            user=User.objects.create_user(username="seller")
+        )
+        category = Category.objects.create(name="Electronics")
+        self.radio, self.lamp, self.fan = (
+            Product.objects.create(
+                name=name, price=10, stock=5,
+                seller=seller, category=category,
+            )
+            for name in ("Radio", "Lamp", "Fan")
+        )
+        self.url = reverse("cart-batch", args=[self.customer.pk])
+        self.client.force_authenticate(user=self.user)
+
+    def batch(self, *operations):
+        return self.client.post(
+            self.url, {"operations": list(operations)}, format="json"
+        )
+
+    def quantities(self):
+        return dict(
+            CartItem.objects.filter(cart=self.cart)
+            .values_list("product__name", "quantity")
+        )
+
+    def stock(self):
+        return dict(Product.objects.values_list("name", "stock"))
+
+    def test_operations_apply_in_order(self):
+        CartItem.objects.create(cart=self.cart, product=self.fan, quantity=2)
+        Product.objects.filter(pk=self.fan.pk).update(stock=3)
+        response = self.batch(
+            {"op": "add", "product": self.radio.pk, "quantity": 2},
+            {"op": "add", "product": self.radio.pk, "quantity": 1},
+            {"op": "set", "product": self.lamp.pk, "quantity": 4},
+            {"op": "remove", "product": self.fan.pk},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {item["product"]: item["quantity"]
+             for item in response.data["cart_items"]},
+            {self.radio.pk: 3, self.lamp.pk: 4},
+        )
+        self.assertEqual(self.quantities(), {"Radio": 3, "Lamp": 4})
+        self.assertEqual(self.stock(), {"Radio": 2, "Lamp": 1, "Fan": 5})
+
+        self.batch({"op": "set", "product": self.radio.pk, "quantity": 1})
+        self.assertEqual(self.quantities(), {"Radio": 1, "Lamp": 4})
+        self.assertEqual(self.stock()["Radio"], 4)
+
+    def test_all_or_nothing(self):
+        CartItem.objects.create(
+            cart=self.cart, product=self.radio, quantity=1
+        )
+        response = self.batch(
+            {"op": "set", "product": self.radio.pk, "quantity": 3},
+            {"op": "add", "product": self.lamp.pk, "quantity": 6},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["products"], [str(self.lamp.pk)])
+        self.assertEqual(self.quantities(), {"Radio": 1})
+        self.assertEqual(self.stock()["Radio"], 5)
+
+    def test_invalid_operations(self):
+        for operation in (
+            {"op": "add", "product": self.radio.pk},
+            {"op": "set", "product": self.radio.pk},
+            {"op": "buy", "product": self.radio.pk, "quantity": 1},
+            {"op": "add", "product": 0, "quantity": 1},
+        ):
+            response = self.batch(operation)
+            self.assertEqual(
+                response.status_code, status.HTTP_400_BAD_REQUEST
+            )
+        self.assertEqual(self.quantities(), {})
+
+    def test_only_the_own_cart(self):
+        other = Customer.objects.create(
+            user=User.objects.create_user(username="other")
+        )
+        Cart.objects.create(customer=other)
+        response = self.client.post(
+            reverse("cart-batch", args=[other.pk]),
+            {"operations": [
+                {"op": "add", "product": self.radio.pk, "quantity": 1}
+            ]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+        response = self.batch(
+            {"op": "add", "product": self.radio.pk, "quantity": 1}
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.quantities(), {})
+
+    def test_queries_do_not_grow_with_the_batch(self):
+        def batch(products):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.batch(*(
+                    {"op": "add", "product": product.pk, "quantity": 1}
+                    for product in products
+                ))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(queries)
+
+        self.assertEqual(batch([self.radio]), batch([self.lamp, self.fan]))
+
+
+class ProfileAPITests(APITestCase):
+    def setUp(self):
+        self.address = Address.objects.create(
+            street="Test Street",
+            postal_code="12345",
+            phone_number="+1684564673",
+            city="Berlin",
+        )
+        self.user = User.objects.create_user(
+            username="seller", first_name="Ada", last_name="Lovelace"
+        )
+        self.customer = Customer.objects.create(
+            user=self.user, address=self.address
+        )
+        self.seller = Seller.objects.create(
+            user=self.user, address=self.address
+        )
+        category = Category.objects.create(name="Electronics")
+        for i in range(3):
+            Product.objects.create(
+                name=f"Radio {i}", price=20,
+                seller=self.seller, category=category,
+            )
+        self.url = reverse("profile-api")
+        self.client.force_authenticate(user=self.user)
+
+    def test_profile_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["user"], self.user.pk)
+        self.assertEqual(response.data["username"], "seller")
+        self.assertEqual(response.data["full_name"], "Ada Lovelace")
+        self.assertEqual(response.data["customer"], self.customer.pk)
+        self.assertEqual(response.data["seller"], self.seller.pk)
+        self.assertEqual(response.data["address_details"]["city"], "Berlin")
+        self.assertNotIn("products", response.data)
+
+    def test_products_are_opt_in_and_paginated(self):
+        response = self.client.get(
+            self.url, {"products": "1", "page_size": 2}
+        )
+        products = response.data["products"]
+        self.assertEqual(
+            [product["name"] for product in products["results"]],
+            ["Radio 2", "Radio 1"],
+        )
+        response = self.client.get(products["next"])
+        self.assertEqual(
+            [product["name"]
+             for product in response.data["products"]["results"]],
+            ["Radio 0"],
+        )
+
+    def test_neither_customer_nor_seller(self):
+        self.client.force_authenticate(
+            user=User.objects.create_user(username="nobody")
+        )
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
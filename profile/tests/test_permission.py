@@ -0,0 +1,111 @@
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from profile.authentication import CachedTokenAuthentication
+from profile.models import Cart, CartItem, Customer, Order, Seller
+from profile.permission import (
+    IsCustomerOrAdminForRelatedObjects,
+    IsOwnerOrAdmin,
+    IsSellerOrAdmin,
+)
+from shop.models import Category, Product
+
+
+class PermissionQueryTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="customer")
+        self.customer = Customer.objects.create(user=self.user)
+        self.cart = Cart.objects.create(customer=self.customer)
+        seller_user = User.objects.create_user(username="seller")
+        self.seller = Seller.objects.create(user=seller_user)
+        product = Product.objects.create(
+            name="Radio",
+            price=20,
+            seller=self.seller,
+            category=Category.objects.create(name="Electronics"),
+        )
+        other = Cart.objects.create(customer=Customer.objects.create(
+            user=User.objects.create_user(username="other")
+        ))
+        for cart in (self.cart, other):
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+            Order.objects.create(customer=cart.customer, cart=cart)
+
+    def request(self, user):
+        request = APIRequestFactory().get("/")
+        force_authenticate(request, user=user)
+        return Request(request)
+
+    def check(self, permission, request, objects):
+        return [
+            bool(permission().has_object_permission(request, None, obj))
+            for obj in objects
+        ]
+
+    def test_roles_are_resolved_once_per_request(self):
+        request = self.request(User.objects.get(pk=self.user.pk))
+        items = list(CartItem.objects.select_related("cart").order_by("id"))
+        objects = [
+            *Cart.objects.order_by("id"),
+            *items,
+            *Order.objects.order_by("id"),
+        ]
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                self.check(IsCustomerOrAdminForRelatedObjects, request,
+                           objects),
+                [True, False] * 3,
+            )
+            self.assertEqual(
+                self.check(IsOwnerOrAdmin, request, [
+                    self.customer, self.seller,
+                ]),
+                [True, False],
+            )
+            self.assertEqual(
+                self.check(IsSellerOrAdmin, request, [self.seller]),
+                [False],
+            )
+
+    def test_sellers(self):
+        request = self.request(User.objects.get(username="seller"))
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                self.check(IsSellerOrAdmin, request, [self.seller]), [True]
+            )
+            self.assertEqual(
+                self.check(IsCustomerOrAdminForRelatedObjects, request,
+                           [self.cart]),
+                [False],
+            )
+
+    def test_cached_token_users_need_no_query(self):
+        cache.clear()
+        token = Token.objects.create(user=self.user)
+        factory = APIRequestFactory()
+        request = Request(
+            factory.get("/", HTTP_AUTHORIZATION=f"Token {token.key}"),
+            authenticators=[CachedTokenAuthentication()],
+        )
+        request.user  # authenticate, filling the cache
+        request = Request(
+            factory.get("/", HTTP_AUTHORIZATION=f"Token {token.key}"),
+            authenticators=[CachedTokenAuthentication()],
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.check(IsOwnerOrAdmin, request, [self.customer]), [True]
+            )
+
+    def test_admins(self):
+        request = self.request(
+            User.objects.create_user(username="admin", is_staff=True)
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.check(IsSellerOrAdmin, request, [self.seller]), [True]
+            )
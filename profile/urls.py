@@ -4,10 +4,13 @@ from profile.views import (
     CustomerDetail,
     SellerList,
     SellerDetail,
+    SellerDashboard,
     CartDetail,
     CartItemList,
     CartItemDetail,
+    CartBatch,
     OrderList,
+    OrderHistory,
     OrderDetail,
     CartList,
     UpgradeToSellerView,
@@ -28,6 +31,11 @@ urlpatterns = [
         CustomerDetail.as_view(), name="customer-detail"),
     path("api/sellers/", SellerList.as_view(), name="sellers"),
     path("api/seller/<int:pk>/", SellerDetail.as_view(), name="seller-detail"),
+    path(
+        "api/seller/<int:pk>/dashboard/",
+        SellerDashboard.as_view(),
+        name="seller-dashboard",
+    ),
     path("api/customer/<int:customer_id>/cart/",
          CartList.as_view(), name="carts"),
     path(
@@ -38,6 +46,11 @@ urlpatterns = [
     path(
         "api/customer/<int:customer_id>/cart-items/",
         CartItemList.as_view(), name="cart"),
+    path(
+        "api/customer/<int:customer_id>/cart-items/batch/",
+        CartBatch.as_view(),
+        name="cart-batch",
+    ),
     path(
         "api/customer/<int:customer_id>/cart-item/<int:pk>/",
         CartItemDetail.as_view(),
@@ -48,6 +61,11 @@ urlpatterns = [
         OrderList.as_view(),
         name="order",
     ),
+    path(
+        "api/customer/<int:customer_id>/orders/",
+        OrderHistory.as_view(),
+        name="order-history",
+    ),
     path(
         "api/customer/<int:customer_id>/order/<int:cart_id>/<int:pk>/",
         OrderDetail.as_view(),
@@ -1,10 +1,13 @@
+from decimal import Decimal
+
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import generics, permissions, serializers
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth.models import User
 from rest_framework.authtoken.models import Token
 from rest_framework import status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 from django.views.generic.edit import UpdateView
 
@@ -18,6 +21,14 @@ from django.views.generic.edit import CreateView
 from django.shortcuts import get_object_or_404
 
 from profile.models import Customer, Seller, Order, OrderItem, Cart, CartItem
+from profile.models import reservation_expiry
+from profile.authentication import (
+    AccessToken,
+    access_token_ttl,
+    issue_access_token,
+    revoke_access_token,
+    token_expired,
+)
 from profile.permission import (
     IsOwnerOrAdmin,
     IsCustomerOrAdminForRelatedObjects,
@@ -26,15 +37,27 @@ from profile.permission import (
 from profile.serializers import (
     CustomerSerializer,
     SellerSerializer,
+    CartBatchSerializer,
     CartItemSerializer,
     CartSerializer,
     OrderSerializer,
+    OrderSummarySerializer,
+    ProfileSerializer,
+    SellerDashboardSerializer,
     UserSerializer,
     SellerProductSerializer,
 )
 
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db import transaction
+from django.db.models import Count, Prefetch, Sum, Value
+from django.db.models.functions import Coalesce
 from profile.filters import SellerFilter
+from shop.models import Product
+from shop.pagination import KeysetPagination, OrderKeysetPagination
+from shop.sales import record_sales
+from shop.serializers import ProductSerializer
+from shop.stock import change_reservation, release_stock
 
 
 class CustomerListCreateView(generics.ListCreateAPIView):
@@ -70,6 +93,52 @@ class SellerDetail(generics.RetrieveUpdateDestroyAPIView):
             return SellerProductSerializer  # Limited profile for others
 
 
+class SellerDashboard(generics.GenericAPIView):
+    """
+    Sales of a seller: units sold, revenue and stock left over all their
+    products, and their best selling products (?top=N, 5 by default, 50
+    at most). Only the seller or an admin sees it.
+
+    Read from the ProductSales totals that checkout keeps up to date, so
+    the cost grows with the seller's products, not with their orders.
+    """
+
+    permission_classes = [IsAuthenticated, IsSellerOrAdmin]
+    queryset = Seller.objects.all()
+    serializer_class = SellerDashboardSerializer
+    max_top = 50
+
+    def get_top(self):
+        try:
+            top = int(self.request.query_params.get("top", 5))
+        except ValueError:
+            raise serializers.ValidationError(
+                {"message": "top must be a number."}
+            )
+        return max(0, min(top, self.max_top))
+
+    def get(self, request, *args, **kwargs):
+        seller = self.get_object()
+        products = Product.objects.filter(seller=seller)
+        totals = products.aggregate(
+            product_count=Count("pk"),
+            units_sold=Coalesce(Sum("sales__units_sold"), Value(0)),
+            revenue=Coalesce(Sum("sales__revenue"), Value(Decimal("0.00"))),
+            stock=Coalesce(Sum("stock"), Value(0)),
+        )
+        top_products = products.filter(
+            sales__units_sold__gt=0
+        ).select_related("sales").order_by(
+            "-sales__revenue", "-sales__units_sold", "id"
+        )[:self.get_top()]
+        serializer = self.get_serializer({
+            "seller": seller.pk,
+            **totals,
+            "top_products": top_products,
+        })
+        return Response(serializer.data)
+
+
 class RegisterView(APIView):
     permission_classes = []
 
@@ -110,8 +179,19 @@ class LoginView(APIView):
         password = request.data.get("password")
         user = authenticate(request, username=username, password=password)
 
+        if user is not None and getattr(settings, "AUTH_SIGNED_TOKENS", False):
+            return Response(
+                {
+                    "token": issue_access_token(user),
+                    "expires_in": access_token_ttl(),
+                },
+                status=status.HTTP_200_OK,
+            )
         if user is not None:
             token, created = Token.objects.get_or_create(user=user)
+            if not created and token_expired(token):
+                token.delete()
+                token = Token.objects.create(user=user)
             return Response({"token": token.key}, status=status.HTTP_200_OK)
         else:
             return Response(
@@ -121,11 +201,13 @@ class LoginView(APIView):
 
 
 class LogoutView(APIView):
-    authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
-        request.user.auth_token.delete()
+        if isinstance(request.auth, AccessToken):
+            revoke_access_token(request.auth)
+        else:
+            request.user.auth_token.delete()
         return Response(status=status.HTTP_200_OK)
 
 
@@ -191,6 +273,36 @@ class CartItemList(generics.ListCreateAPIView):
         serializer.save(cart=cart)
 
 
+class CartBatch(APIView):
+    """
+    Changes several items of the authenticated customer's cart at once:
+    {"operations": [{"op": "add", "product": 1, "quantity": 2},
+                    {"op": "set", "product": 2, "quantity": 1},
+                    {"op": "remove", "product": 3}]}
+    The operations apply in order and in one transaction, all or nothing;
+    the response is the resulting cart.
+    """
+
+    permission_classes = [
+        IsAuthenticated, IsCustomerOrAdminForRelatedObjects
+    ]
+
+    def post(self, request, customer_id):
+        cart = get_object_or_404(
+            Cart, customer_id=customer_id, customer__user=request.user
+        )
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(cart=cart)
+
+        cart = Cart.objects.prefetch_related(
+            Prefetch(
+                "cart_items", queryset=CartItem.objects.order_by("id")
+            )
+        ).get(pk=cart.pk)
+        return Response(CartSerializer(cart).data, status=status.HTTP_200_OK)
+
+
 class CartItemDetail(generics.RetrieveUpdateDestroyAPIView):
     """
     CartItemDetail view only authenticated customer of the cart can
@@ -207,7 +319,8 @@ class CartItemDetail(generics.RetrieveUpdateDestroyAPIView):
             raise serializers.ValidationError("User is not authenticated")
         item_id = self.kwargs.get("pk")
         customer_id = self.kwargs.get("customer_id")
-        queryset = CartItem.objects.filter(
+        # the cart along, for the permission check
+        queryset = CartItem.objects.select_related("cart").filter(
             cart__customer__id=customer_id, pk=item_id
         )
 
@@ -226,82 +339,140 @@ class CartItemDetail(generics.RetrieveUpdateDestroyAPIView):
                 {"message": "Quantity must be greater than 0"}
             )
 
-        current_quantity = instance.quantity
-
-        if new_quantity > current_quantity:
-            increase_amount = new_quantity - current_quantity
-            if instance.product.stock >= increase_amount:
-                instance.product.stock -= increase_amount
-                instance.quantity = new_quantity
-                instance.product.save()
-            else:
+        with transaction.atomic():
+            # Lock the item, so concurrent changes to it see each other's
+            # quantity; the product row is only locked by the UPDATE
+            instance = CartItem.objects.select_for_update().filter(
+                pk=instance.pk
+            ).first()
+            if instance is None:
+                # released by the sweeper in the meantime
+                raise serializers.ValidationError("Cart item not found")
+            if not change_reservation(
+                instance.product_id, instance.quantity, new_quantity
+            ):
                 return Response(
                     {"message": "Product out of stock"},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-        elif new_quantity < current_quantity:
-            decrease_amount = current_quantity - new_quantity
-            instance.product.stock += decrease_amount
+
+            if new_quantity == 0:
+                instance.delete()
+                return Response(status=status.HTTP_204_NO_CONTENT)
             instance.quantity = new_quantity
-            instance.product.save()
-
-        if new_quantity == 0:
-            instance.product.stock += current_quantity
-            instance.product.save()
-            instance.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        instance.save()
+            instance.expires_at = reservation_expiry()
+            instance.save(update_fields=["quantity", "expires_at"])
         serializer = self.get_serializer(instance)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
-    def destroy(self, request, *args, **kwargs):
+    def perform_destroy(self, instance):
         """
         method to delete the product from the cart and
         add the quantity back to the stock
         """
-        instance = self.get_object()
-        instance.product.stock += instance.quantity
-        instance.product.save()
-        return super().destroy(request, *args, **kwargs)
+        with transaction.atomic():
+            instance = CartItem.objects.select_for_update().filter(
+                pk=instance.pk
+            ).first()
+            if instance is not None:
+                release_stock(instance.product_id, instance.quantity)
+                instance.delete()
 
 
-class OrderList(generics.ListCreateAPIView):
+class OrderList(generics.CreateAPIView):
     """
-    OrderList view only authenticated customer can access/mofify their order
-    get_queryset method filters the order based on the authenticated user
+    OrderList view only authenticated customer can place their order
     create_order method creates the order and adds the items
-    from the cart to the order and deletes the cart items
+    from the cart to the order and deletes the cart items.
+    The orders are listed, a page at a time, by OrderHistory
     """
 
-    queryset = Order.objects.all()
+    queryset = Order.objects.with_totals().with_items()
     serializer_class = OrderSerializer
-    # TODO remove access of OWNER after testing
-    permission_classes = [IsCustomerOrAdminForRelatedObjects]
+    permission_classes = [
+        IsAuthenticated, IsCustomerOrAdminForRelatedObjects
+    ]
 
     def create(self, request, *args, **kwargs):
         # Create the order for the authenticated user
         customer = request.user.customer
         cart = Cart.objects.get(customer=customer)
 
-        cart_items = CartItem.objects.filter(cart=cart)
-        if not cart_items:
-            raise serializers.ValidationError({"message": "Cart is empty"})
-
         # Use the serializer to create the order
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        order = serializer.save(customer=customer)
 
-        # Add cart items to order and delete them from the cart
-        for item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                cart_item=item,
-                quantity=item.quantity
+        with transaction.atomic():
+            # Locking the items keeps the sweeper (and a second checkout)
+            # from taking them away mid-way; their stock was reserved
+            # when they were added to the cart
+            cart_items = list(
+                CartItem.objects.select_for_update(of=("self",))
+                .filter(cart=cart)
+                .select_related("product")
+                .order_by("id")
+            )
+            if not cart_items:
+                raise serializers.ValidationError(
+                    {"message": "Cart is empty"}
+                )
+            order = serializer.save(customer=customer)
+
+            # Move the cart items to the order with a snapshot of their
+            # product's name and price, then empty the cart
+            items = OrderItem.objects.bulk_create(
+                OrderItem(
+                    order=order,
+                    product_id=item.product_id,
+                    product_name=item.product.name,
+                    unit_price=item.product.price,
+                    quantity=item.quantity,
+                )
+                for item in cart_items
             )
+            record_sales(items)
+            CartItem.objects.filter(
+                pk__in=[item.pk for item in cart_items]
+            ).delete()
+
+        order = self.get_queryset().get(pk=order.pk)
+        return Response(
+            self.get_serializer(order).data, status=status.HTTP_201_CREATED
+        )
+
+
+class OrderHistory(generics.ListAPIView):
+    """
+    Order history of a customer, newest first, a page at a time. Only the
+    customer or an admin sees it.
+
+    ?summary=1 lists only the id, date, total and item count of each order,
+    summed by the database; otherwise the orders come with their items.
+    Either way a page costs a fixed number of queries.
+    """
 
-        cart_items.delete()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    permission_classes = [
+        IsAuthenticated, IsCustomerOrAdminForRelatedObjects
+    ]
+    pagination_class = OrderKeysetPagination
+
+    def is_summary(self):
+        return self.request.query_params.get("summary") in ("1", "true")
+
+    def get_serializer_class(self):
+        if self.is_summary():
+            return OrderSummarySerializer
+        return OrderSerializer
+
+    def get_queryset(self):
+        queryset = Order.objects.with_totals().filter(
+            customer_id=self.kwargs["customer_id"]
+        )
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(customer__user=self.request.user)
+        if not self.is_summary():
+            queryset = queryset.with_items()
+        return queryset
 
 
 class OrderDetail(generics.RetrieveUpdateDestroyAPIView):
@@ -318,7 +489,9 @@ class OrderDetail(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = OrderSerializer
 
     def get_queryset(self):
-        return Order.objects.filter(customer=self.request.user.customer)
+        return Order.objects.with_totals().with_items().filter(
+            customer=self.request.user.customer
+        )
 
     def choose_address(self, request, *args, **kwargs):
         order = self.get_object()
@@ -364,21 +537,38 @@ class ProfileAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        user = request.user
-
-        customer = Customer.objects.filter(user=user).first()
-        seller = Seller.objects.filter(user=user).first()
+        """
+        The profile of the user, read with one query. Sellers can add
+        ?products=1 to get a page of their products under "products",
+        paginated like the product list.
+        """
+        user = User.objects.select_related(
+            "customer__address", "seller__address"
+        ).get(pk=request.user.pk)
 
-        if customer:
-            user_data = CustomerSerializer(customer).data
-        elif seller:
-            user_data = SellerSerializer(seller).data
-        else:
+        customer = getattr(user, "customer", None)
+        seller = getattr(user, "seller", None)
+        if customer is None and seller is None:
             return Response(
                 {"error": "User is neither a customer nor a seller."},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        user_data = ProfileSerializer(user).data
+        if seller is not None and (
+            request.query_params.get("products") in ("1", "true")
+        ):
+            paginator = KeysetPagination()
+            products = paginator.paginate_queryset(
+                Product.objects.with_related().filter(seller=seller),
+                request,
+                view=self,
+            )
+            user_data["products"] = {
+                "next": paginator.get_next_link(),
+                "previous": paginator.get_previous_link(),
+                "results": ProductSerializer(products, many=True).data,
+            }
         return Response(user_data, status=status.HTTP_200_OK)
 
     def post(self, request):
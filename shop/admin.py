@@ -1,7 +1,24 @@
 from django.contrib import admin
-from shop.models import Product, ProductImage, Category
+from shop.models import (
+    Category,
+    ImageUploadJob,
+    Product,
+    ProductImage,
+    ProductSales,
+)
 
 
 admin.site.register(Product)
 admin.site.register(ProductImage)
 admin.site.register(Category)
+
+
+@admin.register(ImageUploadJob)
+class ImageUploadJobAdmin(admin.ModelAdmin):
+    list_display = ["id", "product", "status", "attempts", "created_at"]
+    list_filter = ["status"]
+
+
+@admin.register(ProductSales)
+class ProductSalesAdmin(admin.ModelAdmin):
+    list_display = ["product", "units_sold", "revenue", "last_sold_at"]
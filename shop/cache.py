@@ -0,0 +1,167 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+
+# Cache namespaces; a write bumps the version of every namespace whose
+# cached responses it can change
+PRODUCTS = "products"
+CATEGORIES = "categories"
+# Stock-only writes bump no list namespace (see
+# ProductQuerySet.update_stock), so the lists showing stock are also
+# keyed on STOCK, whose version is the clock: it moves every
+# SHOP_RESPONSE_CACHE_TIMEOUT seconds, which bounds how old their stock
+# (and their ETag) can get
+STOCK = "stock"
+
+
+def seller_namespace(seller_id):
+    """The storefront header of one seller, see shop.storefront."""
+    return f"seller:{seller_id}"
+
+
+def product_namespace(product_id):
+    """The detail of one product, for the writes that only move stock."""
+    return f"product:{product_id}"
+
+
+def get_cache():
+    return caches[getattr(settings, "SHOP_CACHE_ALIAS", "default")]
+
+
+def version_key(namespace):
+    return f"shop:version:{namespace}"
+
+
+def stock_version():
+    return int(time.time()) // max(response_cache_timeout(), 1)
+
+
+def get_versions(namespaces):
+    cache = get_cache()
+    keys = [
+        version_key(namespace) for namespace in namespaces
+        if namespace != STOCK
+    ]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Start from the clock rather than 1, so a counter that was
+            # evicted never comes back to a version that is still cached
+            cache.add(key, time.time_ns() // 1000, timeout=None)
+            versions[key] = cache.get(key)
+    return [
+        stock_version() if namespace == STOCK
+        else versions[version_key(namespace)]
+        for namespace in namespaces
+    ]
+
+
+def bump_versions(*namespaces, using=None):
+    """
+    Move the namespaces to a new version, so every response cached under
+    the old one is ignored from now on (and expires on its own).
+
+    The bump is repeated when the transaction commits: a read racing the
+    commit may have cached the old rows under the first new version.
+    """
+    def bump():
+        cache = get_cache()
+        for namespace in namespaces:
+            try:
+                cache.incr(version_key(namespace))
+            except ValueError:
+                # not read since it was evicted; get_versions() restarts it
+                pass
+
+    bump()
+    transaction.on_commit(bump, using=using)
+
+
+def normalized_query(params, ignored=()):
+    """
+    The query parameters sorted, without the blank ones, so equivalent
+    query strings share cache entries.
+    """
+    return urlencode(sorted(
+        (key, value)
+        for key, values in params.lists()
+        if key not in ignored
+        for value in values
+        if value != ""
+    ))
+
+
+def cache_key(prefix, namespaces, path, params, ignored=()):
+    versions = ".".join(str(version) for version in get_versions(namespaces))
+    query = normalized_query(params, ignored)
+    digest = hashlib.md5(f"{path}?{query}".encode("utf-8")).hexdigest()
+    return f"shop:{prefix}:{versions}:{digest}"
+
+
+def response_cache_timeout():
+    return getattr(settings, "SHOP_RESPONSE_CACHE_TIMEOUT", 300)
+
+
+class CachedResponseMixin:
+    """
+    Cache the data of successful GET responses of a DRF view under the
+    request path, the normalized query string and the versions of
+    `cache_namespaces`.
+
+    Authentication and permissions have already been checked when get()
+    runs, and the data does not depend on the user, so every client
+    shares the entries.
+    """
+
+    cache_namespaces = ()
+
+    def get_cache_namespaces(self):
+        return self.cache_namespaces
+
+    def get(self, request, *args, **kwargs):
+        key = cache_key(
+            "response",
+            self.get_cache_namespaces(),
+            request.path,
+            request.query_params,
+        )
+        cache = get_cache()
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, response_cache_timeout())
+        return response
+
+
+class CachedPageMixin:
+    """
+    Cache the rendered page of anonymous GETs to a template view. Pages
+    for signed-in users name the user, so they are always rendered.
+    """
+
+    cache_namespaces = ()
+
+    def get(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().get(request, *args, **kwargs)
+        key = cache_key(
+            "page", self.cache_namespaces, request.path, request.GET
+        )
+        cache = get_cache()
+        content = cache.get(key)
+        if content is not None:
+            return HttpResponse(content)
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response.render()
+            cache.set(key, response.content, response_cache_timeout())
+        return response
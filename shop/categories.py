@@ -0,0 +1,76 @@
+import threading
+
+from django.db.models.query import ModelIterable
+
+from shop.cache import CATEGORIES, get_versions
+from shop.models import Category
+
+
+class CategoryCache:
+    """
+    Per-worker map of every category by id and by slug.
+
+    The category table is small and read on every product page, so it is
+    loaded whole with one query. The Category signals clear it in the
+    writing worker; other workers notice the bumped "categories" cache
+    version (see shop.cache) and reload on their next lookup.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.by_id = {}
+        self.by_slug = {}
+
+    def load(self):
+        # Read the version first: a write racing the query below bumps it
+        # again, so the next lookup reloads
+        version, = get_versions((CATEGORIES,))
+        if version == self.version:
+            return self.by_id, self.by_slug
+        with self.lock:
+            if version != self.version:
+                categories = list(Category.objects.all())
+                self.by_id = {
+                    category.pk: category for category in categories
+                }
+                self.by_slug = {
+                    category.slug: category for category in categories
+                }
+                self.version = version
+            return self.by_id, self.by_slug
+
+    def clear(self):
+        self.version = None
+
+    def snapshot(self):
+        """
+        {id: category} as of now; resolve a whole page against it so the
+        version is checked once per page rather than once per row.
+        """
+        return self.load()[0]
+
+    def get(self, pk):
+        return self.load()[0].get(pk)
+
+    def get_by_slug(self, slug):
+        return self.load()[1].get(slug)
+
+
+category_cache = CategoryCache()
+
+
+class CachedCategoryIterable(ModelIterable):
+    """
+    Yields products with `category` set from the category cache, so a
+    page of products needs neither a join nor a query per row for them.
+    """
+
+    def __iter__(self):
+        categories = category_cache.snapshot()
+        for product in super().__iter__():
+            category = categories.get(product.category_id)
+            # a category created since the snapshot loads lazily
+            if category is not None:
+                product.category = category
+            yield product
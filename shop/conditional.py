@@ -0,0 +1,140 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.db.models.functions import Greatest
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from shop.cache import (
+    cache_key,
+    get_cache,
+    get_versions,
+    normalized_query,
+    response_cache_timeout,
+)
+
+
+class ConditionalGetMixin:
+    """
+    Answer If-None-Match / If-Modified-Since with 304 Not Modified before
+    any serializer (or cached response) is touched. Goes before
+    CachedResponseMixin, whose namespaces it shares.
+
+    Lists get an ETag made of the path, the normalized query and the
+    versions of the cache namespaces, which every write bumps: it costs
+    no query, and changes with every row added, changed or deleted.
+
+    Objects also get a Last-Modified date, the newest of their
+    `last_modified_fields`. It is read from the object the view loads,
+    and kept in the cache next to the response; only a conditional
+    request for an object whose validators are not cached runs an
+    aggregate query for them.
+    """
+
+    last_modified_fields = ("updated_at",)
+
+    def get(self, request, *args, **kwargs):
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        if lookup not in kwargs:
+            etag = self.get_list_etag(request)
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = super().get(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response.headers["ETag"] = etag
+            return response
+
+        key = cache_key(
+            "validators",
+            self.get_cache_namespaces(),
+            request.path,
+            request.query_params,
+        )
+        cache = get_cache()
+        validators = cache.get(key)
+        if validators is None and (
+            "If-None-Match" in request.headers
+            or "If-Modified-Since" in request.headers
+        ):
+            state = self.get_object_state(kwargs)
+            if not state["count"]:
+                # let the view answer 404
+                return super().get(request, *args, **kwargs)
+            validators = self.get_validators(request, state)
+            cache.set(key, validators, response_cache_timeout())
+
+        response = None
+        if validators is not None:
+            response = get_conditional_response(request, **validators)
+        if response is None:
+            self.conditional_object = None
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            if validators is None:
+                validators = self.get_object_validators(request, kwargs)
+                cache.set(key, validators, response_cache_timeout())
+        response.headers["ETag"] = validators["etag"]
+        response.headers["Last-Modified"] = http_date(
+            validators["last_modified"]
+        )
+        return response
+
+    def get_object(self):
+        obj = super().get_object()
+        self.conditional_object = obj
+        return obj
+
+    def get_list_etag(self, request):
+        versions = get_versions(self.get_cache_namespaces())
+        return self.make_etag(
+            request, ".".join(str(version) for version in versions)
+        )
+
+    def get_last_modified(self, queryset):
+        fields = self.last_modified_fields
+        newest = Greatest(*fields) if len(fields) > 1 else fields[0]
+        return queryset.order_by().aggregate(
+            count=Count("pk"), last_modified=Max(newest)
+        )
+
+    def get_object_state(self, kwargs):
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        return self.get_last_modified(
+            self.get_queryset().filter(**{self.lookup_field: kwargs[lookup]})
+        )
+
+    def get_object_validators(self, request, kwargs):
+        obj = self.conditional_object
+        if obj is None:
+            # the response came from the cache, without the validators
+            return self.get_validators(
+                request, self.get_object_state(kwargs)
+            )
+        values = []
+        for field in self.last_modified_fields:
+            value = obj
+            for name in field.split("__"):
+                value = getattr(value, name)
+            values.append(value)
+        return self.get_validators(
+            request, {"count": 1, "last_modified": max(values)}
+        )
+
+    def get_validators(self, request, state):
+        last_modified = state["last_modified"]
+        return {
+            "etag": self.make_etag(request, "|".join((
+                str(state["count"]), last_modified.isoformat(),
+            ))),
+            "last_modified": int(last_modified.timestamp()),
+        }
+
+    def make_etag(self, request, state):
+        source = "|".join((
+            request.path, normalized_query(request.query_params), state,
+        ))
+        # weak: the same data may be rendered as JSON or browsable HTML
+        digest = hashlib.md5(source.encode("utf-8")).hexdigest()
+        return "W/" + quote_etag(digest)
@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from shop.cache import PRODUCTS, cache_key, get_cache
+from shop.categories import category_cache
+
+# Upper bounds (exclusive) of the price buckets; the last bucket is open
+PRICE_BUCKETS = (25, 50, 100, 250, 500)
+
+
+def price_bucket():
+    return Case(
+        *[
+            When(price__lt=bound, then=Value(index))
+            for index, bound in enumerate(PRICE_BUCKETS)
+        ],
+        default=Value(len(PRICE_BUCKETS)),
+        output_field=IntegerField(),
+    )
+
+
+def facet_counts(queryset):
+    """
+    Category, price bucket and city counts of `queryset`.
+
+    One GROUP BY over (category, price bucket, city) returns at most a few
+    hundred rows however many products match; the three facets are rolled
+    up from those rows in Python, with the category names taken from the
+    category cache.
+    """
+    rows = (
+        queryset.order_by()
+        .prefetch_related(None)
+        .annotate(price_bucket=price_bucket())
+        .values(
+            "category_id",
+            "price_bucket",
+            "seller__address__normalized_city__key",
+            "seller__address__normalized_city__name",
+        )
+        .annotate(count=Count("id"))
+    )
+
+    names = category_cache.snapshot()
+    categories = {}
+    prices = [0] * (len(PRICE_BUCKETS) + 1)
+    cities = {}
+    for row in rows:
+        count = row["count"]
+        if row["category_id"] is not None:
+            category = categories.setdefault(row["category_id"], {
+                "id": row["category_id"],
+                "name": getattr(names.get(row["category_id"]), "name", ""),
+                "count": 0,
+            })
+            category["count"] += count
+        prices[row["price_bucket"]] += count
+        key = row["seller__address__normalized_city__key"]
+        if key is not None:
+            city = cities.setdefault(key, {
+                "key": key,
+                "name": row["seller__address__normalized_city__name"],
+                "count": 0,
+            })
+            city["count"] += count
+
+    bounds = (0,) + PRICE_BUCKETS + (None,)
+    return {
+        "category": sorted(
+            categories.values(), key=lambda c: (-c["count"], c["name"])
+        ),
+        "price": [
+            {"min": bounds[index], "max": bounds[index + 1], "count": count}
+            for index, count in enumerate(prices)
+            if count
+        ],
+        "city": sorted(
+            cities.values(), key=lambda c: (-c["count"], c["name"])
+        ),
+    }
+
+
+def facet_cache_key(path, params, ignored=()):
+    """
+    Cache key of the facets of a filtered list: the path, the query
+    parameters that change which products match and the products version.
+    """
+    return cache_key("facets", (PRODUCTS,), path, params, ignored)
+
+
+def cached_facet_counts(queryset, key):
+    cache = get_cache()
+    facets = cache.get(key)
+    if facets is None:
+        facets = facet_counts(queryset)
+        cache.set(
+            key, facets, getattr(settings, "SHOP_FACET_CACHE_TIMEOUT", 60)
+        )
+    return facets
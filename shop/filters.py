@@ -1,4 +1,8 @@
+from rest_framework.filters import BaseFilterBackend
+
+from profile.filters import CityKeyFilter
 from shop.models import Product
+from shop.search import get_search_backend
 import django_filters as filters
 from django_filters.rest_framework import FilterSet
 
@@ -6,10 +10,46 @@ from django_filters.rest_framework import FilterSet
 class ProductFilter(FilterSet):
     min_price = filters.NumberFilter(field_name="price", lookup_expr="gte")
     max_price = filters.NumberFilter(field_name="price", lookup_expr="lte")
-    city = filters.CharFilter(
-        field_name="seller__address__city",
-        lookup_expr="icontains")
+    city = CityKeyFilter(field_name="seller__address__normalized_city__key")
+    city_prefix = CityKeyFilter(
+        field_name="seller__address__normalized_city__key",
+        lookup_expr="startswith")
+    category = filters.NumberFilter(field_name="category_id")
+    in_stock = filters.BooleanFilter(
+        field_name="stock", method="filter_in_stock"
+    )
 
     class Meta:
         model = Product
-        fields = ["min_price", "max_price", "city"]
+        fields = [
+            "min_price",
+            "max_price",
+            "city",
+            "city_prefix",
+            "category",
+            "in_stock",
+        ]
+
+    def filter_in_stock(self, queryset, name, value):
+        # stock > 0 is the condition of the partial in-stock index
+        if value:
+            return queryset.filter(stock__gt=0)
+        return queryset.filter(stock=0)
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """
+    Narrow products to the `search` text with the configured search
+    backend (see shop.search). With `fuzzy=true` misspelled words match
+    too.
+    """
+
+    search_param = "search"
+    fuzzy_param = "fuzzy"
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, "")
+        backend = get_search_backend()
+        if request.query_params.get(self.fuzzy_param) in ("1", "true"):
+            return backend.fuzzy_search(queryset, text)
+        return backend.search(queryset, text)
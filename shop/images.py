@@ -0,0 +1,59 @@
+from shop.models import ProductImage
+from shop.storage import get_image_storage
+
+# Product card tiles, at 1x and 2x
+CARD_SIZES = ((300, 200), (600, 400))
+# Widths of the full image on the product page; the height follows
+RESPONSIVE_SIZES = ((480, None), (960, None), (1440, None))
+# Generated for every uploaded image, see shop.uploads
+DERIVATIVE_SIZES = CARD_SIZES + RESPONSIVE_SIZES
+
+
+def as_resource(image):
+    # an unsaved ProductImage.image may still be a string
+    return ProductImage._meta.get_field("image").to_python(image)
+
+
+def external_url(resource):
+    """
+    The URL of an image given as one, like the default placeholder, which
+    has no derivatives.
+    """
+    url = resource.public_id
+    if resource.format:
+        # CloudinaryField takes everything after the last dot as format
+        url += f".{resource.format}"
+    if url.startswith(("http://", "https://")):
+        return url
+    return None
+
+
+def srcset(resource, sizes):
+    resource = as_resource(resource)
+    if external_url(resource):
+        return ""
+    storage = get_image_storage()
+    return ", ".join(
+        f"{storage.derivative_url(resource, width, height)} {width}w"
+        for width, height in sizes
+    )
+
+
+def image_urls(resource):
+    """
+    URLs of a ProductImage.image: the original, the card thumbnail and
+    the srcset values of the card and of the full image.
+    """
+    resource = as_resource(resource)
+    url = external_url(resource)
+    if url:
+        return {
+            "url": url, "thumbnail": url, "thumbnail_srcset": "", "srcset": ""
+        }
+    storage = get_image_storage()
+    return {
+        "url": storage.url(resource),
+        "thumbnail": storage.derivative_url(resource, *CARD_SIZES[0]),
+        "thumbnail_srcset": srcset(resource, CARD_SIZES),
+        "srcset": srcset(resource, RESPONSIVE_SIZES),
+    }
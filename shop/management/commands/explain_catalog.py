@@ -0,0 +1,139 @@
+import random
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from profile.models import Seller
+from shop.filters import ProductFilter
+from shop.models import Category, Product
+
+PAGE_SIZE = 20
+
+
+def hot_queries(category_id, seller_id, using=DEFAULT_DB_ALIAS):
+    """
+    (label, expected index, queryset) of the catalog's browse queries,
+    built the way ProductList, CategoryDetailView and
+    SellerProductListView build them.
+    """
+    products = Product.objects.using(using)
+
+    def browse(params, *ordering):
+        queryset = ProductFilter(params, queryset=products).qs
+        return queryset.order_by(*ordering)[:PAGE_SIZE]
+
+    return [
+        (
+            "category by price",
+            "product_category_price_idx",
+            browse(
+                {"category": category_id, "min_price": 100,
+                 "max_price": 500},
+                "price", "id",
+            ),
+        ),
+        (
+            "category newest first",
+            "product_category_created_idx",
+            browse({"category": category_id}, "-created_at", "-id"),
+        ),
+        (
+            "seller storefront",
+            "product_seller_created_idx",
+            products.filter(seller_id=seller_id).order_by(
+                "-created_at", "-id"
+            )[:PAGE_SIZE],
+        ),
+        (
+            "in stock newest first",
+            "product_in_stock_created_idx",
+            browse({"in_stock": "true"}, "-created_at", "-id"),
+        ),
+    ]
+
+
+def seed_products(count, using=DEFAULT_DB_ALIAS):
+    """
+    Insert `count` synthetic products spread over count / 500 categories
+    and count / 50 sellers; two thirds of them are sold out.
+    """
+    rng = random.Random(count)
+    categories = Category.objects.using(using).bulk_create([
+        Category(name=f"Explain category {i}", slug=f"explain-category-{i}")
+        for i in range(max(count // 500, 1))
+    ])
+    users = User.objects.using(using).bulk_create([
+        User(username=f"explain-seller-{i}")
+        for i in range(max(count // 50, 1))
+    ])
+    sellers = Seller.objects.using(using).bulk_create([
+        Seller(user=user) for user in users
+    ])
+    Product.objects.using(using).bulk_create(
+        (
+            Product(
+                name=f"Explain product {i}",
+                price=rng.randint(1, 1000),
+                stock=rng.choice((0, 0, 1)),
+                category=rng.choice(categories),
+                seller=rng.choice(sellers),
+            )
+            for i in range(count)
+        ),
+        batch_size=5000,
+    )
+    with connections[using].cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the catalog browse queries and fail unless each one uses "
+        "its index."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help=(
+                "Insert this many synthetic products first. They are "
+                "rolled back afterwards."
+            ),
+        )
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        with transaction.atomic(using=using):
+            if options["seed"]:
+                seed_products(options["seed"], using)
+            missing = self.explain(using, options["verbosity"])
+            transaction.set_rollback(True, using=using)
+        if missing:
+            raise CommandError(
+                "Not using their index: " + ", ".join(missing)
+            )
+
+    def explain(self, using, verbosity):
+        product = Product.objects.using(using).first()
+        if product is None:
+            raise CommandError("No products to explain; use --seed.")
+
+        missing = []
+        for label, index, queryset in hot_queries(
+            product.category_id, product.seller_id, using
+        ):
+            plan = queryset.explain()
+            if index in plan:
+                self.stdout.write(f"{label}: {index}")
+            else:
+                missing.append(label)
+                self.stdout.write(
+                    self.style.ERROR(f"{label}: {index} not used")
+                )
+            if verbosity > 1 or index not in plan:
+                self.stdout.write(plan)
+        return missing
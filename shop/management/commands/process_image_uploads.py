@@ -0,0 +1,55 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from shop.uploads import claim_jobs, process_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Push the staged product images to the image storage and attach "
+        "them to their products."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no job is due instead of polling.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10,
+            help="Jobs claimed at a time.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds to wait when no job is due.",
+        )
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        counts = Counter()
+        try:
+            while True:
+                jobs = claim_jobs(options["batch_size"], using)
+                if not jobs:
+                    if options["once"]:
+                        break
+                    time.sleep(options["interval"])
+                    continue
+                for job, status in process_jobs(jobs, using).items():
+                    counts[status or "taken over"] += 1
+                    if options["verbosity"] > 1:
+                        self.stdout.write(f"Job {job.pk}: {status}")
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(", ".join(
+            f"{status}: {count}" for status, count in sorted(counts.items())
+        ) or "No jobs due.")
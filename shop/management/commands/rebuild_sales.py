@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from shop.sales import rebuild_sales
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the sales totals of the seller dashboard from the order "
+        "items. Run it once after upgrading, and whenever the totals are "
+        "in doubt; orders placed while it runs may be miscounted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Products read and written per query.",
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_sales(options["batch_size"])
+        self.stdout.write(f"Rebuilt the sales of {count} products.")
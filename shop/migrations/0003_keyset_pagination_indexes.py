@@ -0,0 +1,28 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("profile", "0002_initial"),
+        ("shop", "0002_remove_productimage_image_url_productimage_image"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="category",
+            index=models.Index(fields=["name", "id"], name="category_name_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["created_at", "id"], name="product_created_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["price", "id"], name="product_price_id_idx"),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:01
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+import shop.operations
+
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def backfill_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Product = apps.get_model("shop", "Product")
+    last_id = 0
+    while True:
+        batch = list(
+            Product.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:BACKFILL_BATCH_SIZE]
+        )
+        if not batch:
+            return
+        schema_editor.execute(
+            """
+            UPDATE shop_product AS p SET search_vector =
+                setweight(to_tsvector('english', coalesce(p.name, '')), 'A')
+                || setweight(to_tsvector('english', coalesce(c.name, '')), 'B')
+                || setweight(
+                    to_tsvector('english', coalesce(p.description, '')), 'C'
+                )
+            FROM shop_category AS c
+            WHERE c.id = p.category_id AND p.id BETWEEN %s AND %s
+            """,
+            [batch[0], batch[-1]],
+        )
+        last_id = batch[-1]
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("profile", "0002_initial"),
+        ("shop", "0003_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(
+            backfill_search_vector, migrations.RunPython.noop, elidable=True
+        ),
+        shop.operations.AddIndexConcurrently(
+            model_name="product",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="product_search_vector_idx"
+            ),
+        ),
+    ]
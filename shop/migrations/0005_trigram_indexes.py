@@ -0,0 +1,37 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:03
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+import shop.operations
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("profile", "0002_initial"),
+        ("shop", "0004_product_search_vector"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        shop.operations.AddIndexConcurrently(
+            model_name="category",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["name"],
+                name="category_name_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        shop.operations.AddIndexConcurrently(
+            model_name="product",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["name"],
+                name="product_name_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+    ]
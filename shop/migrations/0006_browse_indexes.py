@@ -0,0 +1,46 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:12
+
+from django.db import migrations, models
+
+import shop.operations
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("profile", "0003_city"),
+        ("shop", "0005_trigram_indexes"),
+    ]
+
+    operations = [
+        shop.operations.AddIndexConcurrently(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "price", "id"], name="product_category_price_idx"
+            ),
+        ),
+        shop.operations.AddIndexConcurrently(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "-created_at", "-id"],
+                name="product_category_created_idx",
+            ),
+        ),
+        shop.operations.AddIndexConcurrently(
+            model_name="product",
+            index=models.Index(
+                fields=["seller", "-created_at", "-id"],
+                name="product_seller_created_idx",
+            ),
+        ),
+        shop.operations.AddIndexConcurrently(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("stock__gt", 0)),
+                fields=["-created_at", "-id"],
+                name="product_in_stock_created_idx",
+            ),
+        ),
+    ]
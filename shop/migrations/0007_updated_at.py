@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0006_browse_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,46 @@
+import re
+
+from django.db import migrations
+from django.utils.text import slugify
+
+
+def fix_category_slugs(apps, schema_editor):
+    """
+    Give every category a slugify()d, unique slug. Slugs that already
+    match their name are kept so their URLs keep working.
+    """
+    Category = apps.get_model("shop", "Category")
+    categories = list(Category.objects.order_by("id"))
+    taken = {category.slug for category in categories if category.slug}
+    valid = set()
+    stale = []
+    for category in categories:
+        base = slugify(category.name) or "category"
+        if (
+            category.slug
+            and category.slug not in valid
+            and re.fullmatch(rf"{re.escape(base)}(-\d+)?", category.slug)
+        ):
+            valid.add(category.slug)
+        else:
+            stale.append((category, base))
+
+    for category, base in stale:
+        slug, suffix = base, 2
+        while slug in taken:
+            slug = f"{base}-{suffix}"
+            suffix += 1
+        taken.add(slug)
+        category.slug = slug
+        category.save(update_fields=["slug"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0007_updated_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(fix_category_slugs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:29
+
+from django.db import migrations, models
+
+import shop.operations
+
+
+def clamp_negative_stock(apps, schema_editor):
+    """
+    Oversold products, left behind by the read-modify-write cart views,
+    would fail the new constraint.
+    """
+    Product = apps.get_model("shop", "Product")
+    Product.objects.filter(stock__lt=0).update(stock=0)
+
+
+class Migration(migrations.Migration):
+
+    # the constraint is validated outside the transaction that adds it
+    atomic = False
+
+    dependencies = [
+        ("profile", "0003_city"),
+        ("shop", "0009_image_upload_jobs"),
+    ]
+
+    operations = [
+        migrations.RunPython(clamp_negative_stock, migrations.RunPython.noop),
+        shop.operations.AddConstraintNotValid(
+            model_name="product",
+            constraint=models.CheckConstraint(
+                condition=models.Q(("stock__gte", 0)),
+                name="product_stock_non_negative",
+            ),
+        ),
+        shop.operations.ValidateConstraint(
+            model_name="product", name="product_stock_non_negative"
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0010_stock_non_negative"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductSales",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="sales",
+                        serialize=False,
+                        to="shop.product",
+                    ),
+                ),
+                ("units_sold", models.PositiveBigIntegerField(default=0)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("last_sold_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name_plural": "product sales",
+            },
+        ),
+    ]
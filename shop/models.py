@@ -1,19 +1,290 @@
-from django.db import models
+import re
+
+from django.db import models, connections, transaction
+from django.db.models.functions import Now
+from django.utils import timezone
+from django.utils.text import slugify
 from django.core.validators import MinValueValidator
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from cloudinary.models import CloudinaryField
 
+from shop.cache import (
+    PRODUCTS,
+    bump_versions,
+    product_namespace,
+    seller_namespace,
+)
+
+# Text search configuration used for both the stored vectors and queries
+SEARCH_CONFIG = "english"
+# Product fields that feed Product.search_vector
+SEARCH_VECTOR_FIELDS = {"name", "description", "category", "category_id"}
+# Their attnames, as a Product instance holds them
+SEARCH_VECTOR_ATTNAMES = ["name", "description", "category_id"]
+SELLER_FIELDS = {"seller", "seller_id"}
+# What Product.save() compares with the loaded values: the search vector
+# sources, and the seller, whose storefront a moved product leaves
+LOADED_ATTNAMES = SEARCH_VECTOR_ATTNAMES + ["seller_id"]
+# Updates of only these leave the catalog lists alone, see
+# ProductQuerySet.update()
+STOCK_FIELDS = {"stock", "updated_at"}
+
+
+def loaded_values(instance, fields):
+    # deferred fields are left out rather than loaded
+    return {
+        field: instance.__dict__[field]
+        for field in fields
+        if field in instance.__dict__
+    }
+
+
+def written_values(instance, fields, update_fields=None):
+    """The values of `fields` (attnames) a save of `instance` writes."""
+    return {
+        field: value
+        for field, value in loaded_values(instance, fields).items()
+        if update_fields is None
+        or field in update_fields
+        or field.removesuffix("_id") in update_fields
+    }
+
+
+def changed_fields(instance, fields, update_fields=None):
+    """
+    Which of `fields` a save of `instance` writes with another value than
+    it was loaded or last saved with (see from_db() of the models).
+    """
+    loaded = getattr(instance, "_loaded", {})
+    return {
+        field
+        for field, value in written_values(
+            instance, fields, update_fields
+        ).items()
+        if field not in loaded or loaded[field] != value
+    }
+
+
+def remember_written(instance, fields, update_fields=None):
+    instance._loaded = {
+        **getattr(instance, "_loaded", {}),
+        **written_values(instance, fields, update_fields),
+    }
+
+
+def touch_update_fields(kwargs):
+    """
+    Add `updated_at` to the update_fields of a save() call, if any, so
+    partial saves move it too.
+    """
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None:
+        kwargs["update_fields"] = {*update_fields, "updated_at"}
+
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True, null=True)
     slug = models.SlugField(max_length=200, unique=True, blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # keyset pagination of the category list
+            models.Index(fields=["name", "id"], name="category_name_id_idx"),
+            # fuzzy search and suggestions, see shop.filters
+            GinIndex(
+                fields=["name"],
+                opclasses=["gin_trgm_ops"],
+                name="category_name_trgm_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded = loaded_values(instance, ["name"])
+        return instance
+
+    def unique_slug(self, base):
+        taken = set(
+            Category.objects.filter(slug__startswith=base)
+            .exclude(pk=self.pk)
+            .values_list("slug", flat=True)
+        )
+        slug, suffix = base, 2
+        while slug in taken:
+            slug = f"{base}-{suffix}"
+            suffix += 1
+        return slug
+
     def save(self, *args, **kwargs):
-        self.slug = self.name.replace(" ", "-")
+        base = slugify(self.name) or "category"
+        # Keep the slug, and the URLs using it, while it still matches
+        # the name
+        if not self.slug or not re.fullmatch(
+            rf"{re.escape(base)}(-\d+)?", self.slug
+        ):
+            self.slug = self.unique_slug(base)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "name" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "slug"}
+        # a new category has no products yet
+        update_fields = kwargs.get("update_fields")
+        renamed = not self._state.adding and changed_fields(
+            self, ["name"], update_fields
+        )
+        touch_update_fields(kwargs)
         super(Category, self).save(*args, **kwargs)
+        if renamed:
+            # the category name is part of its products' search vectors
+            self.category.update_search_vector()
+        remember_written(self, ["name"], update_fields)
+
+
+def product_search_vector():
+    """
+    Weighted search document of a product: name (A) ranks above the
+    category name (B), which ranks above the description (C).
+    """
+    category_name = models.Subquery(
+        Category.objects.filter(
+            pk=models.OuterRef("category_id")
+        ).values("name")[:1]
+    )
+    return (
+        SearchVector("name", weight="A", config=SEARCH_CONFIG)
+        + SearchVector(category_name, weight="B", config=SEARCH_CONFIG)
+        + SearchVector("description", weight="C", config=SEARCH_CONFIG)
+    )
+
+
+class ProductQuerySet(models.QuerySet):
+    def with_related(self):
+        """
+        Load the seller (with user and address) in the same query, take
+        the categories from the per-worker category cache and prefetch the
+        images, so serializing or rendering a page of products costs a
+        fixed number of queries. The search vector is never shown, so it
+        is left out of the query.
+        """
+        from shop.categories import CachedCategoryIterable
+
+        queryset = self.defer("search_vector").select_related(
+            "seller__user", "seller__address"
+        ).prefetch_related(
+            models.Prefetch(
+                "product_images",
+                queryset=ProductImage.objects.order_by("id"),
+            )
+        )
+        queryset._iterable_class = CachedCategoryIterable
+        return queryset
+
+    def update_search_vector(self):
+        """
+        Recompute search_vector in a single UPDATE. A no-op on databases
+        without PostgreSQL full-text search.
+        """
+        if connections[self.db].vendor != "postgresql":
+            return 0
+        return self.update(search_vector=product_search_vector())
+
+    # The bulk write paths send no signals, so they expire the cached
+    # catalog responses themselves (see shop.signals) and, like save(),
+    # move updated_at
+
+    def update(self, **kwargs):
+        if kwargs.keys() == {"search_vector"}:
+            return super().update(**kwargs)
+        kwargs.setdefault("updated_at", Now())
+        if "stock" in kwargs and kwargs.keys() <= STOCK_FIELDS:
+            return self.update_stock(**kwargs)
+        # The filter may match on the columns being changed, so remember
+        # the rows, and the storefronts showing them, before updating them
+        with transaction.atomic(using=self.db):
+            before = list(self.values_list("pk", "seller_id"))
+            rows = super().update(**kwargs)
+            changed = self.model.objects.filter(
+                pk__in=[pk for pk, _ in before]
+            )
+            if not SEARCH_VECTOR_FIELDS.isdisjoint(kwargs):
+                changed.update_search_vector()
+            sellers = {seller for _, seller in before}
+            if not SELLER_FIELDS.isdisjoint(kwargs):
+                # products moving change both sellers' storefronts
+                sellers.update(changed.values_list("seller_id", flat=True))
+        bump_versions(
+            PRODUCTS,
+            *(seller_namespace(seller) for seller in sellers),
+            using=self.db,
+        )
+        return rows
+
+    def update_stock(self, product_ids=None, **kwargs):
+        """
+        Stock moves with every cart change, so rather than every cached
+        catalog response a stock-only update only expires the detail of
+        the products changed. The cached lists and storefronts, and their
+        ETags, are also keyed on the STOCK clock, so their stock is at
+        most SHOP_RESPONSE_CACHE_TIMEOUT seconds old; reserving it is
+        always checked against the database.
+
+        Pass the ids of the products the filter can match, if known, to
+        spare the query that reads them.
+        """
+        kwargs.setdefault("updated_at", Now())
+        if product_ids is None:
+            product_ids = list(self.values_list("pk", flat=True))
+        rows = super().update(**kwargs)
+        bump_versions(
+            *(product_namespace(pk) for pk in product_ids), using=self.db
+        )
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            self.model.objects.filter(
+                pk__in=[obj.pk for obj in objs if obj.pk is not None]
+            ).update_search_vector()
+        bump_versions(
+            PRODUCTS,
+            *{seller_namespace(obj.seller_id) for obj in objs},
+            using=self.db,
+        )
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        now = timezone.now()
+        for obj in objs:
+            obj.updated_at = now
+        fields = {*fields, "updated_at"}
+        with transaction.atomic(using=self.db):
+            # the storefronts showing the products
+            sellers = set(
+                self.model.objects.filter(
+                    pk__in=[obj.pk for obj in objs]
+                ).values_list("seller_id", flat=True)
+            )
+            if not SELLER_FIELDS.isdisjoint(fields):
+                sellers.update(obj.seller_id for obj in objs)
+            rows = super().bulk_update(objs, fields, *args, **kwargs)
+            if not SEARCH_VECTOR_FIELDS.isdisjoint(fields):
+                self.model.objects.filter(
+                    pk__in=[obj.pk for obj in objs]
+                ).update_search_vector()
+        bump_versions(
+            PRODUCTS,
+            *(seller_namespace(seller) for seller in sellers),
+            using=self.db,
+        )
+        return rows
 
 
 class Product(models.Model):
@@ -29,10 +300,87 @@ class Product(models.Model):
         Category, related_name="category", on_delete=models.CASCADE
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    # Moved by every write path, see ProductQuerySet; with the category's
+    # updated_at it drives the conditional GETs of shop.conditional
+    updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by ProductQuerySet, see product_search_vector()
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # keyset pagination of the catalog, see shop.pagination
+            models.Index(
+                fields=["created_at", "id"], name="product_created_id_idx"
+            ),
+            models.Index(fields=["price", "id"], name="product_price_id_idx"),
+            # browse paths: a category by price or newest first, a
+            # seller's storefront, and the in-stock listing
+            models.Index(
+                fields=["category", "price", "id"],
+                name="product_category_price_idx",
+            ),
+            models.Index(
+                fields=["category", "-created_at", "-id"],
+                name="product_category_created_idx",
+            ),
+            models.Index(
+                fields=["seller", "-created_at", "-id"],
+                name="product_seller_created_idx",
+            ),
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=models.Q(stock__gt=0),
+                name="product_in_stock_created_idx",
+            ),
+            GinIndex(
+                fields=["search_vector"], name="product_search_vector_idx"
+            ),
+            GinIndex(
+                fields=["name"],
+                opclasses=["gin_trgm_ops"],
+                name="product_name_trgm_idx",
+            ),
+        ]
+        constraints = [
+            # the last line of defence of shop.stock against overselling
+            models.CheckConstraint(
+                condition=models.Q(stock__gte=0),
+                name="product_stock_non_negative",
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded = loaded_values(instance, LOADED_ATTNAMES)
+        return instance
+
+    def save(self, *args, **kwargs):
+        # new products have no vector yet; the others only need a new one
+        # when its sources change
+        update_fields = kwargs.get("update_fields")
+        stale = self._state.adding or changed_fields(
+            self, SEARCH_VECTOR_ATTNAMES, update_fields
+        )
+        left = None
+        if not self._state.adding and changed_fields(
+            self, ["seller_id"], update_fields
+        ):
+            left = getattr(self, "_loaded", {}).get("seller_id")
+        touch_update_fields(kwargs)
+        super().save(*args, **kwargs)
+        if stale:
+            Product.objects.filter(pk=self.pk).update_search_vector()
+        if left is not None:
+            # shop.signals expires the storefront the product moved to
+            bump_versions(seller_namespace(left), using=self._state.db)
+        remember_written(self, LOADED_ATTNAMES, update_fields)
+
 
 class ProductImage(models.Model):
     product = models.ForeignKey(
@@ -42,3 +390,79 @@ class ProductImage(models.Model):
 
     def __str__(self):
         return self.product.name
+
+
+class ImageUploadJob(models.Model):
+    """
+    A product image accepted by ProductImageList and staged on local disk
+    until the process_image_uploads worker has pushed it to the image
+    storage (see shop.uploads) and attached it as a ProductImage.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        PROCESSING = "processing"
+        DONE = "done"
+        FAILED = "failed"
+
+    product = models.ForeignKey(
+        Product, related_name="image_upload_jobs", on_delete=models.CASCADE
+    )
+    # file name in SHOP_UPLOAD_STAGING_DIR
+    staged_name = models.CharField(max_length=100, editable=False)
+    original_name = models.CharField(max_length=255, blank=True)
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.PENDING
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    # When a pending job is due, or when the claim of the worker
+    # processing it runs out
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    image = models.OneToOneField(
+        ProductImage,
+        related_name="upload_job",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # the worker's queue; finished jobs drop out of it
+            models.Index(
+                fields=["run_after", "id"],
+                condition=models.Q(status__in=["pending", "processing"]),
+                name="image_upload_job_due_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.original_name} for {self.product_id}: {self.status}"
+
+
+class ProductSales(models.Model):
+    """
+    Running totals of the orders of a product, which the seller dashboard
+    reads instead of the order items. Checkout adds to them in its own
+    transaction (see shop.sales.record_sales); the rebuild_sales command
+    recomputes them from the order items.
+    """
+
+    product = models.OneToOneField(
+        Product,
+        related_name="sales",
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    units_sold = models.PositiveBigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_sold_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "product sales"
+
+    def __str__(self):
+        return f"{self.units_sold} of {self.product_id}"
@@ -0,0 +1,71 @@
+from django.contrib.postgres import operations
+from django.contrib.postgres.indexes import PostgresIndex
+from django.db.migrations.operations import AddConstraint, AddIndex
+
+
+class AddIndexConcurrently(operations.AddIndexConcurrently):
+    """
+    CREATE INDEX CONCURRENTLY on PostgreSQL, so building an index on a
+    large table does not block writes.
+
+    Other databases (the SQLite setups used for local benchmarks) get a
+    plain CREATE INDEX, and PostgreSQL-only index types such as GIN are
+    skipped there.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            return super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        if not isinstance(self.index, PostgresIndex):
+            AddIndex.database_forwards(
+                self, app_label, schema_editor, from_state, to_state
+            )
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            return super().database_backwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        if not isinstance(self.index, PostgresIndex):
+            AddIndex.database_backwards(
+                self, app_label, schema_editor, from_state, to_state
+            )
+
+
+class AddConstraintNotValid(operations.AddConstraintNotValid):
+    """
+    ADD CONSTRAINT ... NOT VALID on PostgreSQL: new rows are checked at
+    once, while the existing ones are left to a later ValidateConstraint,
+    which does not block writes. Run the two in a non-atomic migration,
+    or the lock taken here is held until the validation is done.
+
+    Other databases get a plain AddConstraint.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            return super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        AddConstraint.database_forwards(
+            self, app_label, schema_editor, from_state, to_state
+        )
+
+
+class ValidateConstraint(operations.ValidateConstraint):
+    """
+    VALIDATE CONSTRAINT on PostgreSQL. Elsewhere AddConstraintNotValid
+    has checked the existing rows already.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
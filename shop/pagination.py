@@ -0,0 +1,243 @@
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import FloatField, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from shop.facets import cached_facet_counts, facet_cache_key
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks on (ordering field, id).
+
+    The cursor carries the ordering value and id of the last row of the
+    page, and the next page is read with
+    ``field < value OR (field = value AND id < last_id)`` from an index on
+    (field, id). Deep pages cost the same as the first one: there is no
+    OFFSET and no COUNT(*).
+    """
+
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    ordering_query_param = "ordering"
+    # Every field listed here must be backed by an index on (field, id)
+    ordering_fields = ("created_at", "price")
+    default_ordering = "-created_at"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+        field = self.ordering.lstrip("-")
+        cursor = self.decode_cursor(request, queryset)
+        reverse = cursor is not None and cursor["reverse"]
+
+        # Walking backwards flips both the ordering and the comparison
+        descending = self.ordering.startswith("-") != reverse
+        if descending:
+            queryset = queryset.order_by(f"-{field}", "-id")
+        else:
+            queryset = queryset.order_by(field, "id")
+
+        if cursor is not None:
+            queryset = queryset.filter(
+                self.seek_filter(field, cursor, descending)
+            )
+
+        results = list(queryset[:self.page_size + 1])
+        has_following = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next = cursor is not None
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = cursor is not None
+
+        self.page = results
+        return results
+
+    def seek_filter(self, field, cursor, descending):
+        lookup = "lt" if descending else "gt"
+        # The redundant range on `field` keeps the condition sargable
+        return Q(**{f"{field}__{lookup}e": cursor["value"]}) & (
+            Q(**{f"{field}__{lookup}": cursor["value"]})
+            | Q(**{f"id__{lookup}": cursor["id"]})
+        )
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size,
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get(self.ordering_query_param)
+        if ordering and ordering.lstrip("-") in self.ordering_fields:
+            return ordering
+        return self.default_ordering
+
+    def get_ordering_field(self, queryset):
+        name = self.ordering.lstrip("-")
+        try:
+            return queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # an annotation, such as the rank of search hits
+            return FloatField()
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            cursor = json.loads(b64decode(encoded.encode("ascii")))
+            ordering, value, pk, reverse = cursor
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        # A cursor is only meaningful for the ordering that produced it
+        if ordering != self.ordering or not isinstance(
+            value, (str, int, float)
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        # and a value the database would choke on is not one it produced
+        try:
+            value = self.get_ordering_field(queryset).to_python(value)
+        except (ValidationError, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return {"value": value, "id": pk, "reverse": bool(reverse)}
+
+    def encode_cursor(self, obj, reverse):
+        value = getattr(obj, self.ordering.lstrip("-"))
+        # str() keeps the full microsecond precision of timestamps
+        cursor = json.dumps(
+            [self.ordering, value, obj.pk, reverse], default=str
+        )
+        url = self.request.build_absolute_uri()
+        if self.ordering == self.default_ordering:
+            url = remove_query_param(url, self.ordering_query_param)
+        return replace_query_param(
+            url,
+            self.cursor_query_param,
+            b64encode(cursor.encode("utf-8")).decode("ascii"),
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param
+            )
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("results", data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {
+                    "type": "string", "nullable": True, "format": "uri"
+                },
+                "results": schema,
+            },
+        }
+
+
+class CategoryKeysetPagination(KeysetPagination):
+    ordering_fields = ("name",)
+    default_ordering = "name"
+
+
+class StorefrontKeysetPagination(KeysetPagination):
+    # backed by the (seller, created_at, id) index of Product
+    ordering_fields = ("created_at",)
+
+
+class OrderKeysetPagination(KeysetPagination):
+    # backed by the (customer, created_at, id) index of Order
+    ordering_fields = ("created_at",)
+    page_size = 10
+
+
+class SearchKeysetPagination(KeysetPagination):
+    """
+    Orders search hits by relevance unless the client asks for another
+    ordering. Ranked pages are still seeked on (rank, id).
+    """
+
+    def get_ordering(self, request, queryset, view):
+        if (
+            self.ordering_query_param not in request.query_params
+            and "rank" in queryset.query.annotations
+        ):
+            return "-rank"
+        return super().get_ordering(request, queryset, view)
+
+
+class FacetMixin:
+    """
+    Adds category, price and city counts of the whole filtered queryset
+    to every page under "facets". The counts are cached per filter
+    signature, so following the next links does not recount them.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        key = facet_cache_key(request.path, request.query_params, ignored=(
+            self.cursor_query_param,
+            self.page_size_query_param,
+            self.ordering_query_param,
+        ))
+        self.facets = cached_facet_counts(queryset, key)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data["facets"] = self.facets
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema["properties"]["facets"] = {"type": "object"}
+        return schema
+
+
+class FacetedKeysetPagination(FacetMixin, KeysetPagination):
+    pass
+
+
+class FacetedSearchKeysetPagination(FacetMixin, SearchKeysetPagination):
+    pass
@@ -0,0 +1,131 @@
+from collections import Counter
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import (
+    Case,
+    DecimalField,
+    F,
+    IntegerField,
+    Max,
+    Sum,
+    Value,
+    When,
+)
+from django.utils import timezone
+
+from profile.models import OrderItem
+from shop.models import ProductSales
+
+
+def sales_change(field, changes, output_field):
+    """`field + CASE ...` adding `changes[product id]` to each row."""
+    return F(field) + Case(
+        *(
+            When(pk=product_id, then=Value(change))
+            for product_id, change in changes.items()
+        ),
+        default=Value(0),
+        output_field=output_field,
+    )
+
+
+def sales_totals(items):
+    units = Counter()
+    revenue = Counter()
+    for item in items:
+        if item.product_id is None:
+            continue
+        units[item.product_id] += item.quantity
+        revenue[item.product_id] += item.quantity * item.unit_price
+    return units, revenue
+
+
+def record_sales(items, now=None):
+    """
+    Add the order items, just created, to the sales of their products.
+
+    Must run in the transaction that creates them, so the totals never
+    count an order that was rolled back. Three queries for any number of
+    items: the missing rows are inserted, then all of them are locked in
+    primary key order, so checkouts of the same products queue up instead
+    of deadlocking, and updated with a single UPDATE.
+    """
+    units, revenue = sales_totals(items)
+    if not units:
+        return
+    ProductSales.objects.bulk_create(
+        [ProductSales(product_id=pk) for pk in sorted(units)],
+        ignore_conflicts=True,
+    )
+    change_sales(units, revenue, last_sold_at=now or timezone.now())
+
+
+def cancel_sales(items):
+    """
+    Take the order items, about to be deleted, off the sales of their
+    products, in the transaction that deletes them.
+    """
+    units, revenue = sales_totals(items)
+    if not units:
+        return
+    change_sales(
+        {pk: -count for pk, count in units.items()},
+        {pk: -amount for pk, amount in revenue.items()},
+    )
+
+
+def change_sales(units, revenue, **fields):
+    list(
+        ProductSales.objects.select_for_update()
+        .filter(pk__in=units)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+    ProductSales.objects.filter(pk__in=units).update(
+        units_sold=sales_change("units_sold", units, IntegerField()),
+        revenue=sales_change(
+            "revenue", revenue, DecimalField(max_digits=14, decimal_places=2)
+        ),
+        **fields,
+    )
+
+
+def rebuild_sales(batch_size=1000):
+    """
+    Recompute every product's sales from the order items, in one
+    transaction, and return how many products have sold. Order items whose
+    product was deleted are left out, like the product's sales were; those
+    of a checkout committing meanwhile may be counted once too few or too
+    many times, until the next rebuild.
+    """
+    totals = (
+        OrderItem.objects.filter(product__isnull=False)
+        .values("product")
+        .order_by("product")
+        .annotate(
+            units=Sum("quantity"),
+            revenue=Sum(F("quantity") * F("unit_price")),
+            last_sold_at=Max("order__created_at"),
+        )
+    )
+    with transaction.atomic():
+        ProductSales.objects.all().delete()
+        rows = [
+            ProductSales(
+                product_id=row["product"],
+                units_sold=row["units"],
+                revenue=row["revenue"] or Decimal(0),
+                last_sold_at=row["last_sold_at"],
+            )
+            for row in totals.iterator(chunk_size=batch_size)
+        ]
+        # a checkout committing meanwhile may have added its row again
+        ProductSales.objects.bulk_create(
+            rows,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["product"],
+            update_fields=["units_sold", "revenue", "last_sold_at"],
+        )
+    return len(rows)
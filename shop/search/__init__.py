@@ -0,0 +1,24 @@
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+DEFAULT_SEARCH_BACKEND = "shop.search.database.DatabaseSearchBackend"
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    """
+    Return the product search backend of this process, as configured by
+    the SHOP_SEARCH_BACKEND setting.
+    """
+    path = getattr(settings, "SHOP_SEARCH_BACKEND", DEFAULT_SEARCH_BACKEND)
+    return import_string(path)()
+
+
+@receiver(setting_changed)
+def reset_search_backend(*, setting, **kwargs):
+    if setting == "SHOP_SEARCH_BACKEND":
+        get_search_backend.cache_clear()
@@ -0,0 +1,45 @@
+class BaseSearchBackend:
+    """
+    Interface of the product search engines behind ProductSearchView.
+
+    `search` and `fuzzy_search` narrow a Product queryset, so the other
+    filters and the pagination still apply to the result. A backend may
+    annotate matches with a float `rank` to have them ordered by
+    relevance.
+    """
+
+    name = None
+
+    def search(self, queryset, text):
+        """
+        Products matching every word of `text`, the last word as a prefix.
+        """
+        raise NotImplementedError
+
+    def fuzzy_search(self, queryset, text):
+        """Products matching `text` while tolerating typos."""
+        raise NotImplementedError
+
+    def suggest(self, text, limit=5, using="default"):
+        """Up to `limit` indexed terms closest to `text`, best first."""
+        raise NotImplementedError
+
+    def warm(self):
+        """Prepare the backend when a worker starts."""
+
+    def stats(self):
+        return {"backend": self.name}
+
+    # Hooks called by shop.signals once a write is committed
+
+    def product_changed(self, product):
+        pass
+
+    def product_deleted(self, product):
+        pass
+
+    def category_changed(self, category):
+        pass
+
+    def category_deleted(self, category):
+        pass
@@ -0,0 +1,111 @@
+import difflib
+import re
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramWordSimilarity,
+)
+from django.db import connections
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast, Greatest
+
+from shop.models import Category, Product, SEARCH_CONFIG
+from shop.search.base import BaseSearchBackend
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """
+    Search in the database.
+
+    On PostgreSQL `search` is a ranked full-text query on the GIN indexed
+    Product.search_vector, and `fuzzy_search` and `suggest` use pg_trgm
+    word similarity on the trigram indexed names. Other databases fall
+    back to icontains and difflib.
+    """
+
+    name = "database"
+    search_fields = ["name", "description", "category__name"]
+
+    def is_postgresql(self, using):
+        return connections[using].vendor == "postgresql"
+
+    def search(self, queryset, text):
+        terms = re.findall(r"\w+", text)
+        if not terms:
+            return queryset
+
+        if not self.is_postgresql(queryset.db):
+            for term in terms:
+                queryset = queryset.filter(Q(*[
+                    (f"{field}__icontains", term)
+                    for field in self.search_fields
+                ], _connector=Q.OR))
+            return queryset
+
+        query = SearchQuery(
+            " & ".join(terms) + ":*", search_type="raw", config=SEARCH_CONFIG
+        )
+        # ts_rank() is a real; widen it so cursors round-trip exactly
+        rank = Cast(SearchRank(F("search_vector"), query), FloatField())
+        return queryset.filter(search_vector=query).annotate(rank=rank)
+
+    def fuzzy_search(self, queryset, text):
+        text = text.strip()
+        if not text:
+            return queryset
+
+        if not self.is_postgresql(queryset.db):
+            names = self.suggest(text, using=queryset.db)
+            return queryset.filter(
+                Q(name__in=names) | Q(category__name__in=names)
+            )
+
+        # %> is served by the gin_trgm_ops indexes on both names
+        similarity = Greatest(
+            TrigramWordSimilarity(text, "name"),
+            TrigramWordSimilarity(text, "category__name"),
+        )
+        return queryset.filter(
+            Q(name__trigram_word_similar=text)
+            | Q(category__name__trigram_word_similar=text)
+        ).annotate(rank=Cast(similarity, FloatField()))
+
+    def suggest(self, text, limit=5, using="default"):
+        text = text.strip()
+        if not text:
+            return []
+
+        if not self.is_postgresql(using):
+            names = {
+                name.lower(): name
+                for model in (Product, Category)
+                for name in model.objects.using(using).values_list(
+                    "name", flat=True
+                )
+            }
+            matches = difflib.get_close_matches(
+                text.lower(), names, n=limit, cutoff=0.8
+            )
+            return [names[match] for match in matches]
+
+        # Both halves are trigram index scans, combined in one query
+        products = Product.objects.using(using).filter(
+            name__trigram_word_similar=text
+        ).annotate(
+            similarity=TrigramWordSimilarity(text, "name")
+        ).values_list("name", "similarity")
+        categories = Category.objects.using(using).filter(
+            name__trigram_word_similar=text
+        ).annotate(
+            similarity=TrigramWordSimilarity(text, "name")
+        ).values_list("name", "similarity")
+        # UNION also collapses products that share a name
+        rows = products.union(categories).order_by("-similarity", "name")
+        return [name for name, _ in rows[:limit]]
+
+    def stats(self):
+        return {
+            "backend": self.name,
+            "vendor": connections["default"].vendor,
+        }
@@ -0,0 +1,354 @@
+import difflib
+import heapq
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Case, FloatField, Value, When
+
+from shop.models import Category, Product
+from shop.search.base import BaseSearchBackend
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"\w+")
+# Same ordering as the PostgreSQL weights: name > category > description
+NAME_WEIGHT = 1.0
+CATEGORY_WEIGHT = 0.4
+DESCRIPTION_WEIGHT = 0.2
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+class InvertedIndex:
+    """
+    Term -> {product id: score} postings over product name, category name
+    and description, plus a sorted term list for prefix lookups.
+
+    Not thread safe on its own; InvertedIndexBackend guards it.
+    """
+
+    def __init__(self, categories=()):
+        self.postings = {}
+        self.terms = []
+        self.categories = dict(categories)
+        self.documents = {}
+        self.document_terms = {}
+        self.category_products = defaultdict(set)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, pk, name, description, category_id, keep_sorted=True):
+        self.remove(pk)
+        self.documents[pk] = (name, description, category_id)
+        self.category_products[category_id].add(pk)
+
+        scores = defaultdict(float)
+        for weight, text in (
+            (NAME_WEIGHT, name),
+            (CATEGORY_WEIGHT, self.categories.get(category_id)),
+            (DESCRIPTION_WEIGHT, description),
+        ):
+            for term in tokenize(text):
+                scores[term] += weight
+
+        for term, score in scores.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = {}
+                if keep_sorted:
+                    insort(self.terms, term)
+            posting[pk] = score
+        self.document_terms[pk] = tuple(scores)
+
+    def remove(self, pk):
+        document = self.documents.pop(pk, None)
+        if document is None:
+            return
+        self.category_products[document[2]].discard(pk)
+        for term in self.document_terms.pop(pk):
+            posting = self.postings[term]
+            del posting[pk]
+            if not posting:
+                del self.postings[term]
+                del self.terms[bisect_left(self.terms, term)]
+
+    def set_category(self, category_id, name):
+        self.categories[category_id] = name
+        for pk in list(self.category_products[category_id]):
+            self.add(pk, *self.documents[pk])
+
+    def remove_category(self, category_id):
+        self.categories.pop(category_id, None)
+        for pk in list(self.category_products.pop(category_id, ())):
+            self.remove(pk)
+
+    def prefix_postings(self, prefix):
+        merged = {}
+        index = bisect_left(self.terms, prefix)
+        while index < len(self.terms) and self.terms[index].startswith(
+            prefix
+        ):
+            for pk, score in self.postings[self.terms[index]].items():
+                merged[pk] = max(merged.get(pk, 0.0), score)
+            index += 1
+        return merged
+
+    def lookup(self, terms, prefix=True):
+        """
+        {product id: score} of the products containing every term. With
+        `prefix` the last term also matches the terms it starts.
+        """
+        if not terms:
+            return {}
+        *words, last = terms
+        if not prefix:
+            words.append(last)
+        elif not words:
+            return self.prefix_postings(last)
+
+        # Intersect starting from the rarest term
+        postings = sorted(
+            (self.postings.get(term, {}) for term in words), key=len
+        )
+        matches = dict(postings[0])
+        for posting in postings[1:]:
+            if not matches:
+                return {}
+            matches = {
+                pk: score + posting[pk]
+                for pk, score in matches.items()
+                if pk in posting
+            }
+        if prefix:
+            # Check the few remaining candidates against the prefix rather
+            # than merging every posting list the prefix covers
+            narrowed = {}
+            for pk, score in matches.items():
+                scores = [
+                    self.postings[term][pk]
+                    for term in self.document_terms[pk]
+                    if term.startswith(last)
+                ]
+                if scores:
+                    narrowed[pk] = score + max(scores)
+            matches = narrowed
+        return matches
+
+    def closest_terms(self, word, limit=5, cutoff=0.8):
+        # Typos rarely hit the first letter, so compare against the terms
+        # sharing it before scanning the whole dictionary
+        start = bisect_left(self.terms, word[:1])
+        end = bisect_left(self.terms, word[:1] + "\uffff")
+        matches = difflib.get_close_matches(
+            word, self.terms[start:end], n=limit, cutoff=cutoff
+        )
+        return matches or difflib.get_close_matches(
+            word, self.terms, n=limit, cutoff=cutoff
+        )
+
+    def size(self):
+        return {
+            "documents": len(self.documents),
+            "terms": len(self.terms),
+            "postings": sum(len(p) for p in self.postings.values()),
+        }
+
+
+class InvertedIndexBackend(BaseSearchBackend):
+    """
+    In-process search over an inverted index of the catalog.
+
+    The index is built from the database on the first query (or by
+    `warm()` at worker startup) and kept current by the Product and
+    Category signals of this process. Writes made by other processes,
+    and QuerySet.update() calls that send no signals, are picked up by a
+    full rebuild once the index is older than
+    SHOP_SEARCH_INDEX_MAX_AGE seconds.
+
+    Matches are ranked by their index score, and only the best
+    SHOP_SEARCH_MAX_CANDIDATES of them reach the database.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self.max_age = getattr(settings, "SHOP_SEARCH_INDEX_MAX_AGE", 300)
+        self.index = None
+        self.built_at = None
+        self.build_seconds = None
+        self.lock = threading.RLock()
+        self.build_lock = threading.Lock()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.last_query_seconds = None
+
+    def build(self, using="default"):
+        started = time.perf_counter()
+        index = InvertedIndex(
+            Category.objects.using(using).values_list("id", "name")
+        )
+        products = Product.objects.using(using).values_list(
+            "id", "name", "description", "category_id"
+        )
+        for row in products.iterator(chunk_size=2000):
+            index.add(*row, keep_sorted=False)
+        index.terms = sorted(index.postings)
+
+        with self.lock:
+            self.index = index
+            self.built_at = time.monotonic()
+            self.build_seconds = time.perf_counter() - started
+        logger.info(
+            "Built search index of %d products in %.3fs",
+            len(index), self.build_seconds,
+        )
+        return index
+
+    def warm(self):
+        try:
+            self.build()
+        except DatabaseError:
+            # e.g. not migrated yet; the first query builds it
+            logger.exception("Could not build the search index")
+
+    def get_index(self, using="default"):
+        index = self.index
+        if index is not None and (
+            self.max_age is None
+            or time.monotonic() - self.built_at <= self.max_age
+        ):
+            return index
+        # One thread rebuilds while the others keep serving the stale
+        # index; without any index they wait for the first build
+        if self.build_lock.acquire(blocking=index is None):
+            try:
+                if self.index is index:
+                    return self.build(using)
+            finally:
+                self.build_lock.release()
+        return self.index if self.index is not None else index
+
+    def timed_lookup(self, index, terms, prefix=True):
+        with self.lock:
+            started = time.perf_counter()
+            matches = index.lookup(terms, prefix=prefix)
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.query_seconds += elapsed
+            self.last_query_seconds = elapsed
+        return matches
+
+    def ranked(self, queryset, matches):
+        """
+        Narrow the queryset to the best `max_candidates` matches, ranked
+        by their index score like the database backend ranks its hits.
+        """
+        max_candidates = getattr(settings, "SHOP_SEARCH_MAX_CANDIDATES", 1000)
+        best = heapq.nlargest(
+            max_candidates, matches.items(), key=lambda match: match[1]
+        )
+        if not best:
+            return queryset.none()
+        # one WHEN per distinct score rather than per product
+        by_score = defaultdict(list)
+        for pk, score in best:
+            by_score[score].append(pk)
+        rank = Case(
+            *(
+                When(pk__in=pks, then=Value(score))
+                for score, pks in by_score.items()
+            ),
+            output_field=FloatField(),
+        )
+        return queryset.filter(
+            pk__in=[pk for pk, _ in best]
+        ).annotate(rank=rank)
+
+    def search(self, queryset, text):
+        terms = tokenize(text)
+        if not terms:
+            return queryset
+        index = self.get_index(queryset.db)
+        return self.ranked(queryset, self.timed_lookup(index, terms))
+
+    def fuzzy_search(self, queryset, text):
+        words = tokenize(text)
+        if not words:
+            return queryset
+        index = self.get_index(queryset.db)
+        with self.lock:
+            terms = [index.closest_terms(word, limit=1) for word in words]
+        if not all(terms):
+            return queryset.none()
+        matches = self.timed_lookup(
+            index, [term[0] for term in terms], prefix=False
+        )
+        return self.ranked(queryset, matches)
+
+    def suggest(self, text, limit=5, using="default"):
+        index = self.get_index(using)
+        suggestions = []
+        with self.lock:
+            for word in tokenize(text):
+                for term in index.closest_terms(word, limit=limit):
+                    if term not in suggestions:
+                        suggestions.append(term)
+        return suggestions[:limit]
+
+    def stats(self):
+        index = self.index
+        stats = {
+            "backend": self.name,
+            "built": index is not None,
+            "build_seconds": self.build_seconds,
+            "queries": self.queries,
+            "last_query_microseconds": None,
+            "avg_query_microseconds": None,
+        }
+        if index is not None:
+            with self.lock:
+                stats.update(index.size())
+        if self.queries:
+            stats["last_query_microseconds"] = round(
+                self.last_query_seconds * 1e6, 1
+            )
+            stats["avg_query_microseconds"] = round(
+                self.query_seconds / self.queries * 1e6, 1
+            )
+        return stats
+
+    # Incremental updates; nothing to do before the first build
+
+    def product_changed(self, product):
+        with self.lock:
+            if self.index is not None:
+                self.index.add(
+                    product.pk,
+                    product.name,
+                    product.description,
+                    product.category_id,
+                )
+
+    def product_deleted(self, product):
+        with self.lock:
+            if self.index is not None:
+                self.index.remove(product.pk)
+
+    def category_changed(self, category):
+        with self.lock:
+            if self.index is not None:
+                self.index.set_category(category.pk, category.name)
+
+    def category_deleted(self, category):
+        with self.lock:
+            if self.index is not None:
+                self.index.remove_category(category.pk)
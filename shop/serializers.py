@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Category, Product, ProductImage
+from .images import image_urls
+from .models import Category, ImageUploadJob, Product, ProductImage
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -9,14 +10,58 @@ class CategorySerializer(serializers.ModelSerializer):
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
+    # the original, a card thumbnail and srcset values, see shop.images
+    urls = serializers.SerializerMethodField()
+
     class Meta:
         model = ProductImage
         fields = "__all__"
 
+    def get_urls(self, obj):
+        return image_urls(obj.image)
+
+
+class ImageFileSerializer(serializers.Serializer):
+    image = serializers.ImageField()
+
+
+class ImageUploadSerializer(ImageFileSerializer):
+    product = serializers.PrimaryKeyRelatedField(
+        queryset=Product.objects.all()
+    )
+
+
+class BulkImageUploadSerializer(serializers.Serializer):
+    product = serializers.PrimaryKeyRelatedField(
+        queryset=Product.objects.all()
+    )
+    # checked one by one with ImageFileSerializer by the view, so it can
+    # report on each file
+    images = serializers.ListField(
+        child=serializers.FileField(), allow_empty=False, max_length=20
+    )
+
+
+class ImageUploadJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImageUploadJob
+        fields = [
+            "id",
+            "product",
+            "original_name",
+            "status",
+            "attempts",
+            "last_error",
+            "image",
+            "created_at",
+            "updated_at",
+        ]
+
 
 class ProductSerializer(serializers.ModelSerializer):
     images = ProductImageSerializer(
-        many=True, read_only=True)  # To include related images
+        many=True, read_only=True,
+        source="product_images")  # To include related images
     # To display the category as a nested object
     category = CategorySerializer(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(
@@ -24,4 +69,5 @@ class ProductSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        fields = "__all__"
+        # the full-text index is internal, see Product.search_vector
+        exclude = ["search_vector"]
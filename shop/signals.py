@@ -0,0 +1,128 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.functions import Now
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from profile.models import Address, Order, OrderItem, Seller
+from profile.signals import changed_user_fields
+from shop.cache import CATEGORIES, PRODUCTS, bump_versions, seller_namespace
+from shop.categories import category_cache
+from shop.models import Category, Product, ProductImage
+from shop.sales import cancel_sales
+from shop.search import get_search_backend
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: get_search_backend().product_changed(instance)
+    )
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: get_search_backend().product_deleted(instance)
+    )
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: get_search_backend().category_changed(instance)
+    )
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: get_search_backend().category_deleted(instance)
+    )
+
+
+# Product responses embed the category and images, and the facets group
+# by the seller's city
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Seller)
+@receiver(post_delete, sender=Seller)
+@receiver(post_save, sender=Address)
+@receiver(post_delete, sender=Address)
+def product_data_changed(sender, using, **kwargs):
+    bump_versions(PRODUCTS, using=using)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_data_changed(sender, using, **kwargs):
+    bump_versions(CATEGORIES, PRODUCTS, using=using)
+    # Other workers reload on the new version; this one at once
+    category_cache.clear()
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def product_image_changed(sender, instance, using, **kwargs):
+    # the images are part of the product's representation and ETag
+    Product.objects.using(using).filter(pk=instance.product_id).update(
+        updated_at=Now()
+    )
+
+
+# The storefront header of a seller shows their name, city and product
+# count (see shop.storefront)
+
+STOREFRONT_USER_FIELDS = ("username", "first_name", "last_name")
+
+
+def storefronts_changed(seller_ids, using):
+    bump_versions(
+        *(seller_namespace(seller_id) for seller_id in seller_ids),
+        using=using,
+    )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def seller_products_changed(sender, instance, using, **kwargs):
+    storefronts_changed([instance.seller_id], using)
+
+
+@receiver(post_save, sender=Seller)
+@receiver(post_delete, sender=Seller)
+def seller_changed(sender, instance, using, **kwargs):
+    storefronts_changed([instance.pk], using)
+
+
+@receiver(post_save, sender=User)
+def seller_user_changed(sender, instance, using, created, **kwargs):
+    # logins and other edits leave the storefront alone
+    if not created and changed_user_fields(instance, STOREFRONT_USER_FIELDS):
+        storefronts_changed(
+            Seller.objects.using(using).filter(user=instance)
+            .values_list("pk", flat=True),
+            using,
+        )
+
+
+@receiver(post_save, sender=Address)
+def seller_address_changed(sender, instance, using, created, **kwargs):
+    if not created:
+        storefronts_changed(
+            Seller.objects.using(using).filter(address=instance)
+            .values_list("pk", flat=True),
+            using,
+        )
+
+
+@receiver(pre_delete, sender=Order)
+def order_deleted(sender, instance, using, **kwargs):
+    # still in the transaction of the delete, before the items cascade
+    cancel_sales(
+        OrderItem.objects.using(using).filter(order=instance)
+        .only("product_id", "quantity", "unit_price")
+    )
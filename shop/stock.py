@@ -0,0 +1,119 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from profile.models import CartItem
+from shop.models import Product
+
+
+def reserve_stock(product_id, quantity):
+    """
+    Take `quantity` off the stock of a product if at least that much is
+    left, and tell whether it was.
+
+    One conditional UPDATE of the stock (and updated_at, see
+    ProductQuerySet.update_stock): concurrent reservations queue on the row
+    lock and re-check the condition, so they can neither oversell nor
+    undo each other's changes.
+    """
+    return Product.objects.filter(
+        pk=product_id, stock__gte=quantity
+    ).update_stock([product_id], stock=F("stock") - quantity) == 1
+
+
+def release_stock(product_id, quantity):
+    """Give `quantity` back to the stock of a product."""
+    Product.objects.filter(pk=product_id).update_stock(
+        [product_id], stock=F("stock") + quantity
+    )
+
+
+def change_reservation(product_id, reserved, quantity):
+    """
+    Move a reservation of `reserved` units to `quantity`, and tell
+    whether there was enough stock to.
+    """
+    if quantity > reserved:
+        return reserve_stock(product_id, quantity - reserved)
+    if quantity < reserved:
+        release_stock(product_id, reserved - quantity)
+    return True
+
+
+def stock_change(changes):
+    """
+    `stock + CASE ...` adding `changes[product id]` to the stock of each
+    product, for a single UPDATE of them all.
+    """
+    return F("stock") + Case(
+        *(
+            When(pk=product_id, then=Value(change))
+            for product_id, change in changes.items()
+        ),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def reserve_stock_many(changes):
+    """
+    Take `changes[product id]` units off the stock of each product (give
+    them back when negative), all or nothing. Returns the ids of the
+    products without enough stock, in which case nothing changed.
+
+    Must run in a transaction. The product rows are locked in primary key
+    order, so batches touching the same products queue up instead of
+    deadlocking, then updated with a single UPDATE.
+    """
+    changes = {pk: change for pk, change in changes.items() if change}
+    if not changes:
+        return []
+    stock = dict(
+        Product.objects.select_for_update()
+        .filter(pk__in=changes)
+        .order_by("pk")
+        .values_list("pk", "stock")
+    )
+    short = sorted(
+        pk for pk, change in changes.items()
+        if change > 0 and stock.get(pk, 0) < change
+    )
+    if not short:
+        Product.objects.filter(pk__in=changes).update_stock(
+            list(changes),
+            stock=stock_change({pk: -c for pk, c in changes.items()}),
+        )
+    return short
+
+
+def release_expired_items(batch_size, now=None):
+    """
+    Delete up to `batch_size` cart items whose reservation ran out and
+    give their quantities back to the stock. Returns how many there were.
+
+    The items are locked with SKIP LOCKED, so a customer changing one is
+    never waited for, and neither is another sweeper. The stock goes back
+    with a single UPDATE for the whole batch, issued last, so the product
+    rows are only locked for the rest of this short transaction.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        items = list(
+            CartItem.objects.select_for_update(skip_locked=True)
+            .filter(expires_at__lte=now)
+            .order_by("expires_at", "id")
+            .values_list("pk", "product_id", "quantity")[:batch_size]
+        )
+        if not items:
+            return 0
+        CartItem.objects.filter(pk__in=[pk for pk, _, _ in items]).delete()
+
+        released = Counter()
+        for _, product_id, quantity in items:
+            released[product_id] += quantity
+        Product.objects.filter(pk__in=released).update_stock(
+            list(released), stock=stock_change(released)
+        )
+    return len(items)
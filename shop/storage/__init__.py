@@ -0,0 +1,24 @@
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+DEFAULT_IMAGE_STORAGE = "shop.storage.remote.CloudinaryImageStorage"
+
+
+@lru_cache(maxsize=None)
+def get_image_storage():
+    """
+    Return the product image storage of this process, as configured by
+    the SHOP_IMAGE_STORAGE setting.
+    """
+    path = getattr(settings, "SHOP_IMAGE_STORAGE", DEFAULT_IMAGE_STORAGE)
+    return import_string(path)()
+
+
+@receiver(setting_changed)
+def reset_image_storage(*, setting, **kwargs):
+    if setting == "SHOP_IMAGE_STORAGE":
+        get_image_storage.cache_clear()
@@ -0,0 +1,34 @@
+class BaseImageStorage:
+    """
+    Interface of the stores the process_image_uploads worker pushes the
+    staged product images to, and which serve them and their scaled down
+    derivatives (see shop.images).
+    """
+
+    name = None
+
+    def save(self, path, name):
+        """
+        Store the file at `path`, uploaded as `name`, and return the value
+        for ProductImage.image: a CloudinaryResource or its string form.
+
+        Any exception is treated as transient and the upload retried.
+        """
+        raise NotImplementedError
+
+    def url(self, resource):
+        """URL of the original image."""
+        raise NotImplementedError
+
+    def derivative_url(self, resource, width, height=None):
+        """
+        URL of the image scaled down to `width`, or cropped to fill
+        `width` x `height` when a height is given.
+        """
+        raise NotImplementedError
+
+    def create_derivatives(self, resource, sizes):
+        """
+        Prepare the (width, height) derivatives of a stored image before
+        their first request, where the storage does not do it on its own.
+        """
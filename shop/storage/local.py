@@ -0,0 +1,139 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from cloudinary import CloudinaryResource
+from django.conf import settings
+from PIL import Image, ImageOps
+
+from shop.storage.base import BaseImageStorage
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "local/"
+DERIVATIVE_FORMAT = "webp"
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def replace_atomically(target, write):
+    """
+    Create `target` through `write(temporary path)`, so that concurrent
+    workers never serve or overwrite a half written file.
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(
+        dir=target.parent, suffix=target.suffix
+    )
+    os.close(descriptor)
+    try:
+        write(temporary)
+        os.replace(temporary, target)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+class LocalImageStorage(BaseImageStorage):
+    """
+    Keeps the images under SHOP_LOCAL_IMAGE_ROOT, served from
+    SHOP_LOCAL_IMAGE_URL. A stand-in for Cloudinary in development and
+    tests.
+
+    Images are named after the SHA-256 of their content, and so are the
+    directories of their derivatives: identical uploads share their files,
+    and a derivative once rendered never goes stale. Derivatives are
+    rendered when the image is uploaded, or else on first use.
+    """
+
+    name = "local"
+
+    @property
+    def root(self):
+        return Path(settings.SHOP_LOCAL_IMAGE_ROOT)
+
+    def path(self, resource):
+        name = resource.public_id
+        if resource.format:
+            name += f".{resource.format}"
+        return self.root / name
+
+    def derivative_path(self, resource, width, height=None):
+        digest = resource.public_id.removeprefix(PREFIX)
+        return (
+            self.root / "derivatives" / digest
+            / f"{width}x{height or 0}.{DERIVATIVE_FORMAT}"
+        )
+
+    def save(self, path, name):
+        resource = CloudinaryResource(
+            PREFIX + file_digest(path),
+            format=Path(name).suffix.lower().lstrip(".") or None,
+            type="upload",
+            resource_type="image",
+        )
+        target = self.path(resource)
+        if not target.exists():
+            replace_atomically(
+                target, lambda temporary: shutil.copyfile(path, temporary)
+            )
+        return resource
+
+    def is_local(self, resource):
+        # images uploaded to Cloudinary before switching to this storage
+        return resource.public_id.startswith(PREFIX)
+
+    def url_of(self, path):
+        relative = path.relative_to(self.root).as_posix()
+        return settings.SHOP_LOCAL_IMAGE_URL + relative
+
+    def url(self, resource):
+        if not self.is_local(resource):
+            return resource.url
+        return self.url_of(self.path(resource))
+
+    def derivative_url(self, resource, width, height=None):
+        if not self.is_local(resource):
+            return resource.url
+        path = self.derivative_path(resource, width, height)
+        if not path.exists():
+            try:
+                self.create_derivative(resource, width, height)
+            except Exception:
+                logger.exception(
+                    "Could not render %s at %sx%s",
+                    resource.public_id, width, height,
+                )
+                return self.url(resource)
+        return self.url_of(path)
+
+    def create_derivatives(self, resource, sizes):
+        if self.is_local(resource):
+            for width, height in sizes:
+                self.create_derivative(resource, width, height)
+
+    def create_derivative(self, resource, width, height=None):
+        with Image.open(self.path(resource)) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA")
+            if height:
+                image = ImageOps.fit(image, (width, height))
+            else:
+                # scale down only, keeping the aspect ratio
+                image.thumbnail((width, image.height))
+            replace_atomically(
+                self.derivative_path(resource, width, height),
+                lambda temporary: image.save(
+                    temporary, DERIVATIVE_FORMAT, quality=80
+                ),
+            )
@@ -0,0 +1,37 @@
+import cloudinary.uploader
+
+from shop.images import DERIVATIVE_SIZES
+from shop.storage.base import BaseImageStorage
+
+
+def transformation(width, height=None):
+    if height:
+        return {
+            "width": width, "height": height, "crop": "fill",
+            "quality": "auto",
+        }
+    return {"width": width, "crop": "limit", "quality": "auto"}
+
+
+class CloudinaryImageStorage(BaseImageStorage):
+    """
+    Uploads to the Cloudinary account configured in the settings.
+    Cloudinary renders and caches the derivatives itself; they are
+    requested as eager transformations at upload time, so the first
+    visitor does not wait for them either.
+    """
+
+    name = "cloudinary"
+
+    def save(self, path, name):
+        return cloudinary.uploader.upload_resource(
+            str(path),
+            eager=[transformation(*size) for size in DERIVATIVE_SIZES],
+            eager_async=True,
+        )
+
+    def url(self, resource):
+        return resource.url
+
+    def derivative_url(self, resource, width, height=None):
+        return resource.build_url(**transformation(width, height))
@@ -0,0 +1,57 @@
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from profile.models import Seller
+from shop.cache import (
+    get_cache,
+    get_versions,
+    response_cache_timeout,
+    seller_namespace,
+)
+from shop.models import Product
+
+
+def storefront_header(seller_id):
+    """
+    Name, city and product count of a seller, for the top of their
+    storefront, or None if there is no such seller.
+
+    Cached under the seller's own namespace, which shop.signals bumps when
+    the seller, their user or address, or one of their products changes:
+    the header of one storefront outlives changes to all the others.
+    """
+    namespace = seller_namespace(seller_id)
+    version, = get_versions([namespace])
+    key = f"shop:storefront:{namespace}:{version}"
+    cache = get_cache()
+    header = cache.get(key)
+    if header is not None:
+        return header
+
+    products = Product.objects.filter(
+        seller=OuterRef("pk")
+    ).order_by().values("seller").annotate(count=Count("pk"))
+    seller = Seller.objects.select_related(
+        "user", "address__normalized_city"
+    ).annotate(
+        product_count=Coalesce(Subquery(products.values("count")), 0)
+    ).filter(pk=seller_id).first()
+    if seller is None:
+        return None
+
+    address = seller.address
+    city = None
+    if address is not None:
+        city = (
+            address.normalized_city.name
+            if address.normalized_city is not None else address.city
+        )
+    header = {
+        "id": seller.pk,
+        "username": seller.user.username,
+        "name": str(seller),
+        "city": city,
+        "product_count": seller.product_count,
+    }
+    cache.set(key, header, response_cache_timeout())
+    return header
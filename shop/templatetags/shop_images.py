@@ -0,0 +1,14 @@
+from django import template
+
+from shop.images import image_urls as get_image_urls
+
+register = template.Library()
+
+
+@register.filter
+def image_urls(image):
+    """
+    {% with urls=image.image|image_urls %}: the `url`, `thumbnail`,
+    `thumbnail_srcset` and `srcset` of a ProductImage.image.
+    """
+    return get_image_urls(image)
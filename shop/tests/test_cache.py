@@ -0,0 +1,126 @@
+import time
+from unittest import mock
+
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.core.cache import cache
+from django.urls import reverse
+from django.contrib.auth.models import User
+from shop.models import Product, Category, ProductImage
+from shop.stock import reserve_stock
+from profile.models import Seller, Address
+
+
+class ResponseCacheTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="seller", password="sellerpass"
+        )
+        self.seller = Seller.objects.create(
+            user=self.user,
+            address=Address.objects.create(
+                street="Test Street",
+                postal_code="12345",
+                phone_number="+1684564673",
+                city="Berlin",
+            ),
+        )
+        self.category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(
+            name="Radio",
+            price=20,
+            seller=self.seller,
+            category=self.category,
+        )
+
+    def get(self, url, params=None, queries=0):
+        # a cache hit costs no query
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_repeated_reads_are_served_from_the_cache(self):
+        url = reverse("products")
+        first = self.client.get(url, {"min_price": 10, "max_price": ""})
+        # same filters in another order, blank parameters dropped
+        second = self.get(url, {"min_price": 10})
+        self.assertEqual(second.data, first.data)
+
+        detail = reverse("product-detail", args=[self.product.id])
+        self.client.get(detail)
+        self.assertEqual(self.get(detail).data["name"], "Radio")
+
+    def test_writes_expire_the_cached_responses(self):
+        url = reverse("products")
+        detail = reverse("product-detail", args=[self.product.id])
+        self.client.get(url)
+        self.client.get(detail)
+
+        self.product.name = "Vintage radio"
+        self.product.save()
+        self.assertEqual(
+            self.client.get(url).data["results"][0]["name"], "Vintage radio"
+        )
+        self.assertEqual(
+            self.client.get(detail).data["name"], "Vintage radio"
+        )
+
+        ProductImage.objects.create(product=self.product)
+        self.assertEqual(len(self.client.get(detail).data["images"]), 1)
+
+        Product.objects.filter(pk=self.product.pk).update(stock=0)
+        self.assertEqual(self.client.get(detail).data["stock"], 0)
+
+        self.category.name = "Audio"
+        self.category.save()
+        self.assertEqual(
+            self.client.get(detail).data["category"]["name"], "Audio"
+        )
+
+    def test_stock_changes_only_expire_the_product(self):
+        url = reverse("products")
+        detail = reverse("product-detail", args=[self.product.id])
+        now = time.time() // 300 * 300
+        with mock.patch("shop.cache.time.time", return_value=now):
+            etag = self.client.get(url).headers["ETag"]
+            self.client.get(detail)
+
+            self.assertTrue(reserve_stock(self.product.pk, 1))
+            self.assertEqual(self.client.get(detail).data["stock"], 0)
+            # the list keeps its cached stock for the rest of the window
+            self.assertEqual(self.get(url).data["results"][0]["stock"], 1)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(
+                response.status_code, status.HTTP_304_NOT_MODIFIED
+            )
+
+        with mock.patch("shop.cache.time.time", return_value=now + 300):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data["results"][0]["stock"], 0)
+
+    def test_category_list_cache(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse("categories")
+        self.client.get(url)
+        self.get(url)
+        Category.objects.create(name="Books")
+        names = [c["name"] for c in self.client.get(url).data["results"]]
+        self.assertEqual(names, ["Books", "Electronics"])
+
+    def test_demo_page_is_cached_for_anonymous_users(self):
+        url = reverse("products-demo")
+        self.client.get(url)
+        self.assertContains(self.get(url, queries=0), "Radio")
+
+        self.product.name = "Vintage radio"
+        self.product.save()
+        self.assertContains(self.client.get(url), "Vintage radio")
+
+        self.client.force_login(self.user)
+        # session, user, products and images; the facets are still cached
+        with self.assertNumQueries(4):
+            self.client.get(url)
@@ -0,0 +1,95 @@
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.core.cache import cache
+from django.urls import reverse
+from django.contrib.auth.models import User
+from shop.categories import CategoryCache, category_cache
+from shop.models import Product, Category
+from profile.models import Seller
+
+
+class CategorySlugTest(APITestCase):
+
+    def test_slugs_are_unique(self):
+        first = Category.objects.create(name="Home & Garden")
+        second = Category.objects.create(name="Home Garden")
+        third = Category.objects.create(name="home garden!")
+        self.assertEqual(
+            [first.slug, second.slug, third.slug],
+            ["home-garden", "home-garden-2", "home-garden-3"],
+        )
+
+    def test_slug_follows_renames_only(self):
+        category = Category.objects.create(name="Phones")
+        Category.objects.create(name="Tablets")
+        category.description = "Mobile phones"
+        category.save()
+        self.assertEqual(category.slug, "phones")
+
+        category.name = "Tablets"
+        category.save(update_fields=["name"])
+        category.refresh_from_db()
+        self.assertEqual(category.slug, "tablets-2")
+
+    def test_category_detail_by_slug(self):
+        admin = User.objects.create_superuser(
+            username="admin", password="adminpass"
+        )
+        self.client.force_authenticate(user=admin)
+        category = Category.objects.create(name="Garden Tools")
+        response = self.client.get(
+            reverse("category-detail", args=["garden-tools"])
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["id"], category.id)
+
+        response = self.client.get(reverse("category-detail", args=["none"]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CategoryCacheTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Electronics")
+        seller = Seller.objects.create(
+            user=User.objects.create_user(
+                username="seller", password="sellerpass"
+            )
+        )
+        for i in range(3):
+            Product.objects.create(
+                name=f"Radio {i}",
+                price=20,
+                seller=seller,
+                category=self.category,
+            )
+
+    def test_products_take_categories_from_the_cache(self):
+        category_cache.load()
+        with self.assertNumQueries(2):
+            products = list(Product.objects.with_related())
+            names = {product.category.name for product in products}
+        self.assertEqual(names, {"Electronics"})
+
+    def test_renames_reach_every_worker(self):
+        other_worker = CategoryCache()
+        self.assertEqual(
+            other_worker.get(self.category.id).name, "Electronics"
+        )
+        self.category.name = "Audio"
+        self.category.save()
+        self.assertEqual(other_worker.get(self.category.id).name, "Audio")
+        self.assertEqual(
+            other_worker.get_by_slug("audio").id, self.category.id
+        )
+
+    def test_demo_category_page(self):
+        response = self.client.get(
+            reverse("category-detail-demo", args=[self.category.slug])
+        )
+        self.assertContains(response, "Radio 2")
+        response = self.client.get(
+            reverse("category-detail-demo", args=["missing"])
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
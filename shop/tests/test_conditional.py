@@ -0,0 +1,104 @@
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.core.cache import cache
+from django.urls import reverse
+from django.contrib.auth.models import User
+from shop.models import Product, Category, ProductImage
+from profile.models import Seller
+
+
+class ConditionalGetTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="seller", password="sellerpass"
+        )
+        self.seller = Seller.objects.create(user=self.user)
+        self.category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(
+            name="Radio",
+            price=20,
+            seller=self.seller,
+            category=self.category,
+        )
+        self.detail = reverse("product-detail", args=[self.product.id])
+
+    def assertNotModified(self, url, queries=0, **headers):
+        # the validators come from the cache
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def assertModified(self, url, **headers):
+        response = self.client.get(url, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_detail_if_none_match(self):
+        etag = self.assertModified(self.detail)["ETag"]
+        self.assertNotModified(self.detail, if_none_match=etag)
+
+        self.product.refresh_from_db()
+        self.product.stock = 0
+        self.product.save(update_fields=["stock"])
+        etag = self.assertModified(self.detail, if_none_match=etag)["ETag"]
+
+        self.category.name = "Audio"
+        self.category.save()
+        etag = self.assertModified(self.detail, if_none_match=etag)["ETag"]
+
+        ProductImage.objects.create(product=self.product)
+        self.assertModified(self.detail, if_none_match=etag)
+
+    def test_detail_if_modified_since(self):
+        last_modified = self.assertModified(self.detail)["Last-Modified"]
+        self.assertNotModified(self.detail, if_modified_since=last_modified)
+
+        # stock changes made in bulk, e.g. by the cart views
+        Product.objects.filter(pk=self.product.pk).update(
+            stock=0, updated_at="2100-01-01T00:00:00Z"
+        )
+        self.assertModified(self.detail, if_modified_since=last_modified)
+
+    def test_list_etag_follows_the_filtered_products(self):
+        url = reverse("products")
+        etag = self.assertModified(url)["ETag"]
+        self.assertNotModified(url, if_none_match=etag)
+        # another filter is another representation
+        self.assertModified(url + "?min_price=50", if_none_match=etag)
+
+        Product.objects.create(
+            name="Lamp", price=15, seller=self.seller, category=self.category
+        )
+        etag = self.assertModified(url, if_none_match=etag)["ETag"]
+        self.product.delete()
+        self.assertModified(url, if_none_match=etag)
+
+    def test_category_list(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse("categories")
+        etag = self.assertModified(url)["ETag"]
+        self.assertNotModified(url, if_none_match=etag)
+        Category.objects.create(name="Books")
+        self.assertModified(url, if_none_match=etag)
+
+    def test_detail_validators_out_of_the_cache(self):
+        etag = self.assertModified(self.detail)["ETag"]
+        cache.clear()
+        # only the aggregate query runs
+        self.assertNotModified(self.detail, queries=1, if_none_match=etag)
+
+    def test_plain_reads_run_no_aggregate(self):
+        url = reverse("products")
+        self.assertModified(url)
+        self.assertModified(self.detail)
+        with self.assertNumQueries(0):
+            self.assertModified(url)
+            self.assertModified(self.detail)
+
+    def test_missing_product(self):
+        response = self.client.get(
+            reverse("product-detail", args=[self.product.id + 1])
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,106 @@
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.core.cache import cache
+from django.urls import reverse
+from django.contrib.auth.models import User
+from shop.models import Product, Category
+from profile.models import Seller, Address
+
+
+class FacetTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.phones = Category.objects.create(name="Phones")
+        self.furniture = Category.objects.create(name="Furniture")
+        berlin = self.create_seller("berlin", "Berlin")
+        hamburg = self.create_seller("hamburg", "Hamburg")
+        self.create_product("Smartphone", 300, self.phones, berlin)
+        self.create_product("Phone case", 20, self.phones, berlin)
+        self.create_product("Phone charger", 15, self.phones, hamburg)
+        self.create_product("Lunch table", 80, self.furniture, hamburg)
+        self.user = berlin.user
+
+    def create_seller(self, username, city):
+        return Seller.objects.create(
+            user=User.objects.create_user(
+                username=username, password="sellerpass"
+            ),
+            address=Address.objects.create(
+                street="Test Street",
+                postal_code="12345",
+                phone_number="+1684564673",
+                city=city,
+            ),
+        )
+
+    def create_product(self, name, price, category, seller):
+        return Product.objects.create(
+            name=name, price=price, category=category, seller=seller
+        )
+
+    def get_facets(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["facets"]
+
+    def test_product_list_facets(self):
+        facets = self.get_facets(reverse("products"))
+        self.assertEqual(facets["category"], [
+            {"id": self.phones.id, "name": "Phones", "count": 3},
+            {"id": self.furniture.id, "name": "Furniture", "count": 1},
+        ])
+        self.assertEqual(facets["price"], [
+            {"min": 0, "max": 25, "count": 2},
+            {"min": 50, "max": 100, "count": 1},
+            {"min": 250, "max": 500, "count": 1},
+        ])
+        self.assertEqual(facets["city"], [
+            {"key": "berlin", "name": "Berlin", "count": 2},
+            {"key": "hamburg", "name": "Hamburg", "count": 2},
+        ])
+
+    def test_facets_count_the_filtered_products(self):
+        facets = self.get_facets(
+            reverse("products"), {"city": "Hamburg", "max_price": 100}
+        )
+        self.assertEqual(
+            [(c["name"], c["count"]) for c in facets["category"]],
+            [("Furniture", 1), ("Phones", 1)],
+        )
+        self.assertEqual(
+            [(c["name"], c["count"]) for c in facets["city"]],
+            [("Hamburg", 2)],
+        )
+
+        facets = self.get_facets(
+            reverse("products"), {"category": self.phones.id}
+        )
+        self.assertEqual(
+            [(c["name"], c["count"]) for c in facets["city"]],
+            [("Berlin", 2), ("Hamburg", 1)],
+        )
+
+    def test_search_facets(self):
+        self.client.force_authenticate(user=self.user)
+        facets = self.get_facets(reverse("search"), {"search": "table"})
+        self.assertEqual(
+            [(c["name"], c["count"]) for c in facets["category"]],
+            [("Furniture", 1)],
+        )
+        self.assertEqual(
+            [(c["name"], c["count"]) for c in facets["city"]],
+            [("Hamburg", 1)],
+        )
+
+    def test_facets_are_cached_across_pages(self):
+        url = reverse("products")
+        first = self.client.get(url, {"page_size": 2})
+        # products + images, the facets come from the cache
+        with self.assertNumQueries(2):
+            second = self.client.get(first.data["next"])
+        self.assertEqual(second.data["facets"], first.data["facets"])
+
+        # another filter signature is counted on its own
+        with self.assertNumQueries(3):
+            self.client.get(url, {"min_price": 50})
@@ -0,0 +1,167 @@
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import cloudinary
+from cloudinary import CloudinaryResource
+from PIL import Image
+from rest_framework.test import APITestCase
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from django.contrib.auth.models import User
+from shop.images import DERIVATIVE_SIZES, RESPONSIVE_SIZES, image_urls
+from shop.models import Product, Category, ProductImage
+from shop.storage.local import LocalImageStorage
+from shop.storage.remote import CloudinaryImageStorage
+from profile.models import Seller
+
+
+class LocalImageDerivativeTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        settings = override_settings(
+            SHOP_LOCAL_IMAGE_ROOT=self.root,
+            SHOP_LOCAL_IMAGE_URL="/media/",
+            SHOP_IMAGE_STORAGE="shop.storage.local.LocalImageStorage",
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.storage = LocalImageStorage()
+        seller = Seller.objects.create(
+            user=User.objects.create_user(username="seller")
+        )
+        self.product = Product.objects.create(
+            name="Radio",
+            price=20,
+            seller=seller,
+            category=Category.objects.create(name="Electronics"),
+        )
+
+    def save_image(self, size=(800, 600), color="green"):
+        path = Path(self.root) / "upload.png"
+        Image.new("RGB", size, color).save(path)
+        return self.storage.save(path, "radio.png")
+
+    def test_derivatives_are_sized(self):
+        resource = self.save_image()
+        self.storage.create_derivatives(resource, DERIVATIVE_SIZES)
+
+        def size(width, height=None):
+            path = self.storage.derivative_path(resource, width, height)
+            with Image.open(path) as image:
+                return image.format, image.size
+
+        self.assertEqual(size(300, 200), ("WEBP", (300, 200)))
+        self.assertEqual(size(600, 400), ("WEBP", (600, 400)))
+        self.assertEqual(size(480), ("WEBP", (480, 360)))
+        # never scaled up
+        self.assertEqual(size(1440), ("WEBP", (800, 600)))
+
+    def test_storage_is_content_addressed(self):
+        first = self.save_image()
+        self.assertEqual(self.save_image().public_id, first.public_id)
+        other = self.save_image(color="red")
+        self.assertNotEqual(other.public_id, first.public_id)
+        self.assertNotEqual(
+            self.storage.derivative_url(other, 300, 200),
+            self.storage.derivative_url(first, 300, 200),
+        )
+
+    def test_derivatives_render_on_first_use(self):
+        resource = self.save_image()
+        path = self.storage.derivative_path(resource, 300, 200)
+        self.assertFalse(path.exists())
+
+        url = self.storage.derivative_url(resource, 300, 200)
+        digest = resource.public_id.removeprefix("local/")
+        self.assertEqual(url, f"/media/derivatives/{digest}/300x200.webp")
+        self.assertTrue(path.exists())
+
+    def test_unreadable_image_falls_back_to_the_original(self):
+        resource = self.save_image()
+        self.storage.path(resource).write_bytes(b"not an image")
+        with self.assertLogs("shop.storage.local", "ERROR"):
+            url = self.storage.derivative_url(resource, 300, 200)
+        self.assertEqual(url, self.storage.url(resource))
+        self.assertEqual(url, f"/media/{resource.public_id}.png")
+
+    def test_product_api_has_srcset(self):
+        resource = self.save_image()
+        ProductImage.objects.create(product=self.product, image=resource)
+        response = self.client.get(
+            reverse("product-detail", args=[self.product.id])
+        )
+        urls = response.data["images"][0]["urls"]
+        digest = resource.public_id.removeprefix("local/")
+        self.assertEqual(
+            urls["thumbnail"], f"/media/derivatives/{digest}/300x200.webp"
+        )
+        self.assertEqual(
+            urls["thumbnail_srcset"],
+            f"/media/derivatives/{digest}/300x200.webp 300w, "
+            f"/media/derivatives/{digest}/600x400.webp 600w",
+        )
+        self.assertEqual(
+            urls["srcset"].count("w, "), len(RESPONSIVE_SIZES) - 1
+        )
+        self.assertEqual(urls["url"], f"/media/{resource.public_id}.png")
+
+    def test_product_page_uses_thumbnails(self):
+        resource = self.save_image()
+        ProductImage.objects.create(product=self.product, image=resource)
+        response = self.client.get(reverse("products-demo"))
+        digest = resource.public_id.removeprefix("local/")
+        self.assertContains(
+            response,
+            f'src="/media/derivatives/{digest}/300x200.webp"',
+        )
+        self.assertContains(response, "600x400.webp 600w")
+
+    def test_placeholder_images_are_served_as_they_are(self):
+        placeholder = "https://fakeimg.pl/300x200"
+        image = ProductImage.objects.create(product=self.product)
+        self.assertEqual(image_urls(image.image)["thumbnail"], placeholder)
+        image.refresh_from_db()
+        self.assertEqual(image_urls(image.image), {
+            "url": placeholder,
+            "thumbnail": placeholder,
+            "thumbnail_srcset": "",
+            "srcset": "",
+        })
+
+
+class CloudinaryImageDerivativeTest(APITestCase):
+
+    def test_derivatives_are_transformations(self):
+        resource = CloudinaryResource(
+            "radio", format="jpg", version="1",
+            type="upload", resource_type="image",
+        )
+        storage = CloudinaryImageStorage()
+        with mock.patch.object(cloudinary.config(), "cloud_name", "demo"):
+            self.assertEqual(
+                storage.derivative_url(resource, 300, 200),
+                "http://res.cloudinary.com/demo/image/upload/"
+                "c_fill,h_200,q_auto,w_300/v1/radio.jpg",
+            )
+            self.assertEqual(
+                storage.derivative_url(resource, 480),
+                "http://res.cloudinary.com/demo/image/upload/"
+                "c_limit,q_auto,w_480/v1/radio.jpg",
+            )
+
+    def test_derivatives_are_requested_on_upload(self):
+        with mock.patch("cloudinary.uploader.upload_resource") as upload:
+            CloudinaryImageStorage().save(Path("/tmp/radio.jpg"), "radio")
+        eager = upload.call_args.kwargs["eager"]
+        self.assertEqual(len(eager), len(DERIVATIVE_SIZES))
+        self.assertIn(
+            {"width": 300, "height": 200, "crop": "fill", "quality": "auto"},
+            eager,
+        )
@@ -0,0 +1,13 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+
+class BrowseIndexTest(TestCase):
+
+    def test_browse_queries_use_their_indexes(self):
+        out = StringIO()
+        # fails with CommandError naming the queries that miss their index
+        call_command("explain_catalog", seed=20000, stdout=out)
+        self.assertIn("product_in_stock_created_idx", out.getvalue())
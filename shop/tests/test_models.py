@@ -30,7 +30,7 @@ class ProductAPITest(APITestCase):
         url = reverse("products")
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data["results"]), 1)
 
     def test_create_product_as_superuser(self):
         self.client.force_authenticate(user=self.superuser)
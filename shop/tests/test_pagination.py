@@ -0,0 +1,114 @@
+import json
+from base64 import b64encode
+
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.urls import reverse
+from django.contrib.auth.models import User
+from shop.models import Product, Category
+from profile.models import Seller
+
+
+class KeysetPaginationTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="seller", password="sellerpass"
+        )
+        self.seller = Seller.objects.create(user=self.user)
+        self.category = Category.objects.create(name="Electronics")
+        # Prices repeat so that pages have to break ties on id
+        self.products = [
+            Product.objects.create(
+                name=f"Product {i}",
+                price=10 + i % 3,
+                seller=self.seller,
+                category=self.category,
+            )
+            for i in range(7)
+        ]
+        self.url = reverse("products")
+
+    def walk(self, url, params):
+        ids = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), 3)
+            ids += [product["id"] for product in response.data["results"]]
+            if response.data["next"] is None:
+                return ids, response
+            response = self.client.get(response.data["next"])
+
+    def test_default_ordering_is_newest_first(self):
+        ids, _ = self.walk(self.url, {"page_size": 3})
+        expected = sorted(
+            self.products, key=lambda p: (p.created_at, p.id), reverse=True
+        )
+        self.assertEqual(ids, [p.id for p in expected])
+
+    def test_price_ordering_breaks_ties_on_id(self):
+        ids, _ = self.walk(self.url, {"page_size": 3, "ordering": "price"})
+        expected = sorted(self.products, key=lambda p: (p.price, p.id))
+        self.assertEqual(ids, [p.id for p in expected])
+
+        ids, _ = self.walk(self.url, {"page_size": 3, "ordering": "-price"})
+        self.assertEqual(ids, [p.id for p in reversed(expected)])
+
+    def test_previous_link_returns_the_same_page(self):
+        params = {"page_size": 3, "ordering": "price"}
+        first = self.client.get(self.url, params)
+        self.assertIsNone(first.data["previous"])
+        second = self.client.get(first.data["next"])
+        third = self.client.get(second.data["next"])
+        back = self.client.get(third.data["previous"])
+        self.assertEqual(back.data["results"], second.data["results"])
+        back = self.client.get(back.data["previous"])
+        self.assertEqual(back.data["results"], first.data["results"])
+        self.assertIsNone(back.data["previous"])
+
+    def test_deep_page_does_not_count(self):
+        first = self.client.get(self.url, {"page_size": 3})
+        # one seek query for the products and one for their images
+        with self.assertNumQueries(2):
+            response = self.client.get(first.data["next"])
+        self.assertNotIn("count", response.data)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tampered_cursor_value(self):
+        cases = [
+            ("-created_at", "abc"),
+            ("-created_at", "2024-13-99"),
+            ("price", "abc"),
+            ("price", "NaN"),
+        ]
+        for ordering, value in cases:
+            cursor = b64encode(
+                json.dumps([ordering, value, 1, False]).encode("utf-8")
+            ).decode("ascii")
+            with self.subTest(ordering=ordering, value=value):
+                response = self.client.get(
+                    self.url, {"cursor": cursor, "ordering": ordering}
+                )
+                self.assertEqual(
+                    response.status_code, status.HTTP_404_NOT_FOUND
+                )
+
+    def test_cursor_is_bound_to_its_ordering(self):
+        first = self.client.get(self.url, {"page_size": 3})
+        cursor = first.data["next"].split("cursor=")[1]
+        response = self.client.get(
+            self.url, {"cursor": cursor, "ordering": "price"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_category_list_is_paginated_by_name(self):
+        for name in ["Books", "Garden", "Toys"]:
+            Category.objects.create(name=name)
+        self.client.force_authenticate(user=self.user)
+        ids, _ = self.walk(reverse("categories"), {"page_size": 3})
+        expected = Category.objects.order_by("name", "id")
+        self.assertEqual(ids, [c.id for c in expected])
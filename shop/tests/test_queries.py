@@ -0,0 +1,78 @@
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from shop.categories import category_cache
+from shop.models import Product, Category, ProductImage
+from profile.models import Seller, Address
+
+
+class ProductQueryCountTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.address = Address.objects.create(
+            street="Test Street",
+            postal_code="12345",
+            phone_number="+1684564673",
+            city="Berlin",
+        )
+        self.user = User.objects.create_user(
+            username="seller", password="sellerpass"
+        )
+        self.seller = Seller.objects.create(
+            user=self.user, address=self.address)
+        self.category = Category.objects.create(name="Electronics")
+
+    def create_products(self, count, images=2):
+        for i in range(count):
+            product = Product.objects.create(
+                name=f"Product {i}",
+                price=10 + i,
+                stock=5,
+                seller=self.seller,
+                category=self.category,
+            )
+            for _ in range(images):
+                ProductImage.objects.create(product=product)
+        # as in a warmed-up worker
+        category_cache.load()
+
+    def test_product_list_query_count_is_constant(self):
+        url = reverse("products")
+        self.create_products(1)
+        # facet counts + products joined with seller and address +
+        # images; the categories come from the category cache
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.create_products(25)
+        # the writes expired the cached response and facets
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_product_list_includes_category_and_images(self):
+        self.create_products(1, images=3)
+        response = self.client.get(reverse("products"))
+        product = response.data["results"][0]
+        self.assertEqual(product["category"]["name"], "Electronics")
+        self.assertEqual(len(product["images"]), 3)
+
+    def test_product_detail_query_count(self):
+        self.create_products(1, images=3)
+        product = Product.objects.get()
+        self.client.force_authenticate(user=self.user)
+        # product + images
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse("product-detail", args=[product.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_demo_product_list_query_count_is_constant(self):
+        self.create_products(20)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("products-demo"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
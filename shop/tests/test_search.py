@@ -0,0 +1,316 @@
+from unittest import TestCase, skipUnless
+
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.contrib.auth.models import User
+from shop.models import Product, Category
+from profile.models import Seller, Address
+from shop.search import get_search_backend
+from shop.search.memory import InvertedIndex
+
+
+class SearchTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="seller", password="sellerpass"
+        )
+        self.seller = Seller.objects.create(
+            user=self.user,
+            address=Address.objects.create(
+                street="Test Street",
+                postal_code="12345",
+                phone_number="+1684564673",
+                city="Berlin",
+            ),
+        )
+        self.phones = Category.objects.create(name="Phones")
+        self.furniture = Category.objects.create(name="Furniture")
+        self.smartphone = self.create_product(
+            "Smartphone", 300, self.phones, "Barely used, comes with case"
+        )
+        self.case = self.create_product(
+            "Leather case", 20, self.phones, "Fits any smartphone"
+        )
+        self.table = self.create_product(
+            "Lunch table", 250, self.furniture, "A nice oak table"
+        )
+        self.url = reverse("search")
+        self.client.force_authenticate(user=self.user)
+
+    def create_product(self, name, price, category, description):
+        return Product.objects.create(
+            name=name,
+            price=price,
+            description=description,
+            seller=self.seller,
+            category=category,
+        )
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [product["name"] for product in response.data["results"]]
+
+
+class ProductSearchTest(SearchTestCase):
+
+    def test_search_matches_name_description_and_category(self):
+        self.assertEqual(self.search(search="table"), ["Lunch table"])
+        self.assertCountEqual(
+            self.search(search="smartphone"), ["Smartphone", "Leather case"]
+        )
+        self.assertCountEqual(
+            self.search(search="furniture"), ["Lunch table"]
+        )
+
+    def test_search_respects_product_filter(self):
+        self.assertEqual(
+            self.search(search="smartphone", max_price=100), ["Leather case"]
+        )
+        self.assertEqual(self.search(search="table", city="Hamburg"), [])
+        self.assertEqual(
+            self.search(search="table", city="berlin"), ["Lunch table"]
+        )
+        self.assertEqual(
+            self.search(search="table", city_prefix="BER"), ["Lunch table"]
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "requires PostgreSQL")
+    def test_name_hits_rank_above_description_hits(self):
+        self.assertEqual(
+            self.search(search="smartphone"), ["Smartphone", "Leather case"]
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "requires PostgreSQL")
+    def test_last_word_matches_as_prefix(self):
+        self.assertEqual(self.search(search="lunch tab"), ["Lunch table"])
+
+    @skipUnless(connection.vendor == "postgresql", "requires PostgreSQL")
+    def test_search_vector_follows_writes(self):
+        self.table.name = "Dining table"
+        self.table.save()
+        self.assertEqual(self.search(search="dining"), ["Dining table"])
+
+        Product.objects.filter(name="Dining table").update(name="Desk")
+        self.assertEqual(self.search(search="dining"), [])
+        self.assertEqual(self.search(search="desk"), ["Desk"])
+
+        self.case.description = "Genuine leather wallet"
+        Product.objects.bulk_update([self.case], ["description"])
+        self.assertEqual(self.search(search="wallet"), ["Leather case"])
+
+        self.furniture.name = "Home"
+        self.furniture.save()
+        self.assertEqual(self.search(search="home"), ["Desk"])
+
+    def test_unchanged_sources_keep_the_vectors(self):
+        def vector_updates(obj):
+            with CaptureQueriesContext(connection) as queries:
+                obj.save()
+            return [
+                query for query in queries
+                if 'SET "search_vector"' in query["sql"]
+            ]
+
+        table = Product.objects.get(pk=self.table.pk)
+        table.price = 200
+        self.assertEqual(vector_updates(table), [])
+        furniture = Category.objects.get(pk=self.furniture.pk)
+        furniture.description = "Tables and chairs"
+        self.assertEqual(vector_updates(furniture), [])
+        self.assertEqual(vector_updates(furniture), [])
+
+        if connection.vendor == "postgresql":
+            table.description = "A nice pine table"
+            self.assertEqual(len(vector_updates(table)), 1)
+            self.assertEqual(vector_updates(table), [])
+            furniture.name = "Home"
+            self.assertEqual(len(vector_updates(furniture)), 1)
+            self.assertEqual(self.search(search="pine"), ["Lunch table"])
+            self.assertEqual(self.search(search="home"), ["Lunch table"])
+
+    def test_vectors_are_neither_shown_nor_read(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("products"))
+        self.assertNotIn("search_vector", response.data["results"][0])
+        self.assertFalse(
+            any('"search_vector"' in query["sql"] for query in queries)
+        )
+        response = self.client.get(self.url, {"search": "table"})
+        self.assertNotIn("search_vector", response.data["results"][0])
+
+    @skipUnless(connection.vendor == "postgresql", "requires PostgreSQL")
+    def test_ranked_results_paginate(self):
+        for i in range(5):
+            self.create_product(f"Phone charger {i}", 5, self.phones, "")
+        first = self.client.get(self.url, {"search": "phone", "page_size": 2})
+        names = [product["name"] for product in first.data["results"]]
+        next_url = first.data["next"]
+        while next_url:
+            response = self.client.get(next_url)
+            names += [product["name"] for product in response.data["results"]]
+            next_url = response.data["next"]
+        self.assertEqual(len(names), len(set(names)))
+        self.assertEqual(len(names), 7)
+
+
+class FuzzySearchTest(SearchTestCase):
+
+    def setUp(self):
+        super().setUp()
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+                )
+                if cursor.fetchone() is None:
+                    self.skipTest("requires the pg_trgm extension")
+
+    def test_fuzzy_search_tolerates_typos(self):
+        self.assertEqual(self.search(search="smarphone"), [])
+        self.assertEqual(
+            self.search(search="smarphone", fuzzy="true"), ["Smartphone"]
+        )
+        self.assertEqual(
+            self.search(search="furnitur", fuzzy="true"), ["Lunch table"]
+        )
+
+    def test_suggestions(self):
+        response = self.client.get(
+            reverse("search-suggestions"), {"search": "smarphone"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["suggestions"], ["Smartphone"])
+
+    def test_demo_search_falls_back_to_fuzzy_matches(self):
+        response = self.client.get(
+            reverse("search-demo"), {"search": "smarphone"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.context["fuzzy_matched"])
+        self.assertEqual(
+            [product.name for product in response.context["products"]],
+            ["Smartphone"],
+        )
+
+
+class InvertedIndexTest(TestCase):
+
+    def setUp(self):
+        self.index = InvertedIndex({1: "Phones", 2: "Furniture"})
+        self.index.add(10, "Smartphone", "Barely used", 1)
+        self.index.add(11, "Leather case", "Fits any smartphone", 1)
+        self.index.add(12, "Lunch table", "A nice oak table", 2)
+
+    def test_and_and_prefix_lookups(self):
+        self.assertEqual(set(self.index.lookup(["smart"])), {10, 11})
+        self.assertEqual(set(self.index.lookup(["leather", "sm"])), {11})
+        self.assertEqual(self.index.lookup(["oak", "phones"]), {})
+        self.assertEqual(
+            self.index.lookup(["smart"], prefix=False), {}
+        )
+
+    def test_name_scores_above_description(self):
+        matches = self.index.lookup(["smartphone"])
+        self.assertGreater(matches[10], matches[11])
+
+    def test_incremental_updates(self):
+        self.index.add(12, "Desk", "", 2)
+        self.assertEqual(self.index.lookup(["lunch"]), {})
+        self.assertNotIn("lunch", self.index.terms)
+        self.index.set_category(2, "Home office")
+        self.assertEqual(set(self.index.lookup(["office"])), {12})
+        self.index.remove(12)
+        self.assertEqual(self.index.lookup(["desk"]), {})
+        self.assertEqual(self.index.terms, sorted(self.index.postings))
+
+    def test_closest_terms(self):
+        self.assertEqual(self.index.closest_terms("smarphone"), ["smartphone"])
+
+
+@override_settings(
+    SHOP_SEARCH_BACKEND="shop.search.memory.InvertedIndexBackend"
+)
+class InvertedIndexBackendTest(SearchTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # start every test from a freshly built index
+        get_search_backend.cache_clear()
+
+    def test_search_and_filters(self):
+        self.assertCountEqual(
+            self.search(search="smartphone"), ["Smartphone", "Leather case"]
+        )
+        self.assertEqual(self.search(search="lunch tab"), ["Lunch table"])
+        self.assertEqual(
+            self.search(search="smartphone", max_price=100), ["Leather case"]
+        )
+        self.assertCountEqual(
+            self.search(search="smarphone", fuzzy="true"),
+            ["Smartphone", "Leather case"],
+        )
+
+    def test_hits_are_ranked_by_score(self):
+        # a name match outranks a description match
+        self.assertEqual(
+            self.search(search="case"), ["Leather case", "Smartphone"]
+        )
+        self.assertEqual(
+            self.search(search="case", ordering="price"),
+            ["Leather case", "Smartphone"],
+        )
+        self.assertEqual(
+            self.search(search="smarphone", fuzzy="true"),
+            ["Smartphone", "Leather case"],
+        )
+        # pages are seeked on the rank
+        first = self.client.get(self.url, {"search": "case", "page_size": 1})
+        second = self.client.get(first.data["next"])
+        self.assertEqual(
+            [first.data["results"][0]["name"],
+             second.data["results"][0]["name"]],
+            ["Leather case", "Smartphone"],
+        )
+
+    @override_settings(SHOP_SEARCH_MAX_CANDIDATES=1)
+    def test_candidates_are_capped(self):
+        cache.clear()
+        self.assertEqual(self.search(search="case"), ["Leather case"])
+
+    def test_index_follows_signals(self):
+        self.search(search="table")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.table.name = "Dining table"
+            self.table.save()
+            self.create_product("Desk lamp", 15, self.furniture, "")
+            self.case.delete()
+            self.furniture.name = "Home"
+            self.furniture.save()
+        self.assertEqual(self.search(search="dining"), ["Dining table"])
+        self.assertEqual(self.search(search="lamp"), ["Desk lamp"])
+        self.assertEqual(self.search(search="leather"), [])
+        self.assertCountEqual(
+            self.search(search="home"), ["Dining table", "Desk lamp"]
+        )
+
+    def test_stats(self):
+        self.search(search="table")
+        admin = User.objects.create_superuser(
+            username="admin", password="adminpass"
+        )
+        self.client.force_authenticate(user=admin)
+        response = self.client.get(reverse("search-stats"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["backend"], "memory")
+        self.assertEqual(response.data["documents"], 3)
+        self.assertEqual(response.data["queries"], 1)
+        self.assertIsNotNone(response.data["build_seconds"])
+        self.assertIsNotNone(response.data["avg_query_microseconds"])
+        self.assertIs(get_search_backend().stats()["built"], True)
@@ -0,0 +1,296 @@
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import skipUnless
+
+from rest_framework.test import APIClient
+from rest_framework import status
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.contrib.auth.models import User
+from shop.models import Product, Category
+from shop.stock import (
+    change_reservation,
+    release_expired_items,
+    release_stock,
+    reserve_stock,
+    reserve_stock_many,
+)
+from profile.models import Cart, CartItem, Customer, Seller
+
+
+def create_product(stock):
+    seller = Seller.objects.create(
+        user=User.objects.create_user(username="seller")
+    )
+    return Product.objects.create(
+        name="Radio",
+        price=20,
+        stock=stock,
+        seller=seller,
+        category=Category.objects.create(name="Electronics"),
+    )
+
+
+class StockTest(TestCase):
+
+    def setUp(self):
+        self.product = create_product(stock=3)
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.stock
+
+    def test_reserve_and_release(self):
+        # a single UPDATE each
+        with self.assertNumQueries(1):
+            self.assertTrue(reserve_stock(self.product.pk, 2))
+        self.assertEqual(self.stock(), 1)
+        self.assertFalse(reserve_stock(self.product.pk, 2))
+        self.assertEqual(self.stock(), 1)
+        self.assertTrue(reserve_stock(self.product.pk, 1))
+        self.assertEqual(self.stock(), 0)
+
+        with self.assertNumQueries(1):
+            release_stock(self.product.pk, 3)
+        self.assertEqual(self.stock(), 3)
+
+    def test_change_reservation(self):
+        self.assertTrue(change_reservation(self.product.pk, 1, 3))
+        self.assertEqual(self.stock(), 1)
+        self.assertFalse(change_reservation(self.product.pk, 3, 5))
+        self.assertEqual(self.stock(), 1)
+        self.assertTrue(change_reservation(self.product.pk, 3, 0))
+        self.assertEqual(self.stock(), 4)
+        with self.assertNumQueries(0):
+            self.assertTrue(change_reservation(self.product.pk, 2, 2))
+
+    def test_reserve_many_is_all_or_nothing(self):
+        lamp = Product.objects.create(
+            name="Lamp", price=10, stock=1,
+            seller=self.product.seller, category=self.product.category,
+        )
+        with transaction.atomic():
+            self.assertEqual(
+                reserve_stock_many({self.product.pk: 2, lamp.pk: 2}),
+                [lamp.pk],
+            )
+        self.assertEqual(self.stock(), 3)
+
+        # one SELECT ... FOR UPDATE, one UPDATE
+        with transaction.atomic(), self.assertNumQueries(2):
+            self.assertEqual(
+                reserve_stock_many({self.product.pk: 2, lamp.pk: -4}), []
+            )
+        self.assertEqual(self.stock(), 1)
+        lamp.refresh_from_db()
+        self.assertEqual(lamp.stock, 5)
+
+    def test_stock_cannot_go_negative(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Product.objects.filter(pk=self.product.pk).update(stock=-1)
+        self.assertEqual(self.stock(), 3)
+
+
+class ReleaseExpiredItemsTest(TestCase):
+
+    def setUp(self):
+        self.radio = create_product(stock=0)
+        self.lamp = Product.objects.create(
+            name="Lamp",
+            price=10,
+            stock=1,
+            seller=self.radio.seller,
+            category=self.radio.category,
+        )
+        self.carts = [
+            Cart.objects.create(customer=Customer.objects.create(
+                user=User.objects.create_user(username=f"customer-{i}")
+            ))
+            for i in range(6)
+        ]
+
+    def add(self, cart, product, quantity, minutes):
+        return CartItem.objects.create(
+            cart=cart,
+            product=product,
+            quantity=quantity,
+            expires_at=timezone.now() + timedelta(minutes=minutes),
+        )
+
+    def stock(self, product):
+        product.refresh_from_db()
+        return product.stock
+
+    def test_release_in_batches(self):
+        for i, cart in enumerate(self.carts[:5]):
+            self.add(cart, self.radio, i + 1, minutes=-10 + i)
+            self.add(cart, self.lamp, 1, minutes=-10 + i)
+        kept = self.add(self.carts[5], self.radio, 7, minutes=10)
+
+        # oldest first
+        self.assertEqual(release_expired_items(3), 3)
+        self.assertEqual(self.stock(self.radio), 1 + 2)
+        self.assertEqual(self.stock(self.lamp), 1 + 1)
+
+        out = StringIO()
+        call_command("release_expired_carts", batch_size=3, stdout=out)
+        self.assertEqual(out.getvalue(), "Released 7 cart items.\n")
+        self.assertEqual(self.stock(self.radio), 15)
+        self.assertEqual(self.stock(self.lamp), 6)
+        self.assertEqual(list(CartItem.objects.all()), [kept])
+        self.assertEqual(release_expired_items(3), 0)
+
+    def test_queries_do_not_grow_with_the_batch(self):
+        def release(count):
+            for cart in self.carts[:count]:
+                self.add(cart, self.radio, 1, minutes=-1)
+                self.add(cart, self.lamp, 2, minutes=-1)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(release_expired_items(100), 2 * count)
+            return len(queries)
+
+        self.assertEqual(release(1), release(5))
+
+    def test_cart_changes_renew_the_reservation(self):
+        cart = self.carts[0]
+        item = self.add(cart, self.lamp, 1, minutes=-1)
+        client = APIClient()
+        client.force_authenticate(user=cart.customer.user)
+        response = client.put(
+            reverse("cart-detail", args=[cart.customer.pk, item.pk]),
+            {"quantity": 2},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        item.refresh_from_db()
+        self.assertGreater(
+            item.expires_at, timezone.now() + timedelta(minutes=20)
+        )
+        self.assertEqual(release_expired_items(100), 0)
+
+
+@skipUnless(
+    connection.vendor == "postgresql",
+    "SQLite serializes writers with table locks",
+)
+class ConcurrentStockTest(TransactionTestCase):
+    """
+    Many customers adding the same product to their carts at once must
+    get exactly the stock there is, no more and no less.
+    """
+
+    customers = 8
+    attempts = 6
+    stock = 30
+
+    def setUp(self):
+        self.product = create_product(stock=self.stock)
+        self.carts = []
+        for i in range(self.customers):
+            customer = Customer.objects.create(
+                user=User.objects.create_user(username=f"customer-{i}")
+            )
+            self.carts.append(Cart.objects.create(customer=customer))
+
+    def hammer(self, cart, results):
+        client = APIClient()
+        client.force_authenticate(user=cart.customer.user)
+        url = reverse("cart", args=[cart.customer.pk])
+        try:
+            self.start.wait()
+            for _ in range(self.attempts):
+                response = client.post(
+                    url,
+                    {"cart": cart.pk, "product": self.product.pk,
+                     "quantity": 1},
+                    format="json",
+                )
+                results.append(response.status_code)
+        finally:
+            connection.close()
+
+    def test_no_oversell(self):
+        self.start = threading.Barrier(self.customers)
+        results = []
+        threads = [
+            threading.Thread(target=self.hammer, args=(cart, results))
+            for cart in self.carts
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(len(results), self.customers * self.attempts)
+        self.assertEqual(
+            results.count(status.HTTP_201_CREATED), self.stock
+        )
+        self.assertEqual(
+            results.count(status.HTTP_400_BAD_REQUEST),
+            self.customers * self.attempts - self.stock,
+        )
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+        self.assertEqual(
+            sum(CartItem.objects.values_list("quantity", flat=True)),
+            self.stock,
+        )
+        # the reservations only wait on each other for the length of an
+        # UPDATE, not of a request
+        self.assertLess(elapsed, 10)
+
+    def shuffle_carts(self, cart, products, results):
+        client = APIClient()
+        client.force_authenticate(user=cart.customer.user)
+        url = reverse("cart-batch", args=[cart.customer.pk])
+        try:
+            self.start.wait()
+            for _ in range(self.attempts):
+                response = client.post(url, {"operations": [
+                    {"op": "add", "product": product.pk, "quantity": 1}
+                    for product in products
+                ]}, format="json")
+                results.append(response.status_code)
+        finally:
+            connection.close()
+
+    def test_batches_in_any_order_do_not_deadlock(self):
+        lamp = Product.objects.create(
+            name="Lamp",
+            price=10,
+            stock=self.stock,
+            seller=self.product.seller,
+            category=self.product.category,
+        )
+        self.start = threading.Barrier(self.customers)
+        results = []
+        threads = [
+            threading.Thread(target=self.shuffle_carts, args=(
+                cart,
+                [self.product, lamp][::1 if i % 2 else -1],
+                results,
+            ))
+            for i, cart in enumerate(self.carts)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # a deadlock would surface as a 500
+        self.assertEqual(
+            sorted(set(results)),
+            [status.HTTP_200_OK, status.HTTP_400_BAD_REQUEST],
+        )
+        self.assertEqual(results.count(status.HTTP_200_OK), self.stock)
+        for product in (self.product, lamp):
+            product.refresh_from_db()
+            self.assertEqual(product.stock, 0)
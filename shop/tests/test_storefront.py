@@ -0,0 +1,145 @@
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+from django.contrib.auth.models import User
+from shop.models import Product, Category, ProductImage
+from profile.models import Seller, Address
+
+
+class SellerStorefrontTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="seller", first_name="Ada", last_name="Lovelace"
+        )
+        self.address = Address.objects.create(
+            street="Test Street",
+            postal_code="12345",
+            phone_number="+1684564673",
+            city="Berlin",
+        )
+        self.seller = Seller.objects.create(
+            user=self.user, address=self.address
+        )
+        self.other = Seller.objects.create(
+            user=User.objects.create_user(username="other")
+        )
+        self.category = Category.objects.create(name="Electronics")
+        Product.objects.bulk_create(
+            Product(
+                name=f"Radio {i}",
+                price=20,
+                seller=self.seller,
+                category=self.category,
+            )
+            for i in range(25)
+        )
+        self.url = reverse("seller-storefront", args=[self.seller.pk])
+
+    def get(self, url=None, params=None):
+        response = self.client.get(url or self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_pages_of_products_under_the_seller(self):
+        data = self.get(params={"page_size": 10})
+        self.assertEqual(data["seller"], {
+            "id": self.seller.pk,
+            "username": "seller",
+            "name": str(self.seller),
+            "city": "Berlin",
+            "product_count": 25,
+        })
+        names = [product["name"] for product in data["results"]]
+        while data["next"]:
+            data = self.get(data["next"])
+            names += [product["name"] for product in data["results"]]
+        self.assertEqual(len(names), 25)
+        self.assertEqual(len(set(names)), 25)
+
+    def test_cached_pages_need_no_query(self):
+        first = self.get()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(), first)
+
+    def test_only_the_sellers_own_changes_expire_the_header(self):
+        self.get()
+        Product.objects.create(
+            name="Lamp", price=5, seller=self.other, category=self.category
+        )
+        self.assertEqual(self.get()["seller"]["product_count"], 25)
+
+        product = Product.objects.create(
+            name="Lamp", price=5, seller=self.seller, category=self.category
+        )
+        self.assertEqual(self.get()["seller"]["product_count"], 26)
+        product.delete()
+        self.assertEqual(self.get()["seller"]["product_count"], 25)
+
+        Product.objects.filter(seller=self.seller).update(seller=self.other)
+        self.assertEqual(self.get()["seller"]["product_count"], 0)
+
+        self.address.city = "Hamburg"
+        self.address.save()
+        self.assertEqual(self.get()["seller"]["city"], "Hamburg")
+
+    def test_only_the_sellers_own_changes_expire_the_pages(self):
+        self.get()
+        lamp = Product.objects.create(
+            name="Lamp", price=5, seller=self.other, category=self.category
+        )
+        Product.objects.filter(pk=lamp.pk).update(price=6)
+        with self.assertNumQueries(0):
+            self.get()
+
+        radio = Product.objects.get(name="Radio 24")
+        Product.objects.filter(pk=radio.pk).update(price=30)
+        self.assertEqual(self.get()["results"][0]["price"], "30.00")
+        ProductImage.objects.create(product=radio)
+        self.assertEqual(len(self.get()["results"][0]["images"]), 1)
+
+        radio.seller = self.other
+        radio.save()
+        self.assertEqual(self.get()["results"][0]["name"], "Radio 23")
+
+    def test_only_shown_user_fields_expire_the_header(self):
+        self.get()
+        user = User.objects.get(pk=self.user.pk)
+        user.last_login = timezone.now()
+        # no lookup of the user's sellers
+        with self.assertNumQueries(1):
+            user.save(update_fields=["last_login"])
+        user.email = "ada@example.com"
+        with self.assertNumQueries(1):
+            user.save()
+        with self.assertNumQueries(0):
+            self.get()
+
+        user.first_name = "Augusta"
+        user.save()
+        self.assertEqual(
+            self.get()["seller"]["name"], "Augusta Lovelace"
+        )
+
+    def test_seller_page_follows_keyset_links(self):
+        url = reverse("seller-products-demo", args=["seller"])
+        response = self.client.get(url)
+        self.assertEqual(len(response.context["products"]), 24)
+        self.assertIsNone(response.context["previous_page"])
+        # the seller, one seek query and the images: no COUNT
+        with self.assertNumQueries(3):
+            response = self.client.get(response.context["next_page"])
+        self.assertEqual(len(response.context["products"]), 1)
+        self.assertIsNone(response.context["next_page"])
+        self.assertContains(response, "Previous")
+
+        response = self.client.get(url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unknown_seller(self):
+        url = reverse("seller-storefront", args=[self.other.pk + 100])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
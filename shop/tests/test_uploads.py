@@ -0,0 +1,318 @@
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+
+from PIL import Image
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.contrib.auth.models import User
+from shop.models import Product, Category, ImageUploadJob, ProductImage
+from shop.storage.local import LocalImageStorage
+from shop.uploads import claim_jobs, process_job, process_jobs
+from profile.models import Seller
+
+
+def image_file(name="Radio.GIF", size=(800, 600), format="GIF"):
+    content = BytesIO()
+    Image.new("RGB", size, "green").save(content, format)
+    return SimpleUploadedFile(name, content.getvalue())
+
+
+class FlakyImageStorage(LocalImageStorage):
+    """Fails the first `failures` uploads."""
+
+    failures = 0
+
+    def save(self, path, name):
+        if FlakyImageStorage.failures:
+            FlakyImageStorage.failures -= 1
+            raise ConnectionError("storage unavailable")
+        return super().save(path, name)
+
+
+class ConcurrentImageStorage(LocalImageStorage):
+    """Lets uploads through only once `barrier.parties` run at once."""
+
+    barrier = None
+
+    def save(self, path, name):
+        ConcurrentImageStorage.barrier.wait()
+        return super().save(path, name)
+
+
+class ImageUploadTest(APITestCase):
+
+    def setUp(self):
+        self.staging = tempfile.mkdtemp()
+        self.storage = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.staging)
+        self.addCleanup(shutil.rmtree, self.storage)
+        settings = override_settings(
+            SHOP_UPLOAD_STAGING_DIR=self.staging,
+            SHOP_LOCAL_IMAGE_ROOT=self.storage,
+            SHOP_IMAGE_STORAGE="shop.storage.local.LocalImageStorage",
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.admin = User.objects.create_superuser(
+            username="admin", password="adminpass"
+        )
+        self.client.force_authenticate(user=self.admin)
+        seller = Seller.objects.create(
+            user=User.objects.create_user(username="seller")
+        )
+        self.product = Product.objects.create(
+            name="Radio",
+            price=20,
+            seller=seller,
+            category=Category.objects.create(name="Electronics"),
+        )
+
+    def upload(self, image=None):
+        response = self.client.post(
+            reverse("images"),
+            {"product": self.product.id, "image": image or image_file()},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        return response
+
+    def process(self):
+        out = StringIO()
+        call_command("process_image_uploads", once=True, stdout=out)
+        return out.getvalue()
+
+    def test_upload_is_staged_then_attached(self):
+        image = image_file()
+        response = self.upload(image)
+        job = ImageUploadJob.objects.get(pk=response.data["id"])
+        self.assertEqual(
+            response["Location"], reverse("image-job-detail", args=[job.pk])
+        )
+        self.assertEqual(response.data["status"], "pending")
+        staged = Path(self.staging) / job.staged_name
+        self.assertEqual(staged.read_bytes(), image.file.getvalue())
+        # nothing is stored before the worker runs
+        self.assertFalse(ProductImage.objects.exists())
+
+        self.assertEqual(self.process(), "done: 1\n")
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImageUploadJob.Status.DONE)
+        self.assertEqual(job.attempts, 1)
+        product_image = ProductImage.objects.get()
+        self.assertEqual(job.image, product_image)
+        self.assertEqual(product_image.product, self.product)
+        stored = LocalImageStorage().path(product_image.image)
+        self.assertEqual(stored.parent.parent, Path(self.storage))
+        self.assertEqual(stored.suffix, ".gif")
+        self.assertEqual(stored.read_bytes(), image.file.getvalue())
+        self.assertFalse(staged.exists())
+
+        response = self.client.get(response["Location"])
+        self.assertEqual(response.data["status"], "done")
+        self.assertEqual(response.data["image"], product_image.id)
+
+    def test_attached_images_expire_the_cached_lists(self):
+        cache.clear()
+        url = reverse("products")
+        storefront = reverse(
+            "seller-storefront", args=[self.product.seller_id]
+        )
+        etag = self.client.get(url).headers["ETag"]
+        self.assertEqual(
+            self.client.get(storefront).data["results"][0]["images"], []
+        )
+        self.upload()
+        self.assertEqual(self.process(), "done: 1\n")
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"][0]["images"]), 1)
+        self.assertEqual(
+            len(self.client.get(storefront).data["results"][0]["images"]), 1
+        )
+
+    def test_upload_requires_a_file_and_a_product(self):
+        response = self.client.post(
+            reverse("images"), {"product": self.product.id}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(
+            reverse("images"),
+            {"product": self.product.id + 1, "image": image_file()},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(
+            reverse("images"),
+            {
+                "product": self.product.id,
+                "image": SimpleUploadedFile("radio.gif", b"not an image"),
+            },
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("image", response.data)
+        self.assertFalse(ImageUploadJob.objects.exists())
+        self.assertEqual(list(Path(self.staging).iterdir()), [])
+
+    def test_upload_requires_an_admin(self):
+        self.client.force_authenticate(user=User.objects.get(
+            username="seller"
+        ))
+        response = self.client.post(
+            reverse("images"),
+            {"product": self.product.id, "image": image_file()},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(
+        SHOP_IMAGE_STORAGE="shop.tests.test_uploads.FlakyImageStorage",
+        SHOP_IMAGE_UPLOAD_MAX_ATTEMPTS=3,
+    )
+    def test_failed_uploads_are_retried_with_backoff(self):
+        FlakyImageStorage.failures = 1
+        job = ImageUploadJob.objects.get(pk=self.upload().data["id"])
+
+        self.assertEqual(self.process(), "pending: 1\n")
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImageUploadJob.Status.PENDING)
+        self.assertEqual(
+            job.last_error, "ConnectionError: storage unavailable"
+        )
+        self.assertGreater(
+            job.run_after, timezone.now() + timedelta(seconds=25)
+        )
+        # not due yet
+        self.assertEqual(self.process(), "No jobs due.\n")
+
+        ImageUploadJob.objects.update(run_after=timezone.now())
+        self.assertEqual(self.process(), "done: 1\n")
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(job.last_error, "")
+        self.assertTrue(ProductImage.objects.filter(product=self.product))
+
+    @override_settings(
+        SHOP_IMAGE_STORAGE="shop.tests.test_uploads.FlakyImageStorage",
+        SHOP_IMAGE_UPLOAD_MAX_ATTEMPTS=2,
+        SHOP_IMAGE_UPLOAD_RETRY_DELAY=0,
+    )
+    def test_upload_fails_after_max_attempts(self):
+        FlakyImageStorage.failures = 5
+        job = ImageUploadJob.objects.get(pk=self.upload().data["id"])
+
+        self.assertEqual(self.process(), "failed: 1, pending: 1\n")
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImageUploadJob.Status.FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertFalse(ProductImage.objects.exists())
+        self.assertFalse((Path(self.staging) / job.staged_name).exists())
+
+    def test_stale_claims_are_taken_over(self):
+        job = ImageUploadJob.objects.get(pk=self.upload().data["id"])
+        stale, = claim_jobs(10)
+        # the first worker's claim runs out before it finishes
+        ImageUploadJob.objects.update(run_after=timezone.now())
+        self.assertEqual(self.process(), "done: 1\n")
+
+        self.assertIsNone(process_job(stale))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImageUploadJob.Status.DONE)
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(ProductImage.objects.count(), 1)
+
+    def bulk_upload(self, *images):
+        return self.client.post(
+            reverse("images-bulk"),
+            {"product": self.product.id, "images": list(images)},
+            format="multipart",
+        )
+
+    @override_settings(
+        SHOP_IMAGE_STORAGE="shop.tests.test_uploads.ConcurrentImageStorage",
+    )
+    def test_bulk_upload(self):
+        ConcurrentImageStorage.barrier = threading.Barrier(3, timeout=5)
+        images = [
+            image_file(f"radio-{i}.png", (100 + i, 100), "PNG")
+            for i in range(3)
+        ]
+        # the product, then one INSERT for all the jobs
+        with self.assertNumQueries(2):
+            response = self.bulk_upload(*images)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        files = response.data["files"]
+        self.assertEqual(
+            [file["name"] for file in files],
+            ["radio-0.png", "radio-1.png", "radio-2.png"],
+        )
+        self.assertEqual({file["status"] for file in files}, {"pending"})
+        jobs = ImageUploadJob.objects.in_bulk([file["job"] for file in files])
+        self.assertEqual(len(jobs), 3)
+        self.assertEqual(
+            files[0]["url"],
+            reverse("image-job-detail", args=[files[0]["job"]]),
+        )
+
+        # all three uploads have to be in flight at once to get past the
+        # storage's barrier
+        self.assertEqual(self.process(), "done: 3\n")
+        self.assertEqual(
+            ProductImage.objects.filter(product=self.product).count(), 3
+        )
+        self.assertEqual(list(Path(self.staging).iterdir()), [])
+
+    def test_bulk_upload_checks_every_file_first(self):
+        response = self.bulk_upload(
+            image_file("front.gif"),
+            SimpleUploadedFile("notes.txt", b"not an image"),
+            image_file("back.gif"),
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        files = response.data["files"]
+        self.assertEqual(
+            [(file["name"], file["status"]) for file in files],
+            [
+                ("front.gif", "accepted"),
+                ("notes.txt", "invalid"),
+                ("back.gif", "accepted"),
+            ],
+        )
+        self.assertIn("errors", files[1])
+        self.assertFalse(ImageUploadJob.objects.exists())
+        self.assertEqual(list(Path(self.staging).iterdir()), [])
+
+        response = self.client.post(
+            reverse("images-bulk"),
+            {"product": self.product.id},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_images_are_attached_in_constant_queries(self):
+        def process(count):
+            self.bulk_upload(*[image_file() for _ in range(count)])
+            jobs = claim_jobs(10)
+            with CaptureQueriesContext(connection) as queries:
+                statuses = process_jobs(jobs)
+            self.assertEqual(
+                set(statuses.values()), {ImageUploadJob.Status.DONE}
+            )
+            return len(queries)
+
+        self.assertEqual(process(1), process(4))
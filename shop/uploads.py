@@ -0,0 +1,255 @@
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from shop.cache import PRODUCTS, bump_versions, seller_namespace
+from shop.images import DERIVATIVE_SIZES
+from shop.models import ImageUploadJob, Product, ProductImage
+from shop.storage import get_image_storage
+
+logger = logging.getLogger(__name__)
+
+Status = ImageUploadJob.Status
+
+
+def staging_dir():
+    return Path(settings.SHOP_UPLOAD_STAGING_DIR)
+
+
+def staged_path(job):
+    return staging_dir() / job.staged_name
+
+
+def max_attempts():
+    return getattr(settings, "SHOP_IMAGE_UPLOAD_MAX_ATTEMPTS", 5)
+
+
+def retry_delay(attempts):
+    """Seconds before retrying after `attempts` failed uploads."""
+    base = getattr(settings, "SHOP_IMAGE_UPLOAD_RETRY_DELAY", 30)
+    return base * 2 ** (attempts - 1)
+
+
+def claim_timeout():
+    return getattr(settings, "SHOP_IMAGE_UPLOAD_CLAIM_TIMEOUT", 300)
+
+
+def upload_threads():
+    return getattr(settings, "SHOP_IMAGE_UPLOAD_THREADS", 4)
+
+
+def stage_uploads(product, files):
+    """
+    Write uploaded files to the staging directory and queue their jobs,
+    with a single INSERT.
+    """
+    directory = staging_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    jobs = []
+    try:
+        for file in files:
+            staged_name = (
+                uuid.uuid4().hex + Path(file.name).suffix.lower()[:10]
+            )
+            jobs.append(ImageUploadJob(
+                product=product,
+                staged_name=staged_name,
+                original_name=file.name[:255],
+            ))
+            with open(directory / staged_name, "wb") as staged:
+                for chunk in file.chunks():
+                    staged.write(chunk)
+        return ImageUploadJob.objects.bulk_create(jobs)
+    except Exception:
+        for job in jobs:
+            staged_path(job).unlink(missing_ok=True)
+        raise
+
+
+def stage_upload(product, file):
+    return stage_uploads(product, [file])[0]
+
+
+def claim_jobs(limit, using=DEFAULT_DB_ALIAS):
+    """
+    Mark up to `limit` due jobs as processing by this worker, counting the
+    attempt. Jobs whose worker died mid-upload are due again once their
+    claim times out.
+    """
+    now = timezone.now()
+    jobs = ImageUploadJob.objects.using(using)
+    with transaction.atomic(using=using):
+        claimed = list(
+            jobs.select_for_update(skip_locked=True)
+            .filter(
+                status__in=[Status.PENDING, Status.PROCESSING],
+                run_after__lte=now,
+            )
+            .order_by("run_after", "id")[:limit]
+        )
+        run_after = now + timedelta(seconds=claim_timeout())
+        jobs.filter(pk__in=[job.pk for job in claimed]).update(
+            status=Status.PROCESSING,
+            attempts=F("attempts") + 1,
+            run_after=run_after,
+        )
+    for job in claimed:
+        job.status = Status.PROCESSING
+        job.attempts += 1
+        job.run_after = run_after
+    return claimed
+
+
+def finish_job(job, using=DEFAULT_DB_ALIAS, **fields):
+    """
+    Update a claimed job, unless its claim timed out and another worker
+    took it over meanwhile. Returns whether the job was still ours.
+    """
+    fields.setdefault("run_after", timezone.now())
+    rows = ImageUploadJob.objects.using(using).filter(
+        pk=job.pk, status=Status.PROCESSING, attempts=job.attempts
+    ).update(updated_at=timezone.now(), **fields)
+    for name, value in fields.items():
+        setattr(job, name, value)
+    return rows == 1
+
+
+def process_jobs(jobs, using=DEFAULT_DB_ALIAS):
+    """
+    Push claimed jobs' files to the image storage, attach them to their
+    products and render their derivatives. Failed uploads are retried
+    with exponential backoff until SHOP_IMAGE_UPLOAD_MAX_ATTEMPTS is
+    reached.
+
+    The uploads run on up to SHOP_IMAGE_UPLOAD_THREADS threads, so a batch
+    takes about as long as its slowest file; the threads do not touch the
+    database.
+
+    Returns {job: its new status, or None if it was taken over}.
+    """
+    storage = get_image_storage()
+    statuses = {}
+    uploads = []
+    for job in jobs:
+        if job.attempts > max_attempts():
+            # the worker holding the last attempt died
+            statuses[job] = fail_job(job, "Too many attempts.", using)
+        elif not staged_path(job).exists():
+            statuses[job] = fail_job(
+                job, "The staged file is missing.", using
+            )
+        else:
+            uploads.append(job)
+
+    def upload(job):
+        try:
+            return storage.save(staged_path(job), job.original_name), None
+        except Exception as error:
+            return None, f"{type(error).__name__}: {error}"
+
+    def render(image):
+        try:
+            storage.create_derivatives(image.image, DERIVATIVE_SIZES)
+        except Exception:
+            # rendered on first use instead
+            logger.exception(
+                "Could not render the derivatives of image %s", image.pk
+            )
+
+    with ThreadPoolExecutor(upload_threads()) as pool:
+        stored = {}
+        for job, (value, error) in zip(uploads, pool.map(upload, uploads)):
+            if error is None:
+                stored[job] = value
+            else:
+                statuses[job] = retry_job(job, error, using)
+
+        attached = attach_images(stored, using)
+        for job in stored:
+            statuses[job] = job.status if job in attached else None
+        for job in attached:
+            staged_path(job).unlink(missing_ok=True)
+        list(pool.map(render, [job.image for job in attached]))
+    return statuses
+
+
+def process_job(job, using=DEFAULT_DB_ALIAS):
+    return process_jobs([job], using)[job]
+
+
+def attach_images(stored, using=DEFAULT_DB_ALIAS):
+    """
+    Create the ProductImage of every {job: stored image} still claimed by
+    this worker, with one INSERT, and mark those jobs done.
+    """
+    if not stored:
+        return []
+    jobs = ImageUploadJob.objects.using(using)
+    with transaction.atomic(using=using):
+        claims = set(
+            jobs.select_for_update()
+            .filter(pk__in=[job.pk for job in stored])
+            .filter(status=Status.PROCESSING)
+            .values_list("pk", "attempts")
+        )
+        attached = [job for job in stored if (job.pk, job.attempts) in claims]
+        images = ProductImage.objects.using(using).bulk_create([
+            ProductImage(product_id=job.product_id, image=stored[job])
+            for job in attached
+        ])
+        now = timezone.now()
+        for job, image in zip(attached, images):
+            job.status = Status.DONE
+            job.image = image
+            job.last_error = ""
+            job.run_after = now
+            job.updated_at = now
+        jobs.bulk_update(
+            attached,
+            ["status", "image", "last_error", "run_after", "updated_at"],
+        )
+        if attached:
+            # bulk_create sends no signals; this moves the products'
+            # updated_at and expires the cached responses, the
+            # storefronts included, like shop.signals does for a single
+            # image
+            products = Product.objects.using(using).filter(
+                pk__in={job.product_id for job in attached}
+            )
+            products.update(updated_at=Now())
+            sellers = set(products.values_list("seller_id", flat=True))
+            bump_versions(
+                PRODUCTS,
+                *(seller_namespace(seller) for seller in sellers),
+                using=using,
+            )
+    return attached
+
+
+def retry_job(job, message, using=DEFAULT_DB_ALIAS):
+    if job.attempts >= max_attempts():
+        return fail_job(job, message, using)
+    run_after = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+    finished = finish_job(
+        job,
+        using,
+        status=Status.PENDING,
+        last_error=message,
+        run_after=run_after,
+    )
+    return job.status if finished else None
+
+
+def fail_job(job, message, using=DEFAULT_DB_ALIAS):
+    if not finish_job(job, using, status=Status.FAILED, last_error=message):
+        return None
+    staged_path(job).unlink(missing_ok=True)
+    return job.status
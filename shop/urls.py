@@ -6,7 +6,12 @@ from shop.views import (
     CategoryDetail,
     ProductImageList,
     ProductImageDetail,
+    ImageUploadJobDetail,
+    ProductImageBulkUpload,
     ProductSearchView,
+    SearchSuggestionView,
+    SearchStatsView,
+    SellerStorefront,
 
     # view for demo
     ProductListView,
@@ -29,7 +34,17 @@ urlpatterns = [
     path("api/images/", ProductImageList.as_view(), name="images"),
     path("api/images/<int:pk>/", ProductImageDetail.as_view(),
          name="image-detail"),
+    path("api/images/bulk/", ProductImageBulkUpload.as_view(),
+         name="images-bulk"),
+    path("api/images/jobs/<int:pk>/", ImageUploadJobDetail.as_view(),
+         name="image-job-detail"),
+    path("api/sellers/<int:seller_id>/products/",
+         SellerStorefront.as_view(), name="seller-storefront"),
     path("api/search/", ProductSearchView.as_view(), name="search"),
+    path("api/search/suggestions/", SearchSuggestionView.as_view(),
+         name="search-suggestions"),
+    path("api/search/stats/", SearchStatsView.as_view(),
+         name="search-stats"),
 
     # url for demo
     path('products/', ProductListView.as_view(), name='products-demo'),
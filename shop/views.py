@@ -1,37 +1,71 @@
-import cloudinary.uploader
-from shop.models import Product, Category, ProductImage
+from shop.models import Product, Category, ProductImage, ImageUploadJob
 from shop.serializers import (
     ProductSerializer,
     CategorySerializer,
     ProductImageSerializer,
+    ImageUploadSerializer,
+    ImageFileSerializer,
+    BulkImageUploadSerializer,
+    ImageUploadJobSerializer,
 )
 from profile.serializers import (
     SellerProductSerializer
 )
-from rest_framework import generics, filters
+from rest_framework import generics
 from django.views.generic import ListView
 from rest_framework import permissions
 from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
 # for demo
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect
+from django.urls import reverse
 from django.views import View
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic.detail import DetailView
 from profile.models import Cart, Seller
+from profile.filters import CityKeyFilter
 import django_filters
 
 from django_filters.rest_framework import DjangoFilterBackend
-from .filters import ProductFilter
+from .filters import ProductFilter, FullTextSearchFilter
+from .search import get_search_backend
+from .uploads import stage_upload, stage_uploads
+from .cache import (
+    CATEGORIES,
+    PRODUCTS,
+    STOCK,
+    CachedPageMixin,
+    CachedResponseMixin,
+    product_namespace,
+    seller_namespace,
+)
+from .categories import category_cache
+from .conditional import ConditionalGetMixin
+from .facets import cached_facet_counts, facet_cache_key
+from .pagination import (
+    CategoryKeysetPagination,
+    FacetedKeysetPagination,
+    FacetedSearchKeysetPagination,
+    StorefrontKeysetPagination,
+)
+from .storefront import storefront_header
 
 
-class ProductList(generics.ListCreateAPIView):
+class ProductList(ConditionalGetMixin, CachedResponseMixin,
+                  generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    queryset = Product.objects.all()
+    queryset = Product.objects.with_related()
     serializer_class = ProductSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = ProductFilter
+    pagination_class = FacetedKeysetPagination
+    cache_namespaces = (PRODUCTS, STOCK)
+    last_modified_fields = ("updated_at", "category__updated_at")
 
     def post(self, request, *args, **kwargs):
         if not request.user.is_authenticated or not request.user.is_superuser:
@@ -42,17 +76,25 @@ class ProductList(generics.ListCreateAPIView):
         return self.create(request, *args, **kwargs)
 
 
-class ProductDetail(generics.RetrieveUpdateDestroyAPIView):
+class ProductDetail(ConditionalGetMixin, CachedResponseMixin,
+                    generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [
         permissions.IsAuthenticatedOrReadOnly,
     ]
-    queryset = Product.objects.all()
+    queryset = Product.objects.with_related()
     serializer_class = ProductSerializer
+    last_modified_fields = ("updated_at", "category__updated_at")
 
+    def get_cache_namespaces(self):
+        return (PRODUCTS, product_namespace(self.kwargs["pk"]))
 
-class CategoryList(generics.ListCreateAPIView):
+
+class CategoryList(ConditionalGetMixin, CachedResponseMixin,
+                   generics.ListCreateAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    pagination_class = CategoryKeysetPagination
+    cache_namespaces = (CATEGORIES,)
 
     def post(self, request, *args, **kwargs):
         if not request.superuser.is_authenticated:
@@ -69,6 +111,8 @@ class CategoryDetail(generics.RetrieveUpdateDestroyAPIView):
     ]
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    lookup_field = "slug"
+    lookup_url_kwarg = "category_slug"
 
 
 class ProductImageList(generics.ListCreateAPIView):
@@ -86,33 +130,73 @@ class ProductImageList(generics.ListCreateAPIView):
                 status=status.HTTP_403_FORBIDDEN,
             )
 
-        file = request.FILES.get('image')
+        if not request.FILES.get('image'):
+            return Response(
+                {"message": "No image file provided."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        serializer = ImageUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # The upload to the image storage is left to the
+        # process_image_uploads worker, see shop.uploads
+        job = stage_upload(
+            serializer.validated_data["product"],
+            serializer.validated_data["image"],
+        )
+        return Response(
+            ImageUploadJobSerializer(job).data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={
+                "Location": reverse("image-job-detail", args=[job.pk])
+            },
+        )
 
-        if file:
-            upload_result = cloudinary.uploader.upload(file)
-            image_url = upload_result.get('url')
 
-            data = {
-                'product': request.data.get('product'),
-                'image_url': image_url
-            }
+class ProductImageBulkUpload(APIView):
+    """
+    Accept several images of a product at once. They are all checked
+    before any is staged; the response gives the outcome of each file.
+    """
+    permission_classes = [permissions.IsAdminUser]
 
-            serializer = self.get_serializer(data=data)
-            if serializer.is_valid():
-                serializer.save()
-                return Response(
-                    serializer.data, status=status.HTTP_201_CREATED
-                )
+    def post(self, request, *args, **kwargs):
+        serializer = BulkImageUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        files = serializer.validated_data["images"]
+
+        results = []
+        for file in files:
+            image = ImageFileSerializer(data={"image": file})
+            if image.is_valid():
+                results.append({"name": file.name, "status": "accepted"})
             else:
-                return Response(
-                    serializer.errors, status=status.HTTP_400_BAD_REQUEST
-                )
-        else:
+                results.append({
+                    "name": file.name,
+                    "status": "invalid",
+                    "errors": image.errors["image"],
+                })
+        if any(result["status"] == "invalid" for result in results):
             return Response(
-                {"message": "No image file provided."},
-                status=status.HTTP_400_BAD_REQUEST,
+                {"files": results}, status=status.HTTP_400_BAD_REQUEST
             )
 
+        jobs = stage_uploads(serializer.validated_data["product"], files)
+        for result, job in zip(results, jobs):
+            result.update(
+                status=job.status,
+                job=job.pk,
+                url=reverse("image-job-detail", args=[job.pk]),
+            )
+        return Response(
+            {"files": results}, status=status.HTTP_202_ACCEPTED
+        )
+
+
+class ImageUploadJobDetail(generics.RetrieveAPIView):
+    permission_classes = [permissions.IsAdminUser]
+    queryset = ImageUploadJob.objects.all()
+    serializer_class = ImageUploadJobSerializer
+
 
 class ProductImageDetail(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [
@@ -124,10 +208,37 @@ class ProductImageDetail(generics.RetrieveUpdateDestroyAPIView):
 
 
 class ProductSearchView(generics.ListAPIView):
-    queryset = Product.objects.all()
+    queryset = Product.objects.with_related()
     serializer_class = ProductSerializer
-    filter_backends = [filters.SearchFilter]
-    search_fields = ["name", "description", "category__name"]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter]
+    filterset_class = ProductFilter
+    pagination_class = FacetedSearchKeysetPagination
+
+
+class SearchSuggestionView(APIView):
+    """
+    "Did you mean" suggestions: the indexed terms closest to the search
+    text, resolved with one index lookup.
+    """
+
+    def get(self, request, *args, **kwargs):
+        text = request.query_params.get("search", "")
+        return Response(
+            {"suggestions": get_search_backend().suggest(text)},
+            status=status.HTTP_200_OK
+        )
+
+
+class SearchStatsView(APIView):
+    """
+    Size, build time and latency figures of the search backend.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(
+            get_search_backend().stats(), status=status.HTTP_200_OK
+        )
 
 
 class SellerProductsAPIView(generics.RetrieveAPIView):
@@ -137,14 +248,50 @@ class SellerProductsAPIView(generics.RetrieveAPIView):
     lookup_field = 'user__username'
 
 
+class SellerStorefront(CachedResponseMixin, generics.ListAPIView):
+    """
+    A seller's products, newest first, a page at a time, under a
+    "seller" header with their name, city and product count.
+
+    Pages are cached, like the header, under the seller's namespace (see
+    shop.storefront), so a cached page costs no query and outlives the
+    changes to other sellers' products.
+    """
+
+    permission_classes = []
+    serializer_class = ProductSerializer
+    pagination_class = StorefrontKeysetPagination
+
+    def get_cache_namespaces(self):
+        # the seller's namespace covers their products, see shop.signals
+        # and ProductQuerySet; the categories are embedded
+        return (
+            CATEGORIES, STOCK, seller_namespace(self.kwargs["seller_id"])
+        )
+
+    def get_queryset(self):
+        return Product.objects.with_related().filter(
+            seller_id=self.kwargs["seller_id"]
+        )
+
+    def list(self, request, *args, **kwargs):
+        header = storefront_header(self.kwargs["seller_id"])
+        if header is None:
+            raise Http404("No such seller.")
+        response = super().list(request, *args, **kwargs)
+        response.data = {"seller": header, **response.data}
+        return response
+
+
 # create demo views:
-class ProductListView(ListView):
+class ProductListView(CachedPageMixin, ListView):
     model = Product
     template_name = 'shop/product_list.html'
     context_object_name = 'products'
+    cache_namespaces = (PRODUCTS, STOCK)
 
     def get_queryset(self):
-        queryset = Product.objects.all()
+        queryset = Product.objects.with_related()
         filter = ProductFilter(self.request.GET, queryset=queryset)
         return filter.qs
 
@@ -153,6 +300,10 @@ class ProductListView(ListView):
         context['filter'] = ProductFilter(
             self.request.GET, queryset=self.get_queryset()
         )
+        context['facets'] = cached_facet_counts(
+            self.object_list,
+            facet_cache_key(self.request.path, self.request.GET),
+        )
         return context
 
 
@@ -168,6 +319,7 @@ class AddToCartView(LoginRequiredMixin, View):
 
 class ProductDetailView(DetailView):
     model = Product
+    queryset = Product.objects.with_related()
     template_name = 'shop/product_detail.html'
     context_object_name = 'product'
 
@@ -184,18 +336,32 @@ class SellerProductListView(ListView):
     model = Product
     template_name = 'shop/seller_product_list.html'
     context_object_name = 'products'
+    page_size = 24
 
     def get_queryset(self):
         # Fetch the seller based on the username in the URL
         self.seller = get_object_or_404(
-            Seller, user__username=self.kwargs['username']
+            Seller.objects.select_related("user", "address"),
+            user__username=self.kwargs['username']
         )
-        # Filter products that belong to this seller
-        return Product.objects.filter(seller=self.seller)
+        # Filter products that belong to this seller; the pagination
+        # orders them newest first
+        return Product.objects.with_related().filter(seller=self.seller)
 
     def get_context_data(self, **kwargs):
+        # Paginate like the storefront API, without OFFSET or COUNT
+        pagination = StorefrontKeysetPagination()
+        pagination.page_size = self.page_size
+        try:
+            kwargs['object_list'] = pagination.paginate_queryset(
+                self.object_list, Request(self.request), view=self
+            )
+        except NotFound:
+            raise Http404("Invalid cursor")
         # Pass additional seller and address information to the template
         context = super().get_context_data(**kwargs)
+        context['next_page'] = pagination.get_next_link()
+        context['previous_page'] = pagination.get_previous_link()
         context['seller'] = self.seller
         context['address'] = self.seller.address
         return context
@@ -214,10 +380,19 @@ class CategoryDetailView(DetailView):
     template_name = 'shop/category_detail.html'
     context_object_name = 'category'
 
+    def get_object(self, queryset=None):
+        # resolved from the per-worker category cache, see shop.categories
+        category = category_cache.get_by_slug(self.kwargs['slug'])
+        if category is None:
+            raise Http404("No category found matching the query")
+        return category
+
     def get_context_data(self, **kwargs):
         # Add the list of products in the category to the context
         context = super().get_context_data(**kwargs)
-        context['products'] = self.object.category.all()
+        context['products'] = self.object.category.with_related().order_by(
+            '-created_at', '-id'
+        )
         return context
 
 
@@ -228,25 +403,57 @@ class ProductFilter(django_filters.FilterSet):
     max_price = django_filters.NumberFilter(
         field_name='price', lookup_expr='lte', label='Max Price'
     )
-    city = django_filters.CharFilter(
-        field_name='seller__address__city',
-        lookup_expr='icontains',
+    city = CityKeyFilter(
+        field_name='seller__address__normalized_city__key',
         label='City'
     )
+    city_prefix = CityKeyFilter(
+        field_name='seller__address__normalized_city__key',
+        lookup_expr='startswith',
+        label='City starts with'
+    )
+    category = django_filters.NumberFilter(
+        field_name='category_id', label='Category'
+    )
+    in_stock = django_filters.BooleanFilter(
+        field_name='stock', method='filter_in_stock', label='In stock'
+    )
 
     class Meta:
         model = Product
-        fields = ['min_price', 'max_price', 'city']
+        fields = [
+            'min_price', 'max_price', 'city', 'city_prefix', 'category',
+            'in_stock',
+        ]
+
+    def filter_in_stock(self, queryset, name, value):
+        if value:
+            return queryset.filter(stock__gt=0)
+        return queryset.filter(stock=0)
 
 
 class ProductSearchDemoView(ListView):
     model = Product
+    queryset = Product.objects.with_related()
     template_name = 'shop/product_list.html'
     context_object_name = 'products'
 
     def get_queryset(self):
         queryset = super().get_queryset()
         search_query = self.request.GET.get('search')
+        self.fuzzy_matched = False
         if search_query:
-            queryset = queryset.filter(name__icontains=search_query)
+            search = get_search_backend()
+            products = search.search(queryset, search_query)
+            # Fall back to typo-tolerant matching instead of making the
+            # user retry with other spellings
+            if not products:
+                products = search.fuzzy_search(queryset, search_query)
+                self.fuzzy_matched = True
+            return products
         return queryset
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['fuzzy_matched'] = self.fuzzy_matched
+        return context